@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends
 from typing import Dict, List, Optional
 from app.models.definitions import ModelType
 from app.services.model_service import ModelService
+from app.services.single_cell_service import get_service_instance as get_single_cell_service
 
 router = APIRouter()
 
@@ -23,4 +24,13 @@ async def get_models(
     Get available models, optionally filtered by type
     """
     models = await service.get_available_models(model_type)
-    return {"models": models} 
\ No newline at end of file
+    return {"models": models}
+
+@router.get("/models/pool")
+async def get_model_pool_stats(
+    single_cell_service = Depends(get_single_cell_service)
+) -> Dict:
+    """
+    Get resident model pool statistics (hits, misses, load times)
+    """
+    return single_cell_service.get_pool_stats()
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from app.core.config import get_settings
-import shutil
-from pathlib import Path
+from app.services.blob_store import BlobInUseError, get_blob_store
+from app.utils.uploads import UploadTooLargeError
 
 router = APIRouter()
 settings = get_settings()
@@ -10,7 +10,7 @@ def validate_file_extension(filename: str) -> bool:
     return filename.split(".")[-1].lower() in settings.ALLOWED_EXTENSIONS
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)) -> dict:
+async def upload_file(file: UploadFile = File(...), blob_store = Depends(get_blob_store)) -> dict:
     """
     Upload a file for processing
     """
@@ -21,14 +21,43 @@ async def upload_file(file: UploadFile = File(...)) -> dict:
         )
     
     try:
-        file_path = settings.UPLOAD_DIR / file.filename
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        blob = await blob_store.ingest(file, upload=True)
         
         return {
             "filename": file.filename,
-            "path": str(file_path),
+            "path": blob.path,
+            "sha256": blob.sha256,
+            "size": blob.size,
+            "deduplicated": blob.deduplicated,
             "status": "success"
         }
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/upload/{reference:path}")
+async def get_upload(reference: str, blob_store = Depends(get_blob_store)) -> dict:
+    """
+    Look up an uploaded file by sha256 or by the path returned from /upload
+    """
+    blob = blob_store.resolve(reference)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return blob.model_dump()
+
+@router.delete("/upload/{sha256}")
+async def release_upload(sha256: str, blob_store = Depends(get_blob_store)) -> dict:
+    """
+    Release the reference taken by an upload; the file is deleted once unreferenced
+
+    References held by workflows are left alone: once every upload
+    reference is released, further deletes are refused with 409.
+    """
+    if blob_store.resolve(sha256) is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        deleted = blob_store.release(sha256, upload=True)
+    except BlobInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"sha256": sha256, "deleted": deleted}
@@ -6,42 +6,159 @@ from fastapi import (
     Depends, 
     UploadFile, 
     File,
-    Query
+    Query,
+    Header,
+    Request,
+    WebSocket,
+    WebSocketDisconnect
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pathlib import Path
 from app.services.single_cell_service import get_service_instance as get_single_cell_service
-from app.services.workflow_service import get_workflow_service
-from app.models.workflows import WorkflowResult
+from app.services.workflow_service import WorkflowFinishedError, get_workflow_service
+from app.models.workflows import DatasetInspection, WorkflowResult, WorkflowStatus, WorkflowSummary, default_emb_mode
+from app.core.config import get_settings
+from app.services.admission import MemoryBudgetExceededError
+from app.services.blob_store import BlobNotFoundError
+from app.services.dataset_inspector import InvalidInputError
+from app.services.workflow_state_manager import TERMINAL_STATUSES
+from app.services.workflow_store import InvalidCursorError
+from app.services.embedding_io import (
+    decode,
+    lookup_obs_names,
+    parse_index_ranges,
+    read_obs_names,
+    read_rows
+)
+from app.utils.uploads import UploadTooLargeError
 from uuid import uuid4
-from typing import Dict
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Union
+import asyncio
+import json
 import logging
+import time
+import numpy as np
 
 router = APIRouter()
-single_cell_service = get_single_cell_service()
-workflow_service = get_workflow_service()
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager #runs at startup
 async def lifespan(app: FastAPI):
+    # Services are built here rather than at import time, and heavy model
+    # dependencies are only imported on first inference
+    timings = {}
+    start = time.perf_counter()
+    single_cell_service = get_single_cell_service()
+    timings["single_cell_service"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    workflow_service = get_workflow_service()
+    timings["workflow_service"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await single_cell_service.start()
     await workflow_service.start_worker()
+    timings["workers"] = time.perf_counter() - start
+
+    breakdown = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items())
+    logger.info(f"Startup took {sum(timings.values()) * 1000:.0f}ms ({breakdown})")
     yield
+    single_cell_service.shutdown()
+    workflow_service.shutdown()
 
 @router.post("/workflows/single-cell")
 async def create_single_cell_workflow(
-    file: UploadFile = File(..., description="Single cell file"),
-    model_id: str = Query(..., description="Model ID to use")
+    request: Request,
+    file: Optional[UploadFile] = File(None, description="Single cell file"),
+    model_id: List[str] = Query(..., description="Model ID to use; repeat to embed the input with several models"),
+    embedding_mode: Optional[List[Literal["cls", "cell", "gene"]]] = Query(
+        None,
+        description="Mode for embedding generation; one for all models or one per model_id. "
+                    "Default: each model's own (cls for scGPT, cell for Geneformer)"
+    ),
+    input_ref: Optional[str] = Query(None, description="sha256 or path of a file previously sent to /upload"),
+    output_format: Optional[Literal["npy", "hdf5"]] = Query(None, description="Embedding file format"),
+    output_dtype: Optional[Literal["float32", "float16", "bfloat16"]] = Query(None, description="Stored embedding precision"),
+    priority: int = Query(0, description="Scheduling priority; higher runs first"),
+    client_id: Optional[str] = Query(None, description="Client for fair-share scheduling"),
+    timeout: Optional[float] = Query(None, gt=0, description="Seconds after which an unfinished workflow is cancelled"),
+    x_client_id: Optional[str] = Header(None),
+    workflow_service = Depends(get_workflow_service)
 ) -> Dict[str, str]:
+    if (file is None) == (input_ref is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of file or input_ref")
+    if embedding_mode and len(embedding_mode) not in (1, len(model_id)):
+        raise HTTPException(status_code=400, detail="Provide one embedding_mode, or one per model_id")
+    if not embedding_mode:
+        modes = [default_emb_mode(m) for m in model_id]
+    else:
+        modes = embedding_mode * len(model_id) if len(embedding_mode) == 1 else embedding_mode
+    targets = list(zip((m.lower() for m in model_id), modes))
+    if len(set(targets)) != len(targets):
+        raise HTTPException(status_code=400, detail="Each (model_id, embedding_mode) pair may only be requested once")
     try:        
         workflow_id = str(uuid4())
-        await workflow_service.create_single_cell_workflow(workflow_id, file, model_id)
+        await workflow_service.create_single_cell_workflow(
+            workflow_id, file, *targets[0], input_ref, output_format, output_dtype,
+            priority=priority,
+            # Fall back to the caller's address so anonymous clients still get a fair share
+            client_id=client_id or x_client_id or (request.client.host if request.client else None),
+            timeout=timeout,
+            extra_targets=targets[1:]
+        )
         return {"workflow_id": workflow_id}
+    except BlobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (InvalidInputError, MemoryBudgetExceededError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error creating workflow: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/workflows/single-cell/inspect")
+async def inspect_single_cell_input(
+    file: Optional[UploadFile] = File(None, description="Single cell file"),
+    model_id: Literal["scgpt", "geneformer"] = Query(..., description="Model to check the input against"),
+    input_ref: Optional[str] = Query(None, description="sha256 or path of a file previously sent to /upload"),
+    gene_names: Optional[str] = Query(None, description="var column holding gene names; default the model's column or the var index"),
+    workflow_service = Depends(get_workflow_service)
+) -> DatasetInspection:
+    """Dry run: report shape, sparsity, memory estimate and gene vocabulary overlap without queueing a job"""
+    if (file is None) == (input_ref is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of file or input_ref")
+    try:
+        return await workflow_service.inspect_single_cell_input(file, model_id, input_ref, gene_names)
+    except BlobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error inspecting input: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/workflows/cache/stats")
+async def get_result_cache_stats(
+    workflow_service = Depends(get_workflow_service)
+) -> Dict:
+    """Get embedding result cache hit-rate and size statistics"""
+    return workflow_service.get_cache_stats()
+
+@router.get("/workflows/queue/stats")
+async def get_queue_stats(
+    workflow_service = Depends(get_workflow_service)
+) -> Dict:
+    """Get queue depth, active workers and per-model admission state"""
+    return workflow_service.get_queue_stats()
+
 @router.get("/workflows/{workflow_id}")
-async def get_workflow_status(workflow_id: str) -> Dict:
+async def get_workflow_status(
+    workflow_id: str,
+    workflow_service = Depends(get_workflow_service)
+) -> Dict:
+    if workflow_service.get_workflow(workflow_id) is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
     try:
         return await workflow_service.get_workflow_status(workflow_id)
     except ValueError:
@@ -50,6 +167,128 @@ async def get_workflow_status(workflow_id: str) -> Dict:
         logger.error(f"Error getting workflow status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _cancel_workflow(workflow_id: str, workflow_service) -> Dict:
+    try:
+        return await workflow_service.cancel_workflow(workflow_id)
+    except WorkflowFinishedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    except Exception as e:
+        logger.error(f"Error cancelling workflow: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/workflows/{workflow_id}")
+async def delete_workflow(
+    workflow_id: str,
+    workflow_service = Depends(get_workflow_service)
+) -> Dict:
+    """Cancel a queued or running workflow (same as POST /workflows/{id}/cancel)"""
+    return await _cancel_workflow(workflow_id, workflow_service)
+
+@router.post("/workflows/{workflow_id}/cancel")
+async def cancel_workflow(
+    workflow_id: str,
+    workflow_service = Depends(get_workflow_service)
+) -> Dict:
+    """Cancel a queued or running workflow
+
+    A queued workflow is cancelled at once; a running one stops at its next
+    chunk boundary, so its status may still be processing in the response.
+    """
+    return await _cancel_workflow(workflow_id, workflow_service)
+
+def _sse_message(event: Dict) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/workflows/{workflow_id}/events")
+async def stream_workflow_events(
+    workflow_id: str,
+    workflow_service = Depends(get_workflow_service)
+):
+    """Server-Sent Events stream of a workflow's status/progress changes
+
+    The current state is sent first; the stream ends after a completed or
+    failed event.
+    """
+    queue = asyncio.Queue(maxsize=settings.WORKFLOW_EVENTS_QUEUE_SIZE)
+    event = await workflow_service.subscribe_events(workflow_id, queue)
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+
+    async def event_stream():
+        try:
+            current = event
+            yield _sse_message(current)
+            while current["status"] not in TERMINAL_STATUSES:
+                try:
+                    current = await asyncio.wait_for(queue.get(), settings.WORKFLOW_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_message(current)
+        finally:
+            workflow_service.unsubscribe_events(workflow_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/workflows/events")
+async def workflow_events_socket(
+    websocket: WebSocket,
+    workflow_service = Depends(get_workflow_service)
+):
+    """Multiplexed status/progress events for many workflows over one connection
+
+    Clients send {"subscribe": [ids]} or {"unsubscribe": [ids]}; every event
+    carries its workflow "id". Workflows are dropped after their final event.
+    """
+    await websocket.accept()
+    queue = asyncio.Queue(maxsize=settings.WORKFLOW_EVENTS_QUEUE_SIZE)
+    watched = set()
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict):
+                continue
+            for workflow_id in message.get("unsubscribe", []):
+                workflow_service.unsubscribe_events(workflow_id, queue)
+                watched.discard(workflow_id)
+            for workflow_id in message.get("subscribe", []):
+                event = await workflow_service.subscribe_events(workflow_id, queue)
+                if event is None:
+                    await websocket.send_json({"id": workflow_id, "detail": "Workflow not found"})
+                    continue
+                if event["status"] not in TERMINAL_STATUSES:
+                    watched.add(workflow_id)
+                await websocket.send_json(event)
+
+    async def send():
+        while True:
+            event = await queue.get()
+            if event["id"] not in watched:
+                continue
+            if event["status"] in TERMINAL_STATUSES:
+                workflow_service.unsubscribe_events(event["id"], queue)
+                watched.discard(event["id"])
+            await websocket.send_json(event)
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        for workflow_id in watched:
+            workflow_service.unsubscribe_events(workflow_id, queue)
+
 @router.get("/workflows/{workflow_id}/results/{result_id}/download")
 async def download_workflow_result(
     workflow_id: str,
@@ -70,9 +309,84 @@ async def download_workflow_result(
         media_type=result.content_type
     )
     
-@router.get("/workflows", response_model=list[WorkflowResult])
-async def get_workflows(
+@router.get("/workflows/{workflow_id}/results/{result_id}/rows")
+async def get_workflow_result_rows(
+    workflow_id: str,
+    result_id: str,
+    obs: str = Query(..., description="Row ranges like 0:100,250 or comma-separated obs names"),
+    by: Literal["index", "name"] = Query("index", description="Interpret obs as row indices or obs names"),
+    format: Literal["json", "binary"] = Query("json", description="json, or the raw stored matrix bytes"),
     workflow_service = Depends(get_workflow_service)
 ):
-    """Get all workflows"""
-    return workflow_service.get_workflows()
+    """Read selected rows of an embedding result without downloading the whole file"""
+    workflow = workflow_service.get_workflow(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    result = next((r for r in workflow.results if r.result_id == result_id), None)
+    if not result:
+        raise HTTPException(status_code=404, detail="Result not found")
+    if result.format not in ("npy", "hdf5"):
+        raise HTTPException(status_code=400, detail="Row queries are only supported for npy and hdf5 results")
+
+    try:
+        if by == "name":
+            names_path = result.obs_names_path or (result.file_path if result.format == "hdf5" else None)
+            if names_path is None:
+                raise HTTPException(status_code=400, detail="Result does not store obs names")
+            rows = await asyncio.to_thread(lookup_obs_names, names_path, obs.split(","))
+        else:
+            rows = parse_index_ranges(obs, result.shape[0])
+    except (ValueError, IndexError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e).strip("'\""))
+    if len(rows) > settings.RESULT_ROWS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.RESULT_ROWS_MAX} rows per request")
+
+    matrix = await asyncio.to_thread(read_rows, result.file_path, result.format, rows)
+    if format == "binary":
+        return Response(
+            content=matrix.tobytes(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Shape": ",".join(str(d) for d in matrix.shape),
+                "X-Dtype": result.dtype or str(matrix.dtype)
+            }
+        )
+
+    obs_names = await asyncio.to_thread(read_obs_names, result.file_path, result.format, result.obs_names_path, rows)
+    return {
+        "rows": rows.tolist(),
+        "obs_names": obs_names,
+        "shape": list(matrix.shape),
+        "embeddings": decode(matrix, result.dtype).astype(np.float32).tolist()
+    }
+
+@router.get("/workflows", response_model=None)
+async def get_workflows(
+    response: Response,
+    limit: int = Query(settings.WORKFLOWS_PAGE_SIZE, ge=1, le=settings.WORKFLOWS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    status: Optional[WorkflowStatus] = Query(None),
+    model_id: Optional[str] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    view: Literal["full", "summary"] = Query("full", description="summary leaves out result items"),
+    workflow_service = Depends(get_workflow_service)
+) -> List[Union[WorkflowResult, WorkflowSummary]]:
+    """Get a page of workflows, newest first; the next page's cursor is in X-Next-Cursor"""
+    try:
+        workflows, next_cursor = await asyncio.to_thread(
+            workflow_service.list_workflows,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            model_id=model_id,
+            created_after=created_after,
+            created_before=created_before,
+            summary=view == "summary"
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return workflows
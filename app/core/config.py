@@ -1,6 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import Set
+from typing import Any, Dict, List, Literal, Optional, Set
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
 
@@ -15,7 +15,11 @@ class Settings(BaseSettings):
     # File handling
     UPLOAD_DIR: Path = Path("uploads")
     RESULTS_DIR: Path = UPLOAD_DIR / "results"
+    WORKFLOW_DB_PATH: Path = UPLOAD_DIR / "workflows.db"
+    WORKFLOW_WRITE_DELAY: float = 0.05  # seconds to coalesce record updates before writing
+    WORKFLOW_FLUSH_TIMEOUT: float = 5.0  # seconds to wait for pending records before serving them from memory
     MAX_UPLOAD_SIZE: int = 500_000_000  # 500MB
+    UPLOAD_CHUNK_SIZE: int = 1_048_576  # 1MB per read/write when streaming uploads
     ALLOWED_EXTENSIONS: Set[str] = {
         "fasta", "fa",  # FASTA format (header + sequence)
         "pdb",          # Protein structure data
@@ -24,6 +28,86 @@ class Settings(BaseSettings):
         "h5ad"
     }
 
+    # Inference execution
+    INFERENCE_EXECUTOR: Literal["thread", "process"] = "thread"
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_CHUNK_SIZE: int = 10_000  # cells read, processed and embedded at a time
+
+    # Workflow workers and admission control
+    WORKFLOW_WORKERS: int = 1  # workflows processed concurrently
+    MODEL_CONCURRENCY: Dict[str, int] = {}  # max concurrent jobs per model, e.g. {"geneformer": 2}
+    DEVICE_CONCURRENCY: Dict[str, int] = {}  # max concurrent jobs per device, e.g. {"cuda": 1}
+    INFERENCE_THREADS_PER_JOB: int = 0  # torch intra-op threads per job; 0 = cores / WORKFLOW_WORKERS
+    INFERENCE_INTEROP_THREADS: int = 0  # torch inter-op threads per inference process; 0 = torch default
+
+    # Inference profiles: "default" (float32 as loaded), "float32", "bf16", "int8" or one of INFERENCE_PROFILES
+    INFERENCE_PROFILE: str = "default"
+    MODEL_INFERENCE_PROFILES: Dict[str, str] = {}  # per model, e.g. {"geneformer": "int8"}
+    INFERENCE_PROFILES: Dict[str, Dict[str, Any]] = {}  # custom profiles, e.g. {"int8-compiled": {"quantize_linear": true, "compile": true}}
+    INFERENCE_PROFILE_REFERENCE: Optional[Path] = None  # h5ad used by python -m app.profile_check
+
+    # Memory-aware admission: jobs only start while their estimated peak memory fits the budget
+    JOB_MEMORY_BUDGET: Optional[int] = None  # bytes; None = derive from the container limit, 0 = disabled
+    JOB_MEMORY_FRACTION: float = 0.8  # of the container limit, before subtracting MODEL_POOL_MEMORY_BUDGET
+    JOB_MEMORY_PER_CELL: Dict[str, int] = {"scgpt": 50_000, "geneformer": 100_000}  # tokens, activations, embeddings
+    JOB_MEMORY_OVERHEAD: int = 500_000_000  # per job, whatever its size
+
+    # Pre-flight input validation
+    MODEL_VOCAB_PATHS: Dict[str, Path] = {}  # gene vocabulary per model: .json (list or gene -> token), .pkl or one gene per line
+    MODEL_GENE_COLUMNS: Dict[str, str] = {}  # var column each model reads gene names from; default the var index
+    MIN_GENE_OVERLAP: float = 0.1  # inputs matching less of a configured vocabulary are rejected
+
+    # Micro-batching of small jobs for the same model and embedding mode
+    BATCHING_ENABLED: bool = False
+    BATCH_JOB_MAX_CELLS: int = 5_000  # only jobs up to this many cells are batched
+    BATCH_MAX_CELLS: int = 20_000  # cells per batched inference pass
+    BATCH_MAX_JOBS: int = 32
+    BATCH_WINDOW: float = 0.2  # seconds to wait for more jobs to join a batch
+
+    # Workflow scheduling
+    SCHEDULER_AGING_SECONDS: float = 60.0  # a queued job's effective size halves after waiting this long
+    SCHEDULER_USAGE_HALF_LIFE: float = 600.0  # decay of per-client usage for fair share
+
+    # Durable job queue
+    JOB_LEASE_SECONDS: float = 60.0  # a running job is requeued if its lease isn't renewed for this long
+    JOB_HEARTBEAT_INTERVAL: float = 15.0
+    JOB_MAX_ATTEMPTS: int = 3  # leases per job before it is marked failed
+    JOB_POLL_INTERVAL: float = 1.0  # how often workers look for jobs queued by other processes
+    JOB_DEFAULT_TIMEOUT: Optional[float] = None  # seconds from submission until a job is cancelled; None = no deadline
+
+    # Shared state: "sqlite" lets several API processes and standalone workers
+    # (python -m app.worker) share workflow state and the job queue
+    STATE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    STATE_POLL_INTERVAL: float = 0.5  # how often event streams check for changes made by other processes
+    STATE_WRITE_DELAY: float = 0.05  # seconds to coalesce state updates (e.g. progress) before writing
+
+    # Workflow listing
+    WORKFLOWS_PAGE_SIZE: int = 100
+    WORKFLOWS_MAX_PAGE_SIZE: int = 1000
+
+    # Workflow event streams (SSE / WebSocket)
+    WORKFLOW_EVENTS_KEEPALIVE: float = 15.0  # seconds between SSE keepalive comments
+    WORKFLOW_EVENTS_QUEUE_SIZE: int = 100  # buffered events per subscriber before dropping the oldest
+
+    # Embedding output
+    RESULT_FORMAT: Literal["npy", "hdf5"] = "npy"
+    RESULT_DTYPE: Literal["float32", "float16", "bfloat16"] = "float32"
+    RESULT_ROWS_MAX: int = 100_000  # rows per /rows query
+
+    # Embedding result cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_BYTES: int = 20_000_000_000  # 20GB
+    RESULT_CACHE_TTL: int = 7 * 24 * 3600  # seconds, 0 disables expiry
+
+    # Cache of model.process_data outputs (tokenized inputs), reused across embedding modes
+    PROCESSED_CACHE_ENABLED: bool = True
+    PROCESSED_CACHE_MAX_BYTES: int = 20_000_000_000  # 20GB
+
+    # Model pool
+    MODEL_POOL_MEMORY_BUDGET: int = 4_000_000_000  # 4GB of resident model weights
+    MODEL_POOL_DEFAULT_MODEL_SIZE: int = 500_000_000  # used when a model's size can't be measured
+    MODEL_POOL_PRELOAD: List[str] = []  # e.g. ["scgpt:cls", "geneformer:cell"]
+
 @lru_cache()
 def get_settings() -> Settings:
     settings = Settings()
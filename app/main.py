@@ -20,6 +20,7 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Shape", "X-Dtype"],
     )
 
     # Create upload directory if it doesn't exist
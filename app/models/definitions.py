@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 from enum import Enum
 from pydantic import BaseModel
 
@@ -14,6 +14,16 @@ class ModelConfig(BaseModel):
     input_formats: List[str]
     requires_gpu: bool = False
 
+class InferenceProfile(BaseModel):
+    """How a model's forward passes run; selected per model with MODEL_INFERENCE_PROFILES"""
+    name: str
+    inference_mode: bool = False  # run under torch.inference_mode
+    autocast: Optional[Literal["bfloat16", "float16"]] = None  # reduced precision autocast
+    quantize_linear: bool = False  # dynamic int8 quantization of Linear layers (CPU only)
+    compile: bool = False  # torch.compile the model
+    intra_op_threads: int = 0  # torch threads per job (INFERENCE_EXECUTOR=process only); 0 = INFERENCE_THREADS_PER_JOB
+    min_cosine_similarity: float = 0.999  # accuracy vs float32 required by the reference check
+
 class ModelRegistry:
     def __init__(self):
         self._models: Dict[str, ModelConfig] = {}
@@ -28,17 +28,94 @@ class SingleCellWorkflowConfig(BaseModel):
         'protected_namespaces': ()
     }
 
+# Embedding mode of requests that don't choose one: each model's own (helical) default
+DEFAULT_EMB_MODES: Dict[str, str] = {"scgpt": "cls", "geneformer": "cell"}
+
+def default_emb_mode(model_id: str) -> str:
+    return DEFAULT_EMB_MODES.get(model_id.lower(), "cls")
+
+class EmbeddingTarget(BaseModel):
+    """One (model, embedding mode) pass over a job's input"""
+    model_id: str
+    emb_mode: Literal["cls", "cell", "gene"] = "cls"
+
+    model_config = {
+        'protected_namespaces': ()
+    }
+
+class SingleCellJob(BaseModel):
+    """A queued single-cell embedding job"""
+    workflow_id: str
+    input_path: str
+    input_sha256: str
+    model_id: str
+    emb_mode: Literal["cls", "cell", "gene"] = "cls"
+    output_format: Literal["npy", "hdf5"] = "npy"
+    output_dtype: Literal["float32", "float16", "bfloat16"] = "float32"
+    priority: int = 0  # higher runs first
+    client_id: Optional[str] = None
+    n_obs: Optional[int] = None  # read from the input header; None if unknown
+    n_vars: Optional[int] = None
+    deadline: Optional[float] = None  # epoch seconds after which the job is cancelled
+    memory_estimate: Optional[int] = None  # estimated peak bytes while running
+    extra_targets: List[EmbeddingTarget] = []  # further models/modes embedding the same input
+
+    model_config = {
+        'protected_namespaces': ()
+    }
+
+    @property
+    def targets(self) -> List[EmbeddingTarget]:
+        """All (model, embedding mode) passes, the primary model_id/emb_mode first"""
+        return [EmbeddingTarget(model_id=self.model_id, emb_mode=self.emb_mode), *self.extra_targets]
+
+    @property
+    def size(self) -> int:
+        """Scheduling cost of the job (n_obs x n_vars); unknown inputs count as 0 as they fail fast"""
+        return (self.n_obs or 0) * (self.n_vars or 0)
+
+class GeneOverlap(BaseModel):
+    """How an input's genes match a model's gene vocabulary"""
+    column: str  # var column holding the gene names, or "index"
+    n_genes: int
+    matched: int
+    overlap: float  # matched / n_genes
+    duplicates: int = 0
+    unmatched_examples: List[str] = []
+
+class DatasetInspection(BaseModel):
+    """Pre-flight report on a single-cell input, read from its h5ad metadata"""
+    model_id: str
+    n_obs: Optional[int] = None
+    n_vars: Optional[int] = None
+    dtype: Optional[str] = None
+    sparse: Optional[bool] = None
+    density: Optional[float] = None
+    memory_estimate: Optional[int] = None  # bytes at peak while embedding
+    genes: Optional[GeneOverlap] = None  # None if the model's vocabulary isn't configured
+    problems: List[str] = []
+    ok: bool = True
+
+    model_config = {
+        'protected_namespaces': ()
+    }
+
 class WorkflowStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class WorkflowState(BaseModel):
     workflow_id: str
     created_at: datetime = Field(default_factory=datetime.now)
     status: WorkflowStatus = Field(default=WorkflowStatus.PENDING)
     progress: float = Field(default=0.0)
+    processed_cells: Optional[int] = None
+    total_cells: Optional[int] = None
+    throughput: Optional[float] = None  # cells/sec since embedding started
+    eta_seconds: Optional[float] = None
     error: Optional[str] = None
     result: Optional[Dict] = None
     model_config = {
@@ -62,12 +139,42 @@ class WorkflowResultItem(BaseModel):
     content_type: str
     created_at: datetime = Field(default_factory=datetime.now)
     file_size: int = 0
+    model_id: Optional[str] = None  # model and embedding mode that produced the result
+    emb_mode: Optional[str] = None
+    format: Optional[str] = None  # npy, hdf5 or pickle
+    dtype: Optional[str] = None  # float32, float16 or bfloat16
+    shape: Optional[List[int]] = None
+    obs_names_path: Optional[str] = None  # cell ids, when not stored inside the file
+
+    model_config = {
+        'protected_namespaces': ()
+    }
 
 class WorkflowResult(BaseModel):
     """Result of a workflow execution"""
     workflow_id: str
     status: WorkflowStatus
+    model_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     error_message: Optional[str] = None
-    results: List[WorkflowResultItem] = [] 
\ No newline at end of file
+    results: List[WorkflowResultItem] = []
+    input_sha256: Optional[str] = None  # Input blob, referenced until the workflow finishes
+
+    model_config = {
+        'protected_namespaces': ()
+    }
+
+class WorkflowSummary(BaseModel):
+    """Lightweight listing projection of a workflow, without result items"""
+    workflow_id: str
+    status: WorkflowStatus
+    model_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    error_message: Optional[str] = None
+    result_count: int = 0
+
+    model_config = {
+        'protected_namespaces': ()
+    }
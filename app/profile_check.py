@@ -0,0 +1,51 @@
+"""Accuracy and throughput check of an inference profile against float32
+
+Embeds a reference dataset with the profile and with the default (float32)
+profile and prints the comparison as JSON:
+
+    python -m app.profile_check --model scgpt --profile int8 --reference ref.h5ad
+
+Exits with status 1 if the embeddings drift further from float32 than the
+profile's min_cosine_similarity allows.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from app.core.config import get_settings
+from app.services.inference_profile import check_profile_accuracy, run_one_job_per_process
+from app.services.single_cell_service import get_service_instance as get_single_cell_service
+
+settings = get_settings()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Model ID, e.g. scgpt")
+    parser.add_argument("--profile", required=True, help="Inference profile to check, e.g. bf16 or int8")
+    parser.add_argument("--reference", default=settings.INFERENCE_PROFILE_REFERENCE, help="Reference h5ad dataset")
+    parser.add_argument("--emb-mode", choices=["cls", "cell"], help="Default: the model's own default mode")
+    parser.add_argument("--baseline", default="default", help="Profile to compare against")
+    parser.add_argument("--max-cells", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if args.reference is None:
+        parser.error("--reference is required unless INFERENCE_PROFILE_REFERENCE is set")
+
+    # The check runs here, one profile after the other
+    run_one_job_per_process()
+    service = get_single_cell_service()
+    try:
+        report = check_profile_accuracy(
+            service, args.model.lower(), args.profile, args.reference,
+            emb_mode=args.emb_mode, baseline=args.baseline, max_cells=args.max_cells
+        )
+    finally:
+        service.shutdown()
+    print(json.dumps(report, indent=2))
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
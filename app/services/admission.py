@@ -0,0 +1,187 @@
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudgetExceededError(Exception):
+    """Raised for a job whose estimated memory can never fit the budget"""
+
+    def __init__(self, memory: int, budget: int):
+        self.memory = memory
+        self.budget = budget
+        super().__init__(
+            f"Job needs an estimated {memory / 1e9:.1f} GB of memory but the job memory budget is "
+            f"{budget / 1e9:.1f} GB; submit a smaller dataset or raise JOB_MEMORY_BUDGET"
+        )
+
+
+class AdmissionController:
+    """Caps the number of concurrently running jobs per model and per device
+
+    Limits are taken in a fixed order (models sorted by name, device, then
+    memory), so jobs waiting for a slot can never deadlock each other. A job
+    running several models holds a slot of each. Models or devices
+    without a configured limit are unrestricted. With a memory budget, a job
+    also reserves its estimated peak memory; memory is granted first come
+    first served, so a large job is not starved by a stream of small ones.
+
+    Workers dequeue only jobs that can_admit() right now, so jobs of a busy
+    model don't hold workers that could run other models.
+    """
+
+    def __init__(
+        self,
+        model_limits: Dict[str, int],
+        device_limits: Dict[str, int],
+        memory_budget: Optional[int] = None
+    ):
+        self._model_limits = {k.lower(): v for k, v in model_limits.items()}
+        self._device_limits = dict(device_limits)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._active: Counter = Counter()
+        self._waiting: Counter = Counter()
+        self.memory_budget = memory_budget
+        self._memory_reserved = 0
+        self._memory_queue: Deque[object] = deque()
+        self._memory_available: Optional[asyncio.Condition] = None
+
+    def check_memory(self, memory: Optional[int]):
+        """Raise MemoryBudgetExceededError if a job of this size could never be admitted"""
+        if self.memory_budget and memory and memory > self.memory_budget:
+            raise MemoryBudgetExceededError(memory, self.memory_budget)
+
+    def _semaphore(self, name: str, limit: Optional[int]) -> Optional[asyncio.Semaphore]:
+        if not limit:
+            return None
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+    def _limits(self, model_ids: List[str], device: str) -> List[Tuple[str, Optional[int]]]:
+        """(semaphore name, limit) of every limit a job takes, in acquisition order"""
+        # Device names like "cuda:1" share the limit of their type unless listed themselves
+        device_limit = self._device_limits.get(device, self._device_limits.get(device.split(":")[0]))
+        return [
+            *((f"model:{m}", self._model_limits.get(m)) for m in model_ids),
+            (f"device:{device}", device_limit),
+        ]
+
+    def can_admit(self, model_id: Union[str, Sequence[str]], device: str, memory: Optional[int] = None) -> bool:
+        """Whether admit() would grant a job its slots (and memory) without waiting
+
+        Only a snapshot: another job may take the slots before this one is
+        admitted, which then merely waits. Jobs that can never fit the
+        memory budget count as admissible, so admit() rejects them.
+        """
+        model_ids = [model_id] if isinstance(model_id, str) else sorted(set(model_id))
+        for name, limit in self._limits(model_ids, device):
+            semaphore = self._semaphores.get(name)
+            if limit and semaphore is not None and semaphore.locked():
+                return False
+        if not self.memory_budget or not memory or memory > self.memory_budget:
+            return True
+        return not self._memory_queue and self._memory_reserved + memory <= self.memory_budget
+
+    def busy_models(self, device: str) -> Optional[List[str]]:
+        """Models at their concurrency limit, or None if the device itself is
+
+        The can_admit() check for every job at once, e.g. to filter a
+        shared queue in SQL.
+        """
+        busy = []
+        for name, limit in self._limits(sorted(self._model_limits), device):
+            semaphore = self._semaphores.get(name)
+            if limit and semaphore is not None and semaphore.locked():
+                if name.startswith("device:"):
+                    return None
+                busy.append(name[len("model:"):])
+        return busy
+
+    def free_memory(self) -> Optional[int]:
+        """Bytes a job could reserve without waiting; None without a memory budget"""
+        if not self.memory_budget:
+            return None
+        if self._memory_queue:
+            return 0
+        return self.memory_budget - self._memory_reserved
+
+    @asynccontextmanager
+    async def admit(self, model_id: Union[str, Sequence[str]], device: str, memory: Optional[int] = None):
+        """Wait for a free slot for model_id (or each of several models) on device (and memory bytes) and hold it for the block"""
+        self.check_memory(memory)
+        model_ids = [model_id] if isinstance(model_id, str) else sorted(set(model_id))
+        semaphores = [
+            s for s in (self._semaphore(name, limit) for name, limit in self._limits(model_ids, device))
+            if s is not None
+        ]
+        acquired: List[asyncio.Semaphore] = []
+        self._waiting.update(model_ids)
+        try:
+            for semaphore in semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            reserved = await self._reserve_memory(memory)
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            raise
+        finally:
+            self._waiting.subtract(model_ids)
+
+        self._active.update(model_ids)
+        try:
+            yield
+        finally:
+            self._active.subtract(model_ids)
+            await self._release_memory(reserved)
+            for semaphore in acquired:
+                semaphore.release()
+
+    def _memory_condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running loop
+        if self._memory_available is None:
+            self._memory_available = asyncio.Condition()
+        return self._memory_available
+
+    async def _reserve_memory(self, memory: Optional[int]) -> int:
+        if not self.memory_budget or not memory:
+            return 0
+        condition = self._memory_condition()
+        ticket = object()
+        async with condition:
+            self._memory_queue.append(ticket)
+            try:
+                await condition.wait_for(
+                    lambda: self._memory_queue[0] is ticket and self._memory_reserved + memory <= self.memory_budget
+                )
+            except BaseException:
+                self._memory_queue.remove(ticket)
+                condition.notify_all()
+                raise
+            self._memory_queue.popleft()
+            self._memory_reserved += memory
+            # The next waiter may fit as well
+            condition.notify_all()
+        return memory
+
+    async def _release_memory(self, memory: int):
+        if memory:
+            condition = self._memory_condition()
+            async with condition:
+                self._memory_reserved -= memory
+                condition.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "active_by_model": {k: v for k, v in self._active.items() if v},
+            "waiting_by_model": {k: v for k, v in self._waiting.items() if v},
+            "model_limits": self._model_limits,
+            "device_limits": self._device_limits,
+            "memory_budget": self.memory_budget,
+            "memory_reserved": self._memory_reserved,
+            "memory_waiting": len(self._memory_queue),
+        }
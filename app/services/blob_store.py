@@ -0,0 +1,169 @@
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from uuid import uuid4
+import asyncio
+import json
+import logging
+import os
+import re
+
+from fastapi import UploadFile
+from pydantic import BaseModel, Field
+
+from app.core.config import get_settings
+from app.utils.file_lock import FileLock
+from app.utils.uploads import save_upload_file
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobNotFoundError(ValueError):
+    """Raised when a blob reference does not match a stored blob"""
+
+
+class BlobInUseError(ValueError):
+    """Raised when releasing an upload reference of a blob that only workflows reference"""
+
+
+class BlobInfo(BaseModel):
+    """Metadata of a stored blob"""
+    sha256: str
+    size: int
+    path: str
+    filenames: List[str] = []
+    refcount: int = 0
+    upload_refs: int = 0  # the part of refcount taken by /upload; workflows hold the rest
+    created_at: datetime = Field(default_factory=datetime.now)
+    deduplicated: bool = Field(default=False, exclude=True)
+
+
+class BlobStore:
+    """Content-addressed store for uploaded files with reference counting
+
+    Blobs live at ``<root>/<sha[:2]>/<sha>`` next to a ``<sha>.json`` metadata
+    file. Storing content that is already present only bumps its reference
+    count, and a blob is deleted once its last reference is released.
+    References taken by /upload are also counted on their own, so releasing
+    them can never drop a reference a workflow holds.
+    Metadata updates hold a file lock, so several processes can share root.
+    """
+
+    def __init__(self, root: Path):
+        self._root = root
+        self._tmp_dir = root / "tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = FileLock(root / ".lock")
+
+    def blob_path(self, sha256: str) -> Path:
+        return self._root / sha256[:2] / sha256
+
+    def _meta_path(self, sha256: str) -> Path:
+        return self._root / sha256[:2] / f"{sha256}.json"
+
+    def _read_meta(self, sha256: str) -> Optional[BlobInfo]:
+        meta_path = self._meta_path(sha256)
+        if not meta_path.exists():
+            return None
+        with open(meta_path, "r") as f:
+            return BlobInfo(**json.load(f))
+
+    def _write_meta(self, info: BlobInfo):
+        meta_path = self._meta_path(info.sha256)
+        tmp_path = meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(info.model_dump_json())
+        os.replace(tmp_path, meta_path)
+
+    async def ingest(self, file: UploadFile, upload: bool = False) -> BlobInfo:
+        """Stream an upload into the store and take a reference on it (an upload reference if upload)"""
+        saved = await save_upload_file(file, self._tmp_dir / uuid4().hex)
+        return await asyncio.to_thread(
+            self._commit, saved.path, saved.sha256, saved.size, file.filename, upload
+        )
+
+    def _commit(self, tmp_path: Path, sha256: str, size: int, filename: Optional[str], upload: bool = False) -> BlobInfo:
+        with self._lock():
+            path = self.blob_path(sha256)
+            info = self._read_meta(sha256)
+            deduplicated = path.exists()
+            if deduplicated:
+                tmp_path.unlink(missing_ok=True)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+
+            if info is None:
+                info = BlobInfo(sha256=sha256, size=size, path=str(path))
+            if filename and filename not in info.filenames:
+                info.filenames.append(filename)
+            info.refcount += 1
+            if upload:
+                info.upload_refs += 1
+            self._write_meta(info)
+
+        info.deduplicated = deduplicated
+        logger.info(f"Stored blob {sha256} ({size} bytes, deduplicated={deduplicated})")
+        return info
+
+    def resolve(self, reference: str) -> Optional[BlobInfo]:
+        """Find a blob by its sha256 or by the path returned from /upload"""
+        sha256 = reference.strip().lower()
+        if not _SHA256_RE.match(sha256):
+            candidate = Path(reference)
+            try:
+                candidate.resolve().relative_to(self._root.resolve())
+            except ValueError:
+                return None
+            sha256 = candidate.name.lower()
+            if not _SHA256_RE.match(sha256):
+                return None
+
+        info = self._read_meta(sha256)
+        if info is None or not self.blob_path(sha256).exists():
+            return None
+        return info
+
+    def acquire(self, reference: str) -> BlobInfo:
+        """Take an additional reference on an existing blob, found as by resolve()"""
+        with self._lock():
+            info = self.resolve(reference)
+            if info is None:
+                raise BlobNotFoundError(f"No uploaded file matches {reference}")
+            info.refcount += 1
+            self._write_meta(info)
+            return info
+
+    def release(self, sha256: str, upload: bool = False) -> bool:
+        """Drop a reference (an upload reference if upload); returns True if the blob was deleted
+
+        Raises BlobInUseError when releasing an upload reference of a blob
+        that has none left.
+        """
+        with self._lock():
+            info = self._read_meta(sha256)
+            if info is None:
+                return False
+            if upload:
+                if info.upload_refs <= 0:
+                    raise BlobInUseError(f"Blob {sha256} has no upload reference left; it is in use by workflows")
+                info.upload_refs -= 1
+            info.refcount -= 1
+            if info.refcount > 0:
+                self._write_meta(info)
+                return False
+            self.blob_path(sha256).unlink(missing_ok=True)
+            self._meta_path(sha256).unlink(missing_ok=True)
+            logger.info(f"Deleted blob {sha256}")
+            return True
+
+_blob_store_instance = None
+
+def get_blob_store() -> BlobStore:
+    global _blob_store_instance
+    if _blob_store_instance is None:
+        _blob_store_instance = BlobStore(settings.UPLOAD_DIR / "blobs")
+    return _blob_store_instance
@@ -0,0 +1,99 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+import json
+import logging
+import pickle
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.models.workflows import DatasetInspection, GeneOverlap
+from app.services.memory_estimator import estimate_job_memory
+from app.utils.h5ad import read_h5ad_header, read_h5ad_var_names
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class InvalidInputError(Exception):
+    """Raised when an input can't be embedded by the selected model"""
+
+
+@lru_cache(maxsize=8)
+def _load_vocabulary(path: str, mtime: float):
+    import pandas as pd
+    if path.endswith(".json"):
+        with open(path) as f:
+            genes = json.load(f)
+    elif path.endswith((".pkl", ".pickle")):
+        with open(path, "rb") as f:
+            genes = pickle.load(f)
+    else:
+        with open(path) as f:
+            genes = [line.strip() for line in f if line.strip()]
+    # Token dictionaries map gene -> token id; only the genes matter here
+    return pd.Index(list(genes)).drop_duplicates()
+
+
+def gene_vocabulary(model_id: str):
+    """The model's gene vocabulary as a pandas Index; None if none is configured"""
+    path = settings.MODEL_VOCAB_PATHS.get(model_id.lower())
+    if path is None:
+        return None
+    path = Path(path)
+    return _load_vocabulary(str(path), path.stat().st_mtime)
+
+
+def gene_overlap(var_names: np.ndarray, vocabulary, column: str = "index") -> GeneOverlap:
+    """Match gene names against a vocabulary in one vectorized hash lookup"""
+    import pandas as pd
+    genes = pd.Index(var_names)
+    matched = genes.isin(vocabulary)
+    return GeneOverlap(
+        column=column,
+        n_genes=len(genes),
+        matched=int(matched.sum()),
+        overlap=float(matched.mean()) if len(genes) else 0.0,
+        duplicates=int(genes.duplicated().sum()),
+        unmatched_examples=[str(name) for name in genes[~matched][:10]]
+    )
+
+
+def inspect_h5ad(source: Union[str, BinaryIO], model_id: str, gene_names: Optional[str] = None) -> DatasetInspection:
+    """Check an input against a model using only the h5ad metadata and var index
+
+    X and obs are never read, so this takes milliseconds even for large
+    files. Problems that would make the job fail are listed in ``problems``.
+    """
+    model_id = model_id.lower()
+    report = DatasetInspection(model_id=model_id)
+    header = read_h5ad_header(source)
+    if header is None:
+        report.problems.append("Not a readable h5ad file")
+        report.ok = False
+        return report
+
+    report.n_obs, report.n_vars = header.n_obs, header.n_vars
+    report.dtype, report.sparse, report.density = header.dtype, header.sparse, header.density
+    report.memory_estimate = estimate_job_memory(header, model_id, settings.INFERENCE_CHUNK_SIZE)
+    if header.n_obs == 0:
+        report.problems.append("The dataset has no cells")
+
+    vocabulary = gene_vocabulary(model_id)
+    if vocabulary is not None:
+        column = gene_names or settings.MODEL_GENE_COLUMNS.get(model_id, "index")
+        try:
+            var_names = read_h5ad_var_names(source, None if column == "index" else column)
+        except KeyError:
+            report.problems.append(f"var has no column {column!r}")
+        else:
+            report.genes = gene_overlap(var_names, vocabulary, column)
+            if report.genes.overlap < settings.MIN_GENE_OVERLAP:
+                report.problems.append(
+                    f"Only {report.genes.matched} of {report.genes.n_genes} genes ({report.genes.overlap:.1%}) "
+                    f"in var {column!r} are in the {model_id} vocabulary (minimum {settings.MIN_GENE_OVERLAP:.0%})"
+                )
+
+    report.ok = not report.problems
+    return report
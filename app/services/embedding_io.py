@@ -0,0 +1,292 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+import pickle
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("npy", "hdf5")
+OUTPUT_DTYPES = ("float32", "float16", "bfloat16")
+
+CONTENT_TYPES = {
+    "npy": "application/octet-stream",
+    "hdf5": "application/x-hdf5",
+    "pickle": "application/octet-stream",
+}
+
+
+def to_numpy(embeddings: Any) -> Optional[np.ndarray]:
+    """Convert model output to a 2-D array; None if the output is not rectangular"""
+    if hasattr(embeddings, "detach"):
+        embeddings = embeddings.detach().cpu().float().numpy()
+    try:
+        array = np.asarray(embeddings)
+    except ValueError:
+        return None
+    if array.ndim != 2 or array.dtype == object:
+        return None
+    return array
+
+
+def encode(array: np.ndarray, dtype: str) -> np.ndarray:
+    """Convert embeddings to their storage representation
+
+    numpy has no bfloat16, so bfloat16 is stored as the upper 16 bits of
+    float32 (round-to-nearest-even) in a uint16 array.
+    """
+    if dtype == "bfloat16":
+        bits = np.ascontiguousarray(array, dtype=np.float32).view(np.uint32).astype(np.uint64)
+        rounding = ((bits >> 16) & 1) + 0x7FFF
+        return ((bits + rounding) >> 16).astype(np.uint16)
+    return array.astype(dtype, copy=False)
+
+
+def decode(array: np.ndarray, dtype: str) -> np.ndarray:
+    """Convert stored embeddings back to a floating point array"""
+    if dtype == "bfloat16":
+        return (np.asarray(array, dtype=np.uint32) << 16).view(np.float32)
+    return np.asarray(array)
+
+
+def storage_dtype(dtype: str) -> np.dtype:
+    return np.dtype(np.uint16) if dtype == "bfloat16" else np.dtype(dtype)
+
+
+class _NpySink:
+    """Preallocated .npy memmap plus a fixed-width obs_names sidecar"""
+
+    def __init__(self, output_stem: Path, n_rows: int, dim: int, dtype: str, obs_names: Sequence[str]):
+        self.path = output_stem.with_suffix(".npy")
+        self.obs_names_path = None
+        if len(obs_names):
+            self.obs_names_path = output_stem.with_suffix(".obs_names.npy")
+            np.save(self.obs_names_path, np.asarray(obs_names, dtype=str))
+        self._matrix = np.lib.format.open_memmap(
+            self.path, mode="w+", dtype=storage_dtype(dtype), shape=(n_rows, dim)
+        )
+
+    def write(self, offset: int, array: np.ndarray):
+        self._matrix[offset:offset + array.shape[0]] = array
+        self._matrix.flush()
+
+    def close(self):
+        self._matrix.flush()
+        self._matrix = None
+
+    def files(self) -> List[Path]:
+        return [p for p in (self.path, self.obs_names_path) if p is not None]
+
+
+class _Hdf5Sink:
+    """Chunked HDF5 file holding the embeddings, obs_names and dtype attributes"""
+
+    def __init__(self, output_stem: Path, n_rows: int, dim: int, dtype: str, obs_names: Sequence[str], chunk_rows: int):
+        import h5py
+
+        self.path = output_stem.with_suffix(".h5")
+        self.obs_names_path = None
+        self._file = h5py.File(self.path, "w")
+        self._dataset = self._file.create_dataset(
+            "embeddings",
+            shape=(n_rows, dim),
+            dtype=storage_dtype(dtype),
+            chunks=(max(1, min(chunk_rows, n_rows)), dim) if n_rows else None
+        )
+        self._dataset.attrs["dtype"] = dtype
+        if len(obs_names):
+            self._file.create_dataset("obs_names", data=np.asarray(obs_names, dtype=object), dtype=h5py.string_dtype())
+
+    def write(self, offset: int, array: np.ndarray):
+        self._dataset[offset:offset + array.shape[0]] = array
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def files(self) -> List[Path]:
+        return [self.path]
+
+
+class EmbeddingWriter:
+    """Streams per-chunk embeddings to disk in a memory-mappable format
+
+    Rectangular embeddings (cls/cell modes) go into a preallocated ``.npy``
+    or chunked HDF5 matrix, optionally stored as float16/bfloat16, so only the
+    current chunk is ever held in memory. Ragged outputs (e.g. per-gene
+    embeddings) cannot be laid out as one matrix and are pickled instead.
+    """
+
+    def __init__(
+        self,
+        output_stem: Path,
+        n_rows: int,
+        output_format: str = "npy",
+        dtype: str = "float32",
+        obs_names: Sequence[str] = (),
+        chunk_rows: int = 10_000
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if dtype not in OUTPUT_DTYPES:
+            raise ValueError(f"Unknown output dtype: {dtype}")
+        self._output_stem = output_stem
+        self._n_rows = n_rows
+        self._format = output_format
+        self._dtype = dtype
+        self._obs_names = list(obs_names)
+        self._chunk_rows = chunk_rows
+        self._offset = 0
+        self._sink = None
+        self._dim = 0
+        self._ragged: Optional[List[Any]] = None
+        self.path: Optional[Path] = None
+        self.metadata: Dict = {}
+
+    def _open_sink(self, dim: int):
+        self._dim = dim
+        if self._format == "hdf5":
+            self._sink = _Hdf5Sink(self._output_stem, self._n_rows, dim, self._dtype, self._obs_names, self._chunk_rows)
+        else:
+            self._sink = _NpySink(self._output_stem, self._n_rows, dim, self._dtype, self._obs_names)
+        self.path = self._sink.path
+
+    def append(self, embeddings: Any):
+        array = None if self._ragged is not None else to_numpy(embeddings)
+        if array is None:
+            self._append_ragged(embeddings)
+            return
+
+        if self._sink is None:
+            self._open_sink(array.shape[1])
+        self._sink.write(self._offset, encode(array, self._dtype))
+        self._offset += array.shape[0]
+
+    def _append_ragged(self, embeddings: Any):
+        if self._sink is not None:
+            raise ValueError("Model returned rectangular and ragged embeddings in one run")
+        if self._ragged is None:
+            logger.info("Embeddings are not a matrix; falling back to pickled output")
+            self._ragged = []
+            self.path = self._output_stem.with_suffix(".pkl")
+        self._ragged.extend(embeddings)
+
+    def close(self) -> Path:
+        """Finish writing and return the output path; details end up in ``metadata``"""
+        if self._ragged is not None:
+            with open(self.path, "wb") as f:
+                pickle.dump(self._ragged, f)
+            self.metadata = {"format": "pickle", "dtype": None, "shape": [len(self._ragged)], "obs_names_path": None}
+            return self.path
+
+        if self._sink is None:
+            # No cells: still produce a valid (empty) matrix
+            self._open_sink(0)
+        if self._offset != self._n_rows:
+            raise ValueError(f"Expected {self._n_rows} embeddings, got {self._offset}")
+        self._sink.close()
+        self.metadata = {
+            "format": self._format,
+            "dtype": self._dtype,
+            "shape": [self._n_rows, self._dim],
+            "obs_names_path": str(self._sink.obs_names_path) if self._sink.obs_names_path else None,
+        }
+        return self.path
+
+    def files(self) -> List[Path]:
+        if self._sink is not None:
+            return self._sink.files()
+        return [self.path] if self.path is not None else []
+
+    def abort(self):
+        """Drop a partially written output"""
+        if self._sink is not None:
+            try:
+                self._sink.close()
+            except Exception:
+                pass
+        for path in self.files():
+            path.unlink(missing_ok=True)
+        self._sink = None
+        self._ragged = None
+
+
+def parse_index_ranges(spec: str, n_rows: int) -> np.ndarray:
+    """Parse "0:100,250,300:310" into row indices; ranges are half-open, negatives count from the end"""
+    rows = []
+    for token in filter(None, (t.strip() for t in spec.split(","))):
+        if ":" in token:
+            start, _, stop = token.partition(":")
+            start, stop, _ = slice(int(start) if start else None, int(stop) if stop else None).indices(n_rows)
+            rows.append(np.arange(start, stop))
+        else:
+            index = int(token)
+            if not -n_rows <= index < n_rows:
+                raise IndexError(f"Row {index} out of range for {n_rows} rows")
+            rows.append(np.array([index % n_rows]))
+    return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+
+@lru_cache(maxsize=16)
+def _obs_index(path: str, mtime: float):
+    import pandas as pd
+    if path.endswith((".h5", ".hdf5")):
+        import h5py
+        with h5py.File(path, "r") as f:
+            return pd.Index(f["obs_names"].asstr()[:])
+    return pd.Index(np.load(path, mmap_mode="r"))
+
+
+def lookup_obs_names(names_path: str, names: Sequence[str]) -> np.ndarray:
+    """Map obs names to row indices
+
+    Raises KeyError listing unknown names, and ValueError for names that
+    occur more than once in the result (e.g. after concatenating datasets).
+    """
+    index = _obs_index(names_path, Path(names_path).stat().st_mtime)
+    if index.is_unique:
+        rows = index.get_indexer(list(names))
+    else:
+        duplicated = index.duplicated(keep=False)
+        duplicate_names = set(index[duplicated])
+        ambiguous = [name for name in dict.fromkeys(names) if name in duplicate_names]
+        if ambiguous:
+            raise ValueError(
+                f"Obs names are not unique in this result: {', '.join(ambiguous[:10])}; query these rows by index"
+            )
+        positions = np.flatnonzero(~duplicated)
+        rows = index[~duplicated].get_indexer(list(names))
+        rows = np.where(rows >= 0, positions[rows], -1)
+    missing = [name for name, row in zip(names, rows) if row < 0]
+    if missing:
+        raise KeyError(f"Unknown obs names: {', '.join(missing[:10])}")
+    return rows
+
+
+def read_rows(file_path: str, output_format: str, rows: np.ndarray) -> np.ndarray:
+    """Read selected rows of a stored embedding matrix without loading the rest"""
+    if output_format == "npy":
+        return np.asarray(np.load(file_path, mmap_mode="r")[rows])
+    if output_format == "hdf5":
+        import h5py
+        # h5py needs sorted, unique indices for point selection
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        with h5py.File(file_path, "r") as f:
+            return f["embeddings"][unique_rows][inverse]
+    raise ValueError(f"Row queries are not supported for {output_format or 'legacy'} results")
+
+
+def read_obs_names(file_path: str, output_format: str, obs_names_path: Optional[str], rows: np.ndarray) -> Optional[List[str]]:
+    """Read the obs names of selected rows, if the result stores them"""
+    if output_format == "hdf5":
+        import h5py
+        with h5py.File(file_path, "r") as f:
+            if "obs_names" not in f:
+                return None
+            unique_rows, inverse = np.unique(rows, return_inverse=True)
+            return list(f["obs_names"].asstr()[unique_rows][inverse])
+    if obs_names_path:
+        return [str(name) for name in np.load(obs_names_path, mmap_mode="r")[rows]]
+    return None
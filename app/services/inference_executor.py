@@ -0,0 +1,123 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import functools
+import logging
+import multiprocessing
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[..., None]
+
+
+class InferenceCancelled(Exception):
+    """Raised by report() inside a worker once the run's cancel event is set"""
+
+
+def _call_with_queue(fn: Callable, args: tuple, progress_queue, cancel_event=None) -> Any:
+    """Run fn in a worker process, forwarding progress reports through a managed queue"""
+    def report(*values):
+        if cancel_event is not None and cancel_event.is_set():
+            raise InferenceCancelled()
+        progress_queue.put(values)
+    return fn(*args, report)
+
+
+class InferenceExecutor:
+    """Runs blocking inference work in a thread or process pool off the event loop
+
+    The submitted function receives a trailing ``report(*values)`` callable;
+    every report is delivered to ``on_progress`` on the event loop thread.
+    Once the run's ``cancel_event`` is set, the next report raises
+    InferenceCancelled in the worker, so work stops at a chunk boundary.
+    In process mode only arguments and the (small) return value cross the
+    process boundary, so inputs and outputs should be passed as file paths.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 1,
+        initializer: Optional[Callable] = None,
+        poll_interval: float = 0.5
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._initializer = initializer
+        self._poll_interval = poll_interval
+        self._executor: Optional[Executor] = None
+        self._manager = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn avoids forking a parent that may already hold torch/CUDA state
+                context = multiprocessing.get_context("spawn")
+                self._manager = context.Manager()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=self._initializer
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference",
+                    initializer=self._initializer
+                )
+            logger.info(f"Started {self.kind} inference executor with {self.max_workers} worker(s)")
+        return self._executor
+
+    def cancel_event(self):
+        """An event that stops a run it is passed to; usable from the event loop thread"""
+        self._get_executor()
+        if self.kind == "process":
+            return self._manager.Event()
+        return threading.Event()
+
+    async def run(
+        self,
+        fn: Callable,
+        *args,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_event=None
+    ) -> Any:
+        """Run fn(*args, report) in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        on_progress = on_progress or (lambda *values: None)
+
+        if self.kind == "thread":
+            def report(*values):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise InferenceCancelled()
+                loop.call_soon_threadsafe(on_progress, *values)
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, report))
+
+        progress_queue = self._manager.Queue()
+        future = loop.run_in_executor(executor, _call_with_queue, fn, args, progress_queue, cancel_event)
+        while not future.done():
+            await asyncio.wait([future], timeout=self._poll_interval)
+            self._drain(progress_queue, on_progress)
+        self._drain(progress_queue, on_progress)
+        return future.result()
+
+    def _drain(self, progress_queue, on_progress: ProgressCallback):
+        while True:
+            try:
+                values = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            on_progress(*values)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
@@ -0,0 +1,174 @@
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+import time
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.models.definitions import InferenceProfile
+from app.models.workflows import default_emb_mode
+from app.services.embedding_io import to_numpy
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# min_cosine_similarity values are starting points; tighten them per model with INFERENCE_PROFILES
+BUILTIN_PROFILES: Dict[str, InferenceProfile] = {
+    "default": InferenceProfile(name="default", min_cosine_similarity=1.0),
+    "float32": InferenceProfile(name="float32", inference_mode=True, min_cosine_similarity=0.9999),
+    "bf16": InferenceProfile(name="bf16", inference_mode=True, autocast="bfloat16", min_cosine_similarity=0.99),
+    "int8": InferenceProfile(name="int8", inference_mode=True, quantize_linear=True, min_cosine_similarity=0.98),
+}
+
+
+def get_inference_profile(name: str) -> InferenceProfile:
+    """Resolve a profile name; INFERENCE_PROFILES entries take precedence over the built-in ones"""
+    if name in settings.INFERENCE_PROFILES:
+        return InferenceProfile(name=name, **settings.INFERENCE_PROFILES[name])
+    if name in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[name]
+    raise ValueError(f"Unknown inference profile: {name}")
+
+
+def model_inference_profile(model_id: str) -> InferenceProfile:
+    """The profile configured for a model"""
+    return get_inference_profile(settings.MODEL_INFERENCE_PROFILES.get(model_id.lower(), settings.INFERENCE_PROFILE))
+
+
+def optimize_model(model: Any, profile: InferenceProfile, device: str) -> Any:
+    """Apply a profile's load-time transformations to a freshly loaded helical model
+
+    The torch module (``model.model``) is replaced by its dynamically
+    quantized and/or compiled version; the wrapper's process_data and
+    get_embeddings keep working unchanged.
+    """
+    if not (profile.quantize_linear or profile.compile):
+        return model
+    import torch
+    module = getattr(model, "model", None)
+    if not isinstance(module, torch.nn.Module):
+        logger.warning(f"Inference profile {profile.name}: model has no torch module, running it as loaded")
+        return model
+    if profile.quantize_linear:
+        if device.split(":")[0] != "cpu":
+            logger.warning(f"Inference profile {profile.name}: int8 dynamic quantization is CPU only, skipped on {device}")
+        else:
+            module = torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    if profile.compile:
+        module = torch.compile(module)
+    model.model = module
+    return model
+
+
+# torch's intra-op thread count is process-wide, so a profile may only change
+# it in a process that runs one job at a time (a process pool worker)
+_single_job_process = False
+
+
+def run_one_job_per_process():
+    """Declare that this process runs one job at a time, so profiles may set its torch thread count"""
+    global _single_job_process
+    _single_job_process = True
+
+
+@contextmanager
+def inference_context(profile: InferenceProfile, device: str):
+    """Run-time part of a profile: inference mode, autocast and thread count around forward passes"""
+    if not (profile.inference_mode or profile.autocast or profile.intra_op_threads):
+        # Nothing to set up; don't import torch for it
+        yield
+        return
+    if profile.intra_op_threads and not _single_job_process:
+        # Jobs overlapping on a thread pool would overwrite each other's (and the pool's) thread count
+        raise ValueError(
+            f"Inference profile {profile.name} sets intra_op_threads, which needs INFERENCE_EXECUTOR=process"
+        )
+    import torch
+    with ExitStack() as stack:
+        if profile.intra_op_threads:
+            stack.callback(torch.set_num_threads, torch.get_num_threads())
+            torch.set_num_threads(profile.intra_op_threads)
+        if profile.inference_mode:
+            stack.enter_context(torch.inference_mode())
+        if profile.autocast:
+            stack.enter_context(torch.autocast(device.split(":")[0], dtype=getattr(torch, profile.autocast)))
+        yield
+
+
+def configure_interop_threads():
+    """Apply INFERENCE_INTEROP_THREADS; torch only accepts it once per process, before any parallel work"""
+    if settings.INFERENCE_INTEROP_THREADS <= 0:
+        return
+    import torch
+    try:
+        torch.set_num_interop_threads(settings.INFERENCE_INTEROP_THREADS)
+    except RuntimeError:
+        pass  # Already set by an earlier worker of this process
+
+
+def _timed_embeddings(service, model_id: str, emb_mode: str, profile: InferenceProfile, adata) -> Tuple[np.ndarray, float]:
+    model = service.get_model(model_id, emb_mode, profile.name)
+    processed_data = model.process_data(adata.copy())
+    with inference_context(profile, service.device):
+        if profile.compile:
+            # Compilation happens on the first forward pass; keep it out of the timing
+            model.get_embeddings(model.process_data(adata[:min(64, adata.n_obs)].copy()))
+        start = time.perf_counter()
+        embeddings = to_numpy(model.get_embeddings(processed_data))
+        seconds = time.perf_counter() - start
+    if embeddings is None:
+        raise ValueError("The accuracy check needs rectangular embeddings (cls or cell mode)")
+    return embeddings.astype(np.float32), seconds
+
+
+def check_profile_accuracy(
+    service,
+    model_id: str,
+    profile: str,
+    reference_path: Path,
+    emb_mode: Optional[str] = None,
+    baseline: str = "default",
+    max_cells: int = 1000
+) -> Dict:
+    """Embed the first max_cells cells of a reference dataset with a profile and with the float32 baseline
+
+    Reports per-cell cosine similarity to the baseline embeddings, absolute
+    and relative error, and the throughput of both. ``passed`` is whether the
+    minimum similarity meets the profile's min_cosine_similarity.
+    """
+    import anndata
+
+    emb_mode = emb_mode or default_emb_mode(model_id)
+    data = anndata.read_h5ad(reference_path, backed="r")
+    try:
+        adata = data[:min(max_cells, data.n_obs)].to_memory()
+    finally:
+        data.file.close()
+
+    candidate = get_inference_profile(profile)
+    expected, baseline_seconds = _timed_embeddings(service, model_id, emb_mode, get_inference_profile(baseline), adata)
+    actual, profile_seconds = _timed_embeddings(service, model_id, emb_mode, candidate, adata)
+    if expected.shape != actual.shape:
+        raise ValueError(f"Profile {profile} produced embeddings of shape {actual.shape}, expected {expected.shape}")
+
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosine = np.sum(expected * actual, axis=1) / np.maximum(norms, 1e-12)
+    n_cells = adata.n_obs
+    return {
+        "model_id": model_id,
+        "emb_mode": emb_mode,
+        "profile": candidate.name,
+        "baseline": baseline,
+        "n_cells": n_cells,
+        "cosine_mean": float(cosine.mean()) if n_cells else 1.0,
+        "cosine_min": float(cosine.min()) if n_cells else 1.0,
+        "max_abs_error": float(np.abs(expected - actual).max()) if n_cells else 0.0,
+        "relative_error": float(np.linalg.norm(expected - actual) / max(np.linalg.norm(expected), 1e-12)),
+        "baseline_cells_per_second": n_cells / baseline_seconds if baseline_seconds else None,
+        "profile_cells_per_second": n_cells / profile_seconds if profile_seconds else None,
+        "speedup": baseline_seconds / profile_seconds if profile_seconds else None,
+        "min_cosine_similarity": candidate.min_cosine_similarity,
+        "passed": bool(n_cells == 0 or cosine.min() >= candidate.min_cosine_similarity),
+    }
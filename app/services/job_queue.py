@@ -0,0 +1,337 @@
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import logging
+import sqlite3
+import threading
+import time
+
+from app.models.workflows import SingleCellJob
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    workflow_id TEXT PRIMARY KEY,
+    workflow_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_lease ON jobs (state, lease_expires_at);
+"""
+
+# Columns added after the first schema version: name -> definition
+_EXTRA_COLUMNS = {
+    "cancel_reason": "TEXT",
+    # Copied from the payload so claim() can pick a job in SQL
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "size": "REAL NOT NULL DEFAULT 0",
+    "client_id": "TEXT",
+    "model_id": "TEXT",
+    "emb_mode": "TEXT",
+    "model_ids": "TEXT",  # every target's model as ",a,b,"
+    "n_obs": "INTEGER",
+    "memory_estimate": "INTEGER",
+}
+
+_CLAIM_INDEX = "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (state, priority DESC, model_id)"
+
+QUEUED = "queued"
+LEASED = "leased"
+
+QueuedJob = Tuple[str, SingleCellJob]
+
+
+class ClaimRank(NamedTuple):
+    """The scheduler's ranking (see WorkflowScheduler), evaluated in SQL
+
+    Among the highest priority jobs the lowest
+    size / (1 + waited / aging_seconds) + client_usage wins.
+    """
+    aging_seconds: float
+    client_usage: Dict[str, float] = {}  # client_id ("" if none) -> usage
+
+
+class ClaimFilter(NamedTuple):
+    """Conditions on the queued jobs claim() may pick, evaluated in SQL"""
+    busy_models: Tuple[str, ...] = ()  # skip jobs running any of these models
+    admit_memory: Optional[Tuple[int, int]] = None  # (budget, free): skip jobs that would wait for memory
+    batch_with: Optional[Tuple[str, str]] = None  # only single-target jobs of this (model_id, emb_mode)
+    max_cells: Optional[int] = None  # only jobs of known size up to this many cells
+    max_memory: Optional[int] = None  # only jobs estimated to need at most this many bytes
+
+    def sql(self) -> Tuple[str, List[Any]]:
+        conditions, params = [], []
+        for model_id in self.busy_models:
+            conditions.append("model_ids NOT LIKE ?")
+            params.append(f"%,{model_id},%")
+        if self.admit_memory is not None:
+            # Jobs without an estimate, or too large to ever fit, are admitted (and rejected) right away
+            conditions.append("(COALESCE(memory_estimate, 0) = 0 OR memory_estimate > ? OR memory_estimate <= ?)")
+            params.extend(self.admit_memory)
+        if self.batch_with is not None:
+            conditions.append("model_ids = ? AND emb_mode = ?")
+            params.extend([f",{self.batch_with[0]},", self.batch_with[1]])
+        if self.max_cells is not None:
+            conditions.append("n_obs <= ?")
+            params.append(self.max_cells)
+        if self.max_memory is not None:
+            conditions.append("COALESCE(memory_estimate, 0) <= ?")
+            params.append(self.max_memory)
+        return "".join(f" AND {condition}" for condition in conditions), params
+
+
+def _claim_columns(job: SingleCellJob) -> Tuple:
+    """Values of the claim columns, in _EXTRA_COLUMNS order after cancel_reason"""
+    model_ids = ",".join(target.model_id for target in job.targets)
+    return (
+        job.priority, job.size, job.client_id, job.model_id, job.emb_mode,
+        f",{model_ids},", job.n_obs, job.memory_estimate
+    )
+
+_CLAIM_COLUMNS = [name for name in _EXTRA_COLUMNS if name != "cancel_reason"]
+
+
+class JobQueue:
+    """Durable record of queued and running jobs, kept in SQLite next to the workflow records
+
+    A job is queued until a worker leases it. The lease has to be renewed by
+    heartbeats; a job whose lease expires (its worker died or was redeployed)
+    is queued again, up to max_attempts leases in total. Finished jobs are
+    removed. A single process orders jobs with its in-memory scheduler and
+    this table only makes sure no job is lost or stuck across restarts;
+    processes sharing the table claim() jobs by the same ranking.
+
+    Cancelling a queued job removes it; a leased job is flagged with a
+    cancel reason that its worker polls for.
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float = 60.0, max_attempts: int = 3):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def _add_missing_columns(self):
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in _EXTRA_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self._conn.execute(_CLAIM_INDEX)
+        # Jobs queued before the claim columns existed
+        rows = self._conn.execute("SELECT workflow_id, payload FROM jobs WHERE model_ids IS NULL").fetchall()
+        assignments = ", ".join(f"{name} = ?" for name in _CLAIM_COLUMNS)
+        for workflow_id, payload in rows:
+            job = SingleCellJob.model_validate_json(payload)
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE workflow_id = ?", (*_claim_columns(job), workflow_id)
+            )
+
+    def enqueue(self, job: SingleCellJob, workflow_type: str = "single_cell"):
+        now = time.time()
+        columns = ", ".join(_CLAIM_COLUMNS)
+        placeholders = ", ".join("?" for _ in _CLAIM_COLUMNS)
+        with self._lock:
+            self._conn.execute(
+                f"""
+                INSERT OR REPLACE INTO jobs (workflow_id, workflow_type, payload, state, attempts, enqueued_at, updated_at, {columns})
+                VALUES (?, ?, ?, ?, 0, ?, ?, {placeholders})
+                """,
+                (job.workflow_id, workflow_type, job.model_dump_json(), QUEUED, now, now, *_claim_columns(job))
+            )
+
+    def lease(self, workflow_id: str, owner: str) -> bool:
+        """Claim a queued job; False if it is gone or someone else holds it"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET state = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ?
+                WHERE workflow_id = ? AND state = ?
+                """,
+                (LEASED, owner, now + self.lease_seconds, now, workflow_id, QUEUED)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, owner: str, rank: ClaimRank, where: ClaimFilter = ClaimFilter()) -> Optional[QueuedJob]:
+        """Lease the best ranked queued job matching where, if any
+
+        The pick and the lease happen in one write transaction, so processes
+        sharing the database never claim the same job. The pick is a single
+        indexed query; callers work out where (e.g. the device's free
+        slots) before calling.
+        """
+        now = time.time()
+        conditions, params = where.sql()
+        usage, usage_params = "0", []
+        if rank.client_usage:
+            whens = " ".join("WHEN ? THEN ?" for _ in rank.client_usage)
+            usage = f"(CASE COALESCE(client_id, '') {whens} ELSE 0 END)"
+            usage_params = [value for item in rank.client_usage.items() for value in item]
+        query = f"""
+            SELECT workflow_id, workflow_type, payload FROM jobs
+            WHERE state = ?{conditions}
+            ORDER BY priority DESC, size / (1 + MAX(? - enqueued_at, 0) / ?) + {usage}, enqueued_at
+            LIMIT 1
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    query, (QUEUED, *params, now, rank.aging_seconds, *usage_params)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                workflow_id, workflow_type, payload = row
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET state = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE workflow_id = ?
+                    """,
+                    (LEASED, owner, now + self.lease_seconds, now, workflow_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return workflow_type, SingleCellJob.model_validate_json(payload)
+
+    def heartbeat(self, owner: str) -> int:
+        """Extend every lease held by owner; returns the number of leases renewed"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE state = ? AND lease_owner = ?",
+                (now + self.lease_seconds, now, LEASED, owner)
+            )
+        return cursor.rowcount
+
+    def complete(self, workflow_id: str, owner: Optional[str] = None) -> bool:
+        """Remove a finished (completed or failed) job"""
+        query, params = "DELETE FROM jobs WHERE workflow_id = ?", [workflow_id]
+        if owner is not None:
+            query += " AND lease_owner = ?"
+            params.append(owner)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        if cursor.rowcount == 0:
+            logger.warning(f"Job {workflow_id} was no longer leased by {owner}")
+        return cursor.rowcount > 0
+
+    def cancel(self, workflow_id: str, reason: str) -> Optional[str]:
+        """Cancel a job; returns the state it was in, or None if there is no such job
+
+        A queued job is removed right away. A leased job keeps running until
+        its worker sees the request (see cancel_requests) and stops it.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state FROM jobs WHERE workflow_id = ?", (workflow_id,)).fetchone()
+                if row is not None and row[0] == QUEUED:
+                    self._conn.execute("DELETE FROM jobs WHERE workflow_id = ?", (workflow_id,))
+                elif row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET cancel_reason = COALESCE(cancel_reason, ?), updated_at = ? WHERE workflow_id = ?",
+                        (reason, now, workflow_id)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def cancel_requests(self, owner: str) -> List[Tuple[str, str]]:
+        """(workflow_id, reason) of the jobs leased by owner that should be stopped"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workflow_id, cancel_reason FROM jobs WHERE state = ? AND lease_owner = ? AND cancel_reason IS NOT NULL",
+                (LEASED, owner)
+            ).fetchall()
+        return [(workflow_id, reason) for workflow_id, reason in rows]
+
+    def reap_cancelled(self) -> List[Tuple[str, str]]:
+        """Remove cancelled jobs whose lease expired before their worker stopped them
+
+        Returns (workflow_id, reason) of the removed jobs.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT workflow_id, cancel_reason FROM jobs WHERE state = ? AND lease_expires_at < ? AND cancel_reason IS NOT NULL",
+                    (LEASED, time.time())
+                ).fetchall()
+                self._conn.executemany("DELETE FROM jobs WHERE workflow_id = ?", [(row[0],) for row in rows])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(workflow_id, reason) for workflow_id, reason in rows]
+
+    def queued(self) -> List[QueuedJob]:
+        """Jobs waiting to be leased, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workflow_type, payload FROM jobs WHERE state = ? ORDER BY enqueued_at",
+                (QUEUED,)
+            ).fetchall()
+        return [(workflow_type, SingleCellJob.model_validate_json(payload)) for workflow_type, payload in rows]
+
+    def requeue_abandoned(self) -> Tuple[List[QueuedJob], List[Tuple[str, str]]]:
+        """Queue jobs with expired leases again; cancelled ones are left to reap_cancelled
+
+        Returns the requeued jobs and (workflow_id, error) for jobs that
+        used up their attempts; those are removed.
+        """
+        now = time.time()
+        requeued, failed = [], []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    """
+                    SELECT workflow_id, workflow_type, payload, attempts FROM jobs
+                    WHERE state = ? AND lease_expires_at < ? AND cancel_reason IS NULL
+                    """,
+                    (LEASED, now)
+                ).fetchall()
+                for workflow_id, workflow_type, payload, attempts in rows:
+                    if attempts >= self.max_attempts:
+                        self._conn.execute("DELETE FROM jobs WHERE workflow_id = ?", (workflow_id,))
+                        failed.append((workflow_id, f"Job abandoned after {attempts} attempts"))
+                    else:
+                        self._conn.execute(
+                            "UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE workflow_id = ?",
+                            (QUEUED, now, workflow_id)
+                        )
+                        requeued.append((workflow_type, SingleCellJob.model_validate_json(payload)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        for workflow_id, error in failed:
+            logger.error(f"Giving up on job {workflow_id}: {error}")
+        if requeued:
+            logger.info(f"Requeued {len(requeued)} abandoned job(s)")
+        return requeued, failed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import Optional
+import logging
+import os
+
+from app.core.config import get_settings
+from app.utils.h5ad import H5adHeader
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Larger values mean "no limit" in cgroup v1
+_CGROUP_UNLIMITED = 1 << 60
+
+
+def estimate_job_memory(header: H5adHeader, model_id: str, chunk_rows: int) -> int:
+    """Rough peak memory in bytes of embedding an input chunk by chunk
+
+    Per chunk the worker holds the rows as stored (values plus indices when
+    sparse), a dense float32 copy in case the model's preprocessing
+    densifies them, and per-cell tokens, activations and embeddings
+    (JOB_MEMORY_PER_CELL). Model weights are accounted for by the model pool.
+    """
+    rows = min(header.n_obs, chunk_rows)
+    itemsize = _itemsize(header.dtype) + header.index_itemsize
+    stored = rows * header.n_vars * header.density * itemsize
+    dense = rows * header.n_vars * 4
+    per_cell = settings.JOB_MEMORY_PER_CELL.get(model_id.lower(), max(settings.JOB_MEMORY_PER_CELL.values(), default=0))
+    return int(stored + dense + rows * per_cell + settings.JOB_MEMORY_OVERHEAD)
+
+
+def _itemsize(dtype: str) -> int:
+    import numpy as np
+    try:
+        return np.dtype(dtype).itemsize
+    except TypeError:
+        return 8
+
+
+def detect_memory_limit() -> Optional[int]:
+    """Memory available to this process: the cgroup (container) limit, else physical memory"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = Path(path).read_text().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < _CGROUP_UNLIMITED:
+            return int(value)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def job_memory_budget() -> Optional[int]:
+    """Bytes running jobs may use together; None disables memory admission
+
+    Unless JOB_MEMORY_BUDGET is set, this is JOB_MEMORY_FRACTION of the
+    memory limit minus what the model pool may keep resident.
+    """
+    if settings.JOB_MEMORY_BUDGET is not None:
+        return settings.JOB_MEMORY_BUDGET or None
+    limit = detect_memory_limit()
+    if limit is None:
+        logger.warning("Could not detect the memory limit; memory admission is disabled")
+        return None
+    budget = int(limit * settings.JOB_MEMORY_FRACTION) - settings.MODEL_POOL_MEMORY_BUDGET
+    if budget <= 0:
+        logger.warning(
+            f"Memory limit of {limit / 1e9:.1f} GB leaves nothing for jobs next to the model pool; "
+            "memory admission is disabled"
+        )
+        return None
+    logger.info(f"Job memory budget: {budget / 1e9:.1f} GB of {limit / 1e9:.1f} GB")
+    return budget
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# (model_id, device, emb_mode, inference profile)
+PoolKey = Tuple[str, ...]
+
+
+def estimate_model_size(model: Any) -> int:
+    """Estimate the resident size of a helical model in bytes from its torch parameters"""
+    module = getattr(model, "model", model)
+    size = 0
+    try:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            size += tensor.numel() * tensor.element_size()
+    except (AttributeError, TypeError):
+        return 0
+    return size
+
+
+class _PoolEntry:
+    def __init__(self, model: Any, size: int, load_time: float):
+        self.model = model
+        self.size = size
+        self.load_time = load_time
+        self.hits = 0
+        self.loaded_at = time.time()
+
+
+class ModelPool:
+    """Resident pool of loaded models with LRU eviction under a memory budget"""
+
+    def __init__(self, memory_budget: int, default_model_size: int = 0):
+        self._memory_budget = memory_budget
+        self._default_model_size = default_model_size
+        self._entries: "OrderedDict[PoolKey, _PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[PoolKey, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._total_load_time = 0.0
+
+    @property
+    def used_memory(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def get(self, key: PoolKey, loader: Callable[[], Any]) -> Any:
+        """Return the pooled model for key, loading it with loader on a miss"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry.model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the pool lock so other models stay available,
+        # but never load the same key twice concurrently.
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry.model
+                self._misses += 1
+
+            start = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start
+            size = estimate_model_size(model) or self._default_model_size
+            logger.info(f"Loaded model {key} in {load_time:.2f}s ({size / 1e6:.1f} MB)")
+
+            with self._lock:
+                self._total_load_time += load_time
+                self._entries[key] = _PoolEntry(model, size, load_time)
+                self._evict(keep=key)
+            return model
+
+    def _lookup(self, key: PoolKey) -> Optional[_PoolEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._hits += 1
+        return entry
+
+    def _evict(self, keep: PoolKey):
+        """Drop least recently used models until the pool fits its budget"""
+        while self.used_memory > self._memory_budget:
+            victim = next((k for k in self._entries if k != keep), None)
+            if victim is None:
+                logger.warning(
+                    f"Model {keep} ({self._entries[keep].size / 1e6:.1f} MB) "
+                    f"exceeds the pool budget of {self._memory_budget / 1e6:.1f} MB"
+                )
+                return
+            entry = self._entries.pop(victim)
+            self._evictions += 1
+            logger.info(f"Evicted model {victim} from pool ({entry.size / 1e6:.1f} MB)")
+
+    def evict(self, key: PoolKey) -> bool:
+        """Remove a model from the pool"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss/load-time statistics and the currently resident models"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "total_load_time": self._total_load_time,
+                "memory_budget": self._memory_budget,
+                "used_memory": self.used_memory,
+                "models": [
+                    {
+                        "model_id": key[0],
+                        "device": key[1],
+                        "emb_mode": key[2],
+                        "profile": key[3] if len(key) > 3 else None,
+                        "size": entry.size,
+                        "load_time": entry.load_time,
+                        "hits": entry.hits,
+                        "loaded_at": entry.loaded_at,
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
@@ -0,0 +1,208 @@
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import time
+import uuid
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_MANIFEST = "manifest.json"
+
+
+class ProcessedDataKey(NamedTuple):
+    input_sha256: str
+    model_id: str
+    model_version: str
+    params: str  # preprocessing parameters, e.g. the chunking of the input
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256("|".join(self).encode()).hexdigest()
+
+
+def _dump(obj: Any, path: Path):
+    """Write one chunk's process_data output so that loading it maps instead of copies
+
+    Hugging Face datasets are saved as Arrow files, which load_from_disk
+    memory-maps. Anything else is pickled (protocol 5) with numpy buffers
+    written out-of-band to a raw ``.buf`` file that is mapped on load.
+    """
+    if hasattr(obj, "save_to_disk"):
+        obj.save_to_disk(str(path.with_suffix(".arrow")))
+        return
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    spans, offset = [], 0
+    with open(path.with_suffix(".buf"), "wb") as f:
+        for buffer in buffers:
+            raw = buffer.raw()
+            f.write(raw)
+            spans.append((offset, raw.nbytes))
+            offset += raw.nbytes
+    with open(path.with_suffix(".pkl"), "wb") as f:
+        pickle.dump((spans, payload), f, protocol=5)
+
+
+def _load(path: Path) -> Any:
+    arrow_path = path.with_suffix(".arrow")
+    if arrow_path.exists():
+        import datasets
+        return datasets.load_from_disk(str(arrow_path))
+    with open(path.with_suffix(".pkl"), "rb") as f:
+        spans, payload = pickle.load(f)
+    if not sum(size for _, size in spans):
+        # Nothing was written out-of-band (e.g. only empty arrays); an empty file can't be mapped
+        return pickle.loads(payload, buffers=[b""] * len(spans))
+    with open(path.with_suffix(".buf"), "rb") as f:
+        # Copy-on-write: arrays stay writable, changes never reach the file
+        mapped = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+    return pickle.loads(payload, buffers=[mapped[start:start + size] for start, size in spans])
+
+
+def _tree_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class ProcessedEntry:
+    """Cached process_data outputs of one input, one per inference chunk"""
+
+    def __init__(self, path: Path, n_chunks: int):
+        self.path = path
+        self.n_chunks = n_chunks
+
+    def load(self, index: int) -> Optional[Any]:
+        """Load chunk index; None if it disappeared (e.g. evicted by another process)"""
+        try:
+            return _load(self.path / f"{index:05d}")
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            logger.warning(f"Could not load cached processed chunk {index} from {self.path}: {e}")
+            return None
+
+
+class ProcessedRecorder:
+    """Records the process_data output of every chunk of a run; the entry appears on commit only"""
+
+    def __init__(self, cache: "ProcessedDataCache", key: ProcessedDataKey):
+        self._cache = cache
+        self._key = key
+        self._path = cache.root / f".{key.digest}.{uuid.uuid4().hex}.tmp"
+        self._path.mkdir(parents=True)
+        self._n_chunks = 0
+        self.failed = False
+
+    def append(self, index: int, processed_data: Any):
+        if self.failed:
+            return
+        try:
+            _dump(processed_data, self._path / f"{index:05d}")
+            self._n_chunks += 1
+        except Exception as e:
+            # Not every model output can be stored; the run itself carries on uncached
+            logger.warning(f"Not caching processed data for {self._key.model_id}: {e}")
+            self.failed = True
+
+    def commit(self):
+        if self.failed:
+            self.abort()
+            return
+        with open(self._path / _MANIFEST, "w") as f:
+            json.dump({"key": list(self._key), "n_chunks": self._n_chunks, "created_at": time.time()}, f)
+        try:
+            os.rename(self._path, self._cache.root / self._key.digest)
+        except OSError:
+            # Another run stored the same entry first
+            self.abort()
+            return
+        self._cache.evict()
+
+    def abort(self):
+        shutil.rmtree(self._path, ignore_errors=True)
+
+
+class ProcessedDataCache:
+    """On-disk cache of model.process_data outputs keyed by input hash, model, version and preprocessing parameters
+
+    Each entry is a directory of per-chunk files in a memory-mappable form,
+    published by an atomic rename, so executor workers in other processes can
+    read and fill the cache without a shared index. Reads refresh an entry's
+    mtime; the least recently used entries are evicted beyond ``max_bytes``.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: ProcessedDataKey, n_chunks: int) -> Optional[ProcessedEntry]:
+        """Return the entry for key if it holds n_chunks chunks, or None on a miss"""
+        path = self.root / key.digest
+        try:
+            with open(path / _MANIFEST) as f:
+                manifest = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is None or manifest["n_chunks"] != n_chunks:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return ProcessedEntry(path, n_chunks)
+
+    def recorder(self, key: ProcessedDataKey) -> ProcessedRecorder:
+        return ProcessedRecorder(self, key)
+
+    def _entries(self) -> List[Path]:
+        return [p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith(".")]
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for path in self._entries():
+            try:
+                entries.append((path.stat().st_mtime, _tree_size(path), path))
+            except OSError:
+                continue  # Evicted concurrently
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self._evictions += 1
+            logger.info(f"Evicted processed data {path.name}")
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "entries": len(entries),
+            "size": sum(_tree_size(path) for path in entries),
+            "max_bytes": self._max_bytes,
+        }
+
+_processed_cache_instance = None
+
+def get_processed_cache() -> ProcessedDataCache:
+    global _processed_cache_instance
+    if _processed_cache_instance is None:
+        _processed_cache_instance = ProcessedDataCache(
+            settings.RESULTS_DIR / "processed",
+            max_bytes=settings.PROCESSED_CACHE_MAX_BYTES
+        )
+    return _processed_cache_instance
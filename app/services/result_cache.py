@@ -0,0 +1,181 @@
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from app.core.config import get_settings
+from app.utils.file_lock import FileLock
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class ResultCacheKey(NamedTuple):
+    input_sha256: str
+    model_id: str
+    model_version: str
+    emb_mode: str
+    output: str = "npy:float32"  # storage format and dtype of the artifact
+    model_config: str = ""  # helical version and model settings, see SingleCellService.model_fingerprint
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256("|".join(self).encode()).hexdigest()
+
+
+def link_or_copy(source: Path, destination: Path):
+    """Hard-link source to destination, copying when linking is not possible"""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    destination.unlink(missing_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class ResultCache:
+    """Cache of embedding artifacts keyed by input hash, model, version and embedding mode
+
+    Artifacts are hard-linked into the cache directory, so caching a result
+    and serving a hit cost no copy, and evicting an entry never removes a
+    file that a workflow still points to. Entries expire after ``ttl``
+    seconds and the least recently used ones are evicted beyond ``max_bytes``.
+    The index is re-read and written under a file lock, so several processes
+    can share one cache directory.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl: int):
+        self._root = root
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._index_path = root / "index.json"
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = FileLock(root / ".lock")
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._entries: Dict[str, Dict] = {}
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not self._index_path.exists():
+            return {}
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading result cache index: {e}")
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _is_expired(self, entry: Dict) -> bool:
+        return self._ttl > 0 and time.time() - entry["created_at"] > self._ttl
+
+    def get(self, key: ResultCacheKey) -> Optional[Dict]:
+        """Return the cache entry for key, or None on a miss"""
+        with self._lock():
+            self._entries = self._load_index()
+            entry = self._entries.get(key.digest)
+            if entry is not None and (self._is_expired(entry) or not Path(entry["file_path"]).exists()):
+                self._remove(key.digest)
+                self._save_index()
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            # Other processes evict by this too
+            entry["last_access"] = time.time()
+            self._save_index()
+            self._hits += 1
+            return dict(entry)
+
+    def put(
+        self,
+        key: ResultCacheKey,
+        source: Path,
+        content_type: str,
+        result_type: str,
+        metadata: Optional[Dict] = None
+    ) -> Dict:
+        """Add an artifact (and its obs_names sidecar, if any) to the cache"""
+        cached_path = self._root / f"{key.digest}{source.suffix}"
+        link_or_copy(source, cached_path)
+        metadata = dict(metadata or {})
+        if metadata.get("obs_names_path"):
+            cached_obs_names = self._root / f"{key.digest}.obs_names.npy"
+            link_or_copy(Path(metadata["obs_names_path"]), cached_obs_names)
+            metadata["obs_names_path"] = str(cached_obs_names)
+        now = time.time()
+        entry = {
+            "key": list(key),
+            "file_path": str(cached_path),
+            "file_size": cached_path.stat().st_size,
+            "content_type": content_type,
+            "type": result_type,
+            "metadata": metadata,
+            "created_at": now,
+            "last_access": now,
+        }
+        with self._lock():
+            self._entries = self._load_index()
+            self._entries[key.digest] = entry
+            self._evict()
+            self._save_index()
+        return entry
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            Path(entry["file_path"]).unlink(missing_ok=True)
+            obs_names_path = entry.get("metadata", {}).get("obs_names_path")
+            if obs_names_path:
+                Path(obs_names_path).unlink(missing_ok=True)
+
+    def _evict(self):
+        for digest in [d for d, e in self._entries.items() if self._is_expired(e)]:
+            self._remove(digest)
+            self._evictions += 1
+
+        total = sum(e["file_size"] for e in self._entries.values())
+        for digest in sorted(self._entries, key=lambda d: self._entries[d]["last_access"]):
+            if total <= self._max_bytes:
+                break
+            total -= self._entries[digest]["file_size"]
+            self._remove(digest)
+            self._evictions += 1
+            logger.info(f"Evicted cached result {digest}")
+
+    def stats(self) -> Dict:
+        with self._lock():
+            self._entries = self._load_index()
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "size": sum(e["file_size"] for e in self._entries.values()),
+                "max_bytes": self._max_bytes,
+                "ttl": self._ttl,
+            }
+
+_result_cache_instance = None
+
+def get_result_cache() -> ResultCache:
+    global _result_cache_instance
+    if _result_cache_instance is None:
+        _result_cache_instance = ResultCache(
+            settings.RESULTS_DIR / "cache",
+            max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+            ttl=settings.RESULT_CACHE_TTL
+        )
+    return _result_cache_instance
@@ -0,0 +1,159 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import logging
+import time
+
+from app.models.workflows import SingleCellJob
+
+logger = logging.getLogger(__name__)
+
+QueueItem = Tuple[str, SingleCellJob]
+
+
+class _Entry:
+    def __init__(self, item: QueueItem, seq: int, enqueued_at: float):
+        self.item = item
+        self.seq = seq
+        self.enqueued_at = enqueued_at
+
+    @property
+    def job(self) -> SingleCellJob:
+        return self.item[1]
+
+
+class WorkflowScheduler:
+    """Priority, size-aware and per-client fair queue of workflow jobs
+
+    A drop-in replacement for the asyncio.Queue the workers consume. get()
+    returns the pending job with the highest priority; among equal
+    priorities it picks the lowest score, where
+
+        score = size / (1 + waited / aging_seconds) + client_usage
+
+    size is n_obs * n_vars from the input header, so small jobs go first
+    (shortest-job-first), waiting shrinks a job's score so large jobs are
+    never starved, and client_usage is the (exponentially decayed) amount of
+    work already dispatched for the job's client, which spreads capacity
+    across clients. Selection is a linear scan of the pending jobs.
+    """
+
+    def __init__(
+        self,
+        aging_seconds: float = 60.0,
+        usage_half_life: float = 600.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self._aging_seconds = aging_seconds
+        self._usage_half_life = usage_half_life
+        self._clock = clock
+        self._pending: List[_Entry] = []
+        self._usage: Dict[str, Tuple[float, float]] = {}  # client -> (usage, as of)
+        self._seq = itertools.count()
+        self._unfinished = 0
+        self._available: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running loop
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def empty(self) -> bool:
+        return not self._pending
+
+    async def put(self, item: QueueItem):
+        condition = self._condition()
+        async with condition:
+            self._pending.append(_Entry(item, next(self._seq), self._clock()))
+            self._unfinished += 1
+            condition.notify_all()
+
+    async def get(self) -> QueueItem:
+        condition = self._condition()
+        async with condition:
+            await condition.wait_for(lambda: self._pending)
+            entry = min(self._pending, key=self._sort_key(self._clock()))
+            self._pending.remove(entry)
+            self._charge(entry.job, self._clock())
+            return entry.item
+
+    def take(self, predicate: Callable[[SingleCellJob], bool]) -> Optional[QueueItem]:
+        """Remove and return the best pending item whose job matches predicate, without waiting"""
+        now = self._clock()
+        matching = [entry for entry in self._pending if predicate(entry.job)]
+        if not matching:
+            return None
+        entry = min(matching, key=self._sort_key(now))
+        self._pending.remove(entry)
+        self._charge(entry.job, now)
+        return entry.item
+
+    def remove(self, workflow_id: str) -> bool:
+        """Drop a pending job (e.g. a cancelled one); False if it isn't pending"""
+        for entry in self._pending:
+            if entry.job.workflow_id == workflow_id:
+                self._pending.remove(entry)
+                self._unfinished -= 1
+                return True
+        return False
+
+    async def wait_for_put(self, timeout: float) -> bool:
+        """Wait until an item is added, for at most timeout seconds"""
+        condition = self._condition()
+        async with condition:
+            try:
+                await asyncio.wait_for(condition.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+
+    def _client_usage(self, client_id: Optional[str], now: float) -> float:
+        usage, as_of = self._usage.get(client_id or "", (0.0, now))
+        return usage * 0.5 ** ((now - as_of) / self._usage_half_life)
+
+    def _charge(self, job: SingleCellJob, now: float):
+        client = job.client_id or ""
+        self._usage[client] = (self._client_usage(client, now) + job.size, now)
+
+    def charge(self, job: SingleCellJob):
+        """Account a job dispatched outside get() (e.g. claimed from the shared queue)"""
+        self._charge(job, self._clock())
+
+    @property
+    def aging_seconds(self) -> float:
+        return self._aging_seconds
+
+    def client_usages(self) -> Dict[str, float]:
+        """Current (decayed) usage of every client seen, keyed by client_id ("" if none)"""
+        now = self._clock()
+        return {client: self._client_usage(client, now) for client in self._usage}
+
+    def rank(self, job: SingleCellJob, enqueued_at: float, now: Optional[float] = None) -> Tuple[int, float]:
+        """Sort key of a pending job; the lowest key runs first"""
+        now = self._clock() if now is None else now
+        waited = max(now - enqueued_at, 0.0)
+        aged_size = job.size / (1 + waited / self._aging_seconds)
+        return -job.priority, aged_size + self._client_usage(job.client_id, now)
+
+    def _sort_key(self, now: float):
+        return lambda entry: (*self.rank(entry.job, entry.enqueued_at, now), entry.seq)
+
+    def stats(self) -> Dict:
+        now = self._clock()
+        by_client: Dict[str, int] = {}
+        for entry in self._pending:
+            client = entry.job.client_id or "anonymous"
+            by_client[client] = by_client.get(client, 0) + 1
+        return {
+            "pending_by_client": by_client,
+            "oldest_wait": max((now - e.enqueued_at for e in self._pending), default=0.0),
+        }
@@ -1,107 +1,492 @@
 from uuid import uuid4
-import anndata
-import torch
 from app.models.workflows import (
+    EmbeddingTarget,
+    SingleCellJob,
     WorkflowStatus,
+    default_emb_mode,
 )
 from app.core.config import get_settings
-from helical.models.scgpt.model import scGPT, scGPTConfig
-from helical.models.geneformer.model import Geneformer, GeneformerConfig
+from app.models.definitions import ModelRegistry
+from app.services.embedding_io import CONTENT_TYPES, EmbeddingWriter, to_numpy
+from app.services.inference_executor import InferenceCancelled, InferenceExecutor
+from app.services.inference_profile import (
+    configure_interop_threads,
+    get_inference_profile,
+    inference_context,
+    model_inference_profile,
+    optimize_model,
+    run_one_job_per_process,
+)
+from app.services.model_pool import ModelPool
+from app.services.processed_cache import ProcessedDataKey, ProcessedEntry, ProcessedRecorder, get_processed_cache
+import asyncio
+import gc
+import importlib.metadata
+import json
 import logging
+import os
+import sys
+from functools import lru_cache
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
 
 settings = get_settings()
 
 logger = logging.getLogger(__name__)
 
+# torch, anndata and helical are imported on first use so that importing
+# this module (and starting the API) stays cheap
+
+def _scgpt_config(device: str, emb_mode: str):
+    from helical.models.scgpt.model import scGPTConfig
+    return scGPTConfig(device=device, emb_mode=emb_mode)
+
+def _load_scgpt(device: str, emb_mode: str):
+    from helical.models.scgpt.model import scGPT
+    return scGPT(configurer=_scgpt_config(device, emb_mode))
+
+def _geneformer_config(device: str, emb_mode: str):
+    from helical.models.geneformer.model import GeneformerConfig
+    return GeneformerConfig(device=device, emb_mode=emb_mode)
+
+def _load_geneformer(device: str, emb_mode: str):
+    from helical.models.geneformer.model import Geneformer
+    return Geneformer(configurer=_geneformer_config(device, emb_mode))
+
 class SingleCellService:
     def __init__(self):
         self._output_dir = settings.RESULTS_DIR
         self._output_dir.mkdir(exist_ok=True)
         
-        # Determine the best available device
-        self.device = self._get_device()
-        print(f"Using device: {self.device}")
-        
+        # Resolved on first use, as it needs torch
+        self._device: Optional[str] = None
+
         # Pass device through the config
         self._models = {
-            "scgpt": lambda: scGPT(
-                configurer=scGPTConfig(
-                    device=str(self.device),
-                    emb_mode="cls"
-                )
-            ),
-            "geneformer": lambda: Geneformer(
-                configurer=GeneformerConfig(
-                    device=str(self.device)
-                )
-            )
+            "scgpt": lambda emb_mode: _load_scgpt(self.device, emb_mode),
+            "geneformer": lambda emb_mode: _load_geneformer(self.device, emb_mode)
+        }
+        # Configs alone are cheap to build and key the result cache
+        self._configs = {
+            "scgpt": lambda emb_mode: _scgpt_config(self.device, emb_mode),
+            "geneformer": lambda emb_mode: _geneformer_config(self.device, emb_mode)
         }
+        self._configurers: Dict[Tuple[str, str], object] = {}
+
+        # Blocking inference runs here, never on the event loop
+        self._executor = InferenceExecutor(
+            kind=settings.INFERENCE_EXECUTOR,
+            max_workers=max(settings.INFERENCE_WORKERS, settings.WORKFLOW_WORKERS),
+            initializer=_init_inference_worker if settings.INFERENCE_EXECUTOR == "process" else _init_inference_thread
+        )
+
+        self._preload_task: Optional[asyncio.Task] = None
 
-    def _get_device(self) -> torch.device:
+        # Model versions key the processed data cache
+        self._model_registry = ModelRegistry()
+
+        # Loaded models stay resident between workflows
+        self._model_pool = ModelPool(
+            memory_budget=settings.MODEL_POOL_MEMORY_BUDGET,
+            default_model_size=settings.MODEL_POOL_DEFAULT_MODEL_SIZE
+        )
+
+    @property
+    def device(self) -> str:
+        if self._device is None:
+            self._device = self._get_device()
+            print(f"Using device: {self._device}")
+        return self._device
+
+    def _get_device(self) -> str:
         """
         Get the best available device for computation.
         Prioritizes: Metal (Mac) > CUDA > CPU
         """
+        import torch
         if torch.cuda.is_available():
-            return torch.device('cuda')
-        return torch.device('cpu')
+            return 'cuda'
+        return 'cpu'
+
+    def get_model(self, model_id: str, emb_mode: Optional[str] = None, profile: Optional[str] = None):
+        """Get a model from the pool, loading it on first use
 
-    async def process_workflow(self, workflow_id: str, input_path: Path, model_id: str, state_manager):
-        """Process a single workflow"""
+        emb_mode defaults to the model's own default mode. The model is
+        prepared for its inference profile (default: the one configured for
+        model_id), which is part of the pool key.
+        """
+        model_id = model_id.lower()
+        if model_id not in self._models:
+            raise ValueError(f"Unsupported model: {model_id}")
+        emb_mode = emb_mode or default_emb_mode(model_id)
+        inference_profile = get_inference_profile(profile) if profile else model_inference_profile(model_id)
+        key = (model_id, self.device, emb_mode, inference_profile.name)
+        return self._model_pool.get(
+            key, lambda: optimize_model(self._models[model_id](emb_mode), inference_profile, self.device)
+        )
+
+    def model_fingerprint(self, model_id: str, emb_mode: Optional[str] = None) -> str:
+        """The helical version and every config entry that can change the
+        embeddings get_model(model_id, emb_mode) computes, without loading it"""
+        model_id = model_id.lower()
+        if model_id not in self._configs:
+            raise ValueError(f"Unsupported model: {model_id}")
+        emb_mode = emb_mode or default_emb_mode(model_id)
+        key = (model_id, emb_mode)
+        if key not in self._configurers:
+            self._configurers[key] = self._configs[model_id](emb_mode)
+        configurer = self._configurers[key]
+        return f"helical-{helical_version()};{preprocessing_config(configurer)};{forward_config(configurer)}"
+
+    def preload_models(self, specs: List[str]):
+        """Load models given as "model_id" or "model_id:emb_mode" into the pool"""
+        for spec in specs:
+            model_id, _, emb_mode = spec.partition(":")
+            try:
+                self.get_model(model_id, emb_mode or None)
+            except Exception as e:
+                logger.error(f"Failed to preload model {spec}: {e}")
+
+    def get_pool_stats(self) -> Dict:
+        """Get model pool statistics"""
+        return self._model_pool.stats()
+
+    async def start(self):
+        """Warm up inference resources in the background at application startup"""
+        if self._executor.kind == "thread":
+            if settings.MODEL_POOL_PRELOAD:
+                # Don't hold up startup; the first workflow waits on the pool's load lock instead
+                self._preload_task = asyncio.create_task(
+                    asyncio.to_thread(self.preload_models, settings.MODEL_POOL_PRELOAD)
+                )
+        # Process workers preload their own pools through the executor initializer
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    def cancel_event(self):
+        """An event that, once set, stops the run it is passed to at its next chunk boundary"""
+        return self._executor.cancel_event()
+
+    async def process_workflow(
+        self,
+        job: SingleCellJob,
+        state_manager,
+        cancel_event=None,
+        targets: Optional[List[EmbeddingTarget]] = None
+    ) -> List[Dict]:
+        """Process a single workflow in the inference executor
+
+        Returns one result per target (all of job.targets by default);
+        recording them is left to the caller. Raises InferenceCancelled if
+        cancel_event is set before it finishes.
+        """
+        workflow_id = job.workflow_id
         try:
             state_manager.update_status(workflow_id, WorkflowStatus.PROCESSING)
             state_manager.update_progress(workflow_id, 0.0)  # Initialize progress
             logger.info(f"Starting workflow {workflow_id} with progress 0.0")
-            
-            print(f"Loading file: {input_path}")
-            data = anndata.read_h5ad(input_path)
-            logger.info(f"About to update progress for {workflow_id} to 0.4")
-            state_manager.update_progress(workflow_id, 0.4)  # 40% - Data loaded
-            logger.info(f"Progress updated for {workflow_id}")
-            
-            print(f"Initializing model: {model_id}")
-            model = self._models[model_id.lower()]()
-            logger.info(f"About to update progress for {workflow_id} to 0.5")
-            state_manager.update_progress(workflow_id, 0.5)  # 50% - Model initialized
-            logger.info(f"Progress updated for {workflow_id}")
-            
-            print("Processing data")
-            processed_data = model.process_data(data)
-            logger.info(f"About to update progress for {workflow_id} to 0.7")
-            state_manager.update_progress(workflow_id, 0.7)  # 70% - Data processed
-            logger.info(f"Progress updated for {workflow_id}")
-            
-            print("Generating embeddings")
-            embeddings = model.get_embeddings(processed_data)
-            logger.info(f"About to update progress for {workflow_id} to 0.9")
-            state_manager.update_progress(workflow_id, 0.9)  # 90% - Embeddings generated
-            logger.info(f"Progress updated for {workflow_id}")
-            
-            # Save results
-            output_file = f"{model_id}_embeddings_{workflow_id}.pt"
-            output_path = settings.RESULTS_DIR / output_file
-            torch.save(embeddings, output_path)
-            
-            result = {
-                'result_id': str(uuid4()),
-                'type': 'embeddings',
-                'file_path': str(output_path),
-                'file_size': output_path.stat().st_size,
-                'content_type': 'application/octet-stream'
-            }
-            
-            state_manager.set_result(workflow_id, result)
+
+            results = await self._executor.run(
+                run_single_cell_workflow,
+                job,
+                targets or job.targets,
+                on_progress=lambda *values: state_manager.update_progress(workflow_id, *values),
+                cancel_event=cancel_event
+            )
+
             logger.info(f"About to update progress for {workflow_id} to 1.0")
             state_manager.update_progress(workflow_id, 1.0)  # 100% - Complete
-            
-            return result
-            
+
+            return results
+
+        except InferenceCancelled:
+            raise
         except Exception as e:
             logger.error(f"Workflow {workflow_id} failed: {e}")
             state_manager.set_error(workflow_id, str(e))
             raise
 
+    def run_workflow(self, job: SingleCellJob, targets: List[EmbeddingTarget], report: Callable[..., None]) -> List[Dict]:
+        """Run the blocking part of a workflow; executes inside an executor worker
+
+        The input is opened in backed mode and processed in chunks of
+        INFERENCE_CHUNK_SIZE cells, with each chunk's embeddings streamed to
+        the output file, so memory use is bounded by the chunk size.
+        With several targets (model, embedding mode) each chunk is read once
+        and embedded by every model in turn, one output file per target.
+        process_data outputs are served from, or stored into, the processed
+        data cache, so a repeat run on the same input (e.g. in another
+        embedding mode) goes straight to get_embeddings without reading X.
+        Progress is reported as report(progress[, processed_cells, total_cells])
+        after each chunk is processed and embedded.
+        """
+        import anndata
+
+        print(f"Opening file: {job.input_path}")
+        data = anndata.read_h5ad(job.input_path, backed="r")
+        try:
+            n_obs = data.n_obs
+            report(0.05)  # 5% - Data opened
+
+            print(f"Initializing model(s): {', '.join(t.model_id for t in targets)}")
+            models = [self.get_model(target.model_id, target.emb_mode) for target in targets]
+            profiles = [model_inference_profile(target.model_id) for target in targets]
+            report(0.1, 0, n_obs)  # 10% - Model ready, embedding starts
+
+            chunk_size = settings.INFERENCE_CHUNK_SIZE
+            writers = [
+                EmbeddingWriter(
+                    output_stem(job, target),
+                    n_obs,
+                    output_format=job.output_format,
+                    dtype=job.output_dtype,
+                    obs_names=data.obs_names,
+                    chunk_rows=chunk_size
+                )
+                for target in targets
+            ]
+            cached, recorders = self._processed_data_sources(job, targets, models, -(-n_obs // chunk_size), chunk_size)
+            try:
+                for index, start in enumerate(range(0, n_obs, chunk_size)):
+                    stop = min(start + chunk_size, n_obs)
+                    print(f"Embedding cells {start}-{stop} of {n_obs}")
+                    chunk = None
+                    for i, (model, writer) in enumerate(zip(models, writers)):
+                        processed_data = cached[i].load(index) if cached[i] is not None else None
+                        if processed_data is None:
+                            if chunk is None:
+                                chunk = data[start:stop].to_memory()
+                            # process_data may modify its input, so every model but the last gets a copy
+                            last = i == len(models) - 1
+                            processed_data = model.process_data(chunk if last else chunk.copy())
+                            if recorders[i] is not None:
+                                recorders[i].append(index, processed_data)
+                        # Processing and embedding each account for half of a model's share of the chunk
+                        report(0.1 + 0.85 * (start + (stop - start) * (i + 0.5) / len(models)) / n_obs)
+                        with inference_context(profiles[i], self.device):
+                            embeddings = model.get_embeddings(processed_data)
+                        writer.append(embeddings)
+                        del embeddings
+                        del processed_data
+                    del chunk
+                    report(0.1 + 0.85 * stop / n_obs, stop, n_obs)
+                output_paths = [writer.close() for writer in writers]
+                for recorder in filter(None, recorders):
+                    recorder.commit()
+            except BaseException:
+                for writer in writers:
+                    writer.abort()
+                for recorder in filter(None, recorders):
+                    recorder.abort()
+                raise
+        finally:
+            data.file.close()
+
+        return [
+            self._result(writer, output_path, target)
+            for writer, output_path, target in zip(writers, output_paths, targets)
+        ]
+
+    async def process_batch(self, jobs: List[SingleCellJob], state_manager, cancel_event=None) -> Dict[str, Dict]:
+        """Process several small workflows for the same model in one inference pass"""
+        for job in jobs:
+            state_manager.update_status(job.workflow_id, WorkflowStatus.PROCESSING)
+            state_manager.update_progress(job.workflow_id, 0.0)
+
+        def on_progress(progress, processed_cells=None, total_cells=None):
+            # Batch-wide cell counts are shared out in proportion to each job's size
+            for job in jobs:
+                if processed_cells is None or not total_cells:
+                    state_manager.update_progress(job.workflow_id, progress)
+                else:
+                    share = job.n_obs / total_cells
+                    state_manager.update_progress(job.workflow_id, progress, round(processed_cells * share), job.n_obs)
+
+        results = await self._executor.run(
+            run_single_cell_batch, jobs, on_progress=on_progress, cancel_event=cancel_event
+        )
+        for job in jobs:
+            state_manager.update_progress(job.workflow_id, 1.0)
+        return results
+
+    def run_batch(self, jobs: List[SingleCellJob], report: Callable[..., None]) -> Dict[str, Dict]:
+        """Embed small jobs sharing (model_id, emb_mode) as one AnnData; executes inside an executor worker
+
+        Inputs are concatenated with an outer join on genes (missing genes
+        are zero, i.e. not expressed), embedded in a single process_data /
+        get_embeddings pass, and the rows are split back into one output
+        per workflow.
+        """
+        import anndata
+
+        first = jobs[0]
+        adatas = [anndata.read_h5ad(job.input_path) for job in jobs]
+        offsets = np.cumsum([0] + [adata.n_obs for adata in adatas])
+        n_obs = int(offsets[-1])
+        # Cell names only need to be unique within the combined object
+        combined = anndata.concat(adatas, join="outer", fill_value=0, index_unique="-")
+        report(0.05)
+
+        model = self.get_model(first.model_id, first.emb_mode)
+        report(0.1, 0, n_obs)
+        processed_data = model.process_data(combined)
+        report(0.5)
+        with inference_context(model_inference_profile(first.model_id), self.device):
+            embeddings = model.get_embeddings(processed_data)
+        del combined, processed_data
+        report(0.9, n_obs, n_obs)
+
+        array = to_numpy(embeddings)
+        rows = array if array is not None else list(embeddings)
+        results, writers = {}, []
+        try:
+            for job, adata, start, stop in zip(jobs, adatas, offsets[:-1], offsets[1:]):
+                writer = EmbeddingWriter(
+                    output_stem(job, job.targets[0]),
+                    adata.n_obs,
+                    output_format=job.output_format,
+                    dtype=job.output_dtype,
+                    obs_names=adata.obs_names,
+                    chunk_rows=settings.INFERENCE_CHUNK_SIZE
+                )
+                writers.append(writer)
+                writer.append(rows[start:stop])
+                results[job.workflow_id] = self._result(writer, writer.close(), job.targets[0])
+        except BaseException:
+            for writer in writers:
+                writer.abort()
+            raise
+        logger.info(f"Embedded {n_obs} cells for {len(jobs)} batched workflows")
+        return results
+
+    def _processed_data_sources(
+        self,
+        job: SingleCellJob,
+        targets: List[EmbeddingTarget],
+        models: List,
+        n_chunks: int,
+        chunk_size: int
+    ) -> Tuple[List[Optional[ProcessedEntry]], List[Optional[ProcessedRecorder]]]:
+        """Per target, its cached process_data outputs, or else a recorder to cache them
+
+        Entries are keyed on the installed helical version and the model's
+        preprocessing configuration, so upgrades and config changes don't
+        reuse stale data. The embedding mode is not part of the key:
+        preprocessing doesn't depend on it, so one entry serves all modes.
+        Targets sharing a key record it once.
+        """
+        if not settings.PROCESSED_CACHE_ENABLED:
+            return [None] * len(targets), [None] * len(targets)
+        cache = get_processed_cache()
+        cached, recorders, recording = [], [], set()
+        for target, model in zip(targets, models):
+            definition = self._model_registry.get_model(target.model_id)
+            key = ProcessedDataKey(
+                job.input_sha256,
+                target.model_id,
+                f"{definition.version if definition else 'unknown'}+helical-{helical_version()}",
+                f"chunk_rows={chunk_size};{preprocessing_config(model)}"
+            )
+            entry = cache.get(key, n_chunks)
+            cached.append(entry)
+            recorders.append(cache.recorder(key) if entry is None and key not in recording else None)
+            recording.add(key)
+        return cached, recorders
+
+    def _result(self, writer: EmbeddingWriter, output_path: Path, target: EmbeddingTarget) -> Dict:
+        return {
+            'result_id': str(uuid4()),
+            'type': 'embeddings',
+            'model_id': target.model_id,
+            'emb_mode': target.emb_mode,
+            'file_path': str(output_path),
+            'file_size': sum(path.stat().st_size for path in writer.files()),
+            'content_type': CONTENT_TYPES[writer.metadata['format']],
+            **writer.metadata
+        }
+
+# Model config entries that only affect the forward pass, not process_data
+_RUNTIME_CONFIG_KEYS = {"device", "accelerator", "emb_mode", "emb_layer", "batch_size", "nproc"}
+# Of those, the ones that only pick where and how fast it runs
+_PLACEMENT_CONFIG_KEYS = {"device", "accelerator", "nproc"}
+
+@lru_cache()
+def helical_version() -> str:
+    try:
+        return importlib.metadata.version("helical")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+def preprocessing_config(model) -> str:
+    """The settings of a loaded helical model that can change its process_data output, as canonical JSON"""
+    config = getattr(model, "config", None)
+    if not isinstance(config, dict):
+        return "{}"
+    fields = {k: v for k, v in config.items() if k not in _RUNTIME_CONFIG_KEYS}
+    return json.dumps(fields, sort_keys=True, default=str)
+
+def forward_config(model) -> str:
+    """The forward pass settings of a loaded helical model (or its config), as canonical JSON"""
+    config = getattr(model, "config", None)
+    if not isinstance(config, dict):
+        return "{}"
+    fields = {k: v for k, v in config.items() if k in _RUNTIME_CONFIG_KEYS - _PLACEMENT_CONFIG_KEYS}
+    return json.dumps(fields, sort_keys=True, default=str)
+
+def output_stem(job: SingleCellJob, target: EmbeddingTarget) -> Path:
+    """Result path (without suffix) of one target of a job"""
+    if len(job.targets) == 1:
+        return settings.RESULTS_DIR / f"{target.model_id}_embeddings_{job.workflow_id}"
+    return settings.RESULTS_DIR / f"{target.model_id}_{target.emb_mode}_embeddings_{job.workflow_id}"
+
+def run_single_cell_workflow(job: SingleCellJob, targets: List[EmbeddingTarget], report: Callable[..., None]) -> List[Dict]:
+    """Executor entry point; resolves the service of the current (possibly worker) process"""
+    try:
+        return get_service_instance().run_workflow(job, targets, report)
+    except InferenceCancelled:
+        pass
+    # Raised outside the handler, so the interrupted frames (and their chunks) are freed first
+    release_inference_memory()
+    raise InferenceCancelled(job.workflow_id)
+
+def run_single_cell_batch(jobs: List[SingleCellJob], report: Callable[..., None]) -> Dict[str, Dict]:
+    """Executor entry point for batched workflows"""
+    try:
+        return get_service_instance().run_batch(jobs, report)
+    except InferenceCancelled:
+        pass
+    release_inference_memory()
+    raise InferenceCancelled(*[job.workflow_id for job in jobs])
+
+def release_inference_memory():
+    """Return memory held by an interrupted run to the allocator (and the GPU cache)"""
+    gc.collect()
+    torch = sys.modules.get("torch")  # nothing to release on the GPU if torch was never loaded
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+def inference_threads_per_job() -> int:
+    """torch intra-op threads for one job, so concurrent jobs don't oversubscribe the cores"""
+    if settings.INFERENCE_THREADS_PER_JOB > 0:
+        return settings.INFERENCE_THREADS_PER_JOB
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WORKFLOW_WORKERS))
+
+def _init_inference_thread():
+    """Thread pool initializer: limit the intra-op threads used by jobs on this thread"""
+    import torch
+    torch.set_num_threads(inference_threads_per_job())
+    configure_interop_threads()
+
+def _init_inference_worker():
+    """Process pool initializer: limit intra-op threads and warm the worker's own model pool"""
+    _init_inference_thread()
+    run_one_job_per_process()
+    if settings.MODEL_POOL_PRELOAD:
+        get_service_instance().preload_models(settings.MODEL_POOL_PRELOAD)
+
 _service_instance = None
 
 def get_service_instance():
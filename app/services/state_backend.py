@@ -0,0 +1,209 @@
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import logging
+import sqlite3
+import threading
+import time
+
+from app.core.config import get_settings
+from app.models.workflows import WorkflowState
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class MemoryStateBackend:
+    """Workflow states held in this process only"""
+
+    shared = False
+
+    def __init__(self):
+        self._states: Dict[str, WorkflowState] = {}
+        self._versions: Dict[str, int] = {}
+
+    def get(self, workflow_id: str) -> Optional[WorkflowState]:
+        return self._states.get(workflow_id)
+
+    def put(self, state: WorkflowState) -> int:
+        """Store a state and return its new version"""
+        self._states[state.workflow_id] = state
+        self._versions[state.workflow_id] = self._versions.get(state.workflow_id, 0) + 1
+        return self._versions[state.workflow_id]
+
+    def versions(self, workflow_ids: Iterable[str]) -> Dict[str, int]:
+        return {i: self._versions[i] for i in workflow_ids if i in self._versions}
+
+    def written_version(self, workflow_id: str) -> Optional[int]:
+        return self._versions.get(workflow_id)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+
+class SqliteStateBackend:
+    """Workflow states in SQLite (WAL), shared by every process using the same database
+
+    Each write bumps a per-workflow version, which lets processes that
+    don't produce the updates notice changes cheaply.
+
+    Writes are behind, like WorkflowWriter's: put() snapshots the state and
+    returns immediately, and a background thread writes pending states in
+    batches, one transaction each. Updates to the same workflow within
+    ``delay`` seconds, typically progress reports, are coalesced into one
+    write. Reads in this process see its pending states.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: Path, delay: float = 0.05, retry_delay: float = 1.0):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS workflow_states (
+                workflow_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._lock = threading.Lock()  # Guards the connection
+        self._delay = delay
+        self._retry_delay = retry_delay
+        # workflow_id -> serialized state, not yet written / being written
+        self._pending: Dict[str, str] = {}
+        self._in_flight: Dict[str, str] = {}
+        # Version of the last state of each workflow this process wrote
+        self._written: Dict[str, int] = {}
+        self._closed = False
+        self._flush_waiters = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def get(self, workflow_id: str) -> Optional[WorkflowState]:
+        with self._cond:
+            data = self._pending.get(workflow_id) or self._in_flight.get(workflow_id)
+        if data is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT data FROM workflow_states WHERE workflow_id = ?", (workflow_id,)
+                ).fetchone()
+            data = row[0] if row else None
+        return WorkflowState.model_validate_json(data) if data else None
+
+    def put(self, state: WorkflowState) -> None:
+        """Queue a state for writing; its version is only known once written"""
+        data = state.model_dump_json()
+        with self._cond:
+            if self._closed:
+                # Late updates after shutdown are written through
+                self._write({state.workflow_id: data})
+                return
+            self._pending[state.workflow_id] = data
+            self._cond.notify_all()
+
+    def _write(self, batch: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                versions = {
+                    workflow_id: self._conn.execute(
+                        """
+                        INSERT INTO workflow_states (workflow_id, version, updated_at, data) VALUES (?, 1, ?, ?)
+                        ON CONFLICT (workflow_id) DO UPDATE SET
+                            version = version + 1, updated_at = excluded.updated_at, data = excluded.data
+                        RETURNING version
+                        """,
+                        (workflow_id, now, data)
+                    ).fetchone()[0]
+                    for workflow_id, data in batch.items()
+                }
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Recorded under the connection lock, so a poll never sees these versions first
+            self._written.update(versions)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give rapid successive updates a chance to coalesce,
+                # unless someone is waiting on a flush
+                self._cond.wait_for(lambda: self._closed or self._flush_waiters, self._delay)
+                self._in_flight, self._pending = self._pending, {}
+
+            try:
+                self._write(self._in_flight)
+                written = True
+            except Exception as e:
+                logger.error(f"Error persisting {len(self._in_flight)} workflow state(s): {e}")
+                written = False
+
+            with self._cond:
+                if not written:
+                    # Keep newer puts; retry the rest
+                    for workflow_id, data in self._in_flight.items():
+                        self._pending.setdefault(workflow_id, data)
+                self._in_flight = {}
+                self._cond.notify_all()
+                if not written and not self._closed:
+                    self._cond.wait(self._retry_delay)
+                elif not written:
+                    logger.error(f"Dropping {len(self._pending)} unpersisted workflow state(s) on close")
+                    self._pending.clear()
+
+    def versions(self, workflow_ids: Iterable[str]) -> Dict[str, int]:
+        workflow_ids = list(workflow_ids)
+        if not workflow_ids:
+            return {}
+        placeholders = ", ".join("?" * len(workflow_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT workflow_id, version FROM workflow_states WHERE workflow_id IN ({placeholders})",
+                workflow_ids
+            ).fetchall()
+        return dict(rows)
+
+    def written_version(self, workflow_id: str) -> Optional[int]:
+        """Version of the last state of a workflow written by this process"""
+        return self._written.get(workflow_id)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write every state put so far, without waiting for the coalescing delay"""
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout: Optional[float] = None):
+        """Write pending states, stop the writer thread and close the database"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._lock:
+            self._conn.close()
+
+
+def get_state_backend():
+    """The backend selected by STATE_BACKEND"""
+    if settings.STATE_BACKEND == "sqlite":
+        return SqliteStateBackend(settings.WORKFLOW_DB_PATH, delay=settings.STATE_WRITE_DELAY)
+    return MemoryStateBackend()
@@ -1,108 +1,109 @@
 from uuid import uuid4
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-import json
+from typing import Dict, List, NamedTuple, Optional, Any, Tuple, Union
 import logging
 import asyncio
+import os
+import socket
+import time
 
 from fastapi import UploadFile
 
 from app.core.config import get_settings
 from app.models.workflows import (
+    DatasetInspection,
+    EmbeddingTarget,
+    SingleCellJob,
     WorkflowResult,
     WorkflowStatus,
-    WorkflowResultItem
+    WorkflowResultItem,
+    WorkflowSummary,
+    default_emb_mode
 )
-from app.services.single_cell_service import get_service_instance as get_single_cell_service
-from app.services.workflow_state_manager import WorkflowStateManager
+from app.models.definitions import ModelRegistry
+from app.services.admission import AdmissionController, MemoryBudgetExceededError
+from app.services.blob_store import BlobNotFoundError, get_blob_store
+from app.services.dataset_inspector import InvalidInputError, inspect_h5ad
+from app.services.processed_cache import get_processed_cache
+from app.services.result_cache import ResultCacheKey, get_result_cache, link_or_copy
+from app.services.inference_executor import InferenceCancelled
+from app.services.inference_profile import model_inference_profile
+from app.services.job_queue import LEASED, ClaimFilter, ClaimRank, JobQueue
+from app.services.memory_estimator import job_memory_budget
+from app.services.scheduler import WorkflowScheduler
+from app.services.state_backend import get_state_backend
+from app.services.single_cell_service import get_service_instance as get_single_cell_service, output_stem
+from app.services.workflow_state_manager import TERMINAL_STATUSES, WorkflowStateManager, state_event
+from app.services.workflow_store import get_workflow_store
+from app.services.workflow_writer import WorkflowWriter
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+class WorkflowFinishedError(Exception):
+    """Raised when cancelling a workflow that already completed or failed"""
+
+class _Output(NamedTuple):
+    """One target of a job, its result cache key and its result once known"""
+    target: EmbeddingTarget
+    cache_key: ResultCacheKey
+    result: Optional[Dict] = None
+
 class WorkflowService:
     """Service for managing workflows of any type"""
     
     def __init__(self):
-        self._workflows = {}  # In-memory dictionary storage
+        self._workflows = {}  # Workflows touched by this process
         self._output_dir = settings.RESULTS_DIR
         self._output_dir.mkdir(exist_ok=True)
         
-        # Create a directory for storing workflow metadata
-        self._workflows_dir = settings.UPLOAD_DIR / "workflows"
-        self._workflows_dir.mkdir(exist_ok=True)
-        
-        # Load existing workflows from disk
-        self._load_workflows_from_disk()
+        # Workflow records live in SQLite; legacy JSON records are migrated once
+        self._store = get_workflow_store()
+        # Record updates are written behind, off the event loop
+        self._writer = WorkflowWriter(self._store, delay=settings.WORKFLOW_WRITE_DELAY)
         
-        self._state_manager = WorkflowStateManager()
-        self._processing_queue = asyncio.Queue()
-        self._worker_task = None
+        # With a shared backend, state and queue are visible to every API/worker process
+        self._shared = settings.STATE_BACKEND != "memory"
+        self._state_manager = WorkflowStateManager(
+            get_state_backend(),
+            poll_interval=settings.STATE_POLL_INTERVAL
+        )
+        self._processing_queue = WorkflowScheduler(
+            aging_seconds=settings.SCHEDULER_AGING_SECONDS,
+            usage_half_life=settings.SCHEDULER_USAGE_HALF_LIFE,
+            # Shared-queue jobs carry wall-clock enqueue times
+            clock=time.time if self._shared else time.monotonic
+        )
+        self._job_available = asyncio.Event()
+        # Durable copy of the queue, so jobs survive restarts
+        self._jobs = JobQueue(
+            settings.WORKFLOW_DB_PATH,
+            lease_seconds=settings.JOB_LEASE_SECONDS,
+            max_attempts=settings.JOB_MAX_ATTEMPTS
+        )
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._worker_tasks: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._cancel_task: Optional[asyncio.Task] = None
+        # Runs in this process: workflow_id -> cancel event of its run, and deadline timer
+        self._cancel_events: Dict[str, Any] = {}
+        self._deadline_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._cancel_reasons: Dict[str, str] = {}
+        self._active_workers = 0
+        self._admission = AdmissionController(
+            settings.MODEL_CONCURRENCY,
+            settings.DEVICE_CONCURRENCY,
+            memory_budget=job_memory_budget()
+        )
         self._single_cell_service = get_single_cell_service()
-    
-    def _load_workflows_from_disk(self):
-        """Load workflow data from JSON files on disk"""
-        for workflow_file in self._workflows_dir.glob("*.json"):
-            try:
-                with open(workflow_file, "r") as f:
-                    workflow_data = json.load(f)
-                    
-                # Convert the loaded data to a WorkflowResult object
-                workflow_id = workflow_file.stem
-                
-                # Convert results data
-                results = []
-                for result in workflow_data.get("results", []):
-                    results.append(WorkflowResultItem(
-                        result_id=result["result_id"],
-                        type=result["type"],
-                        file_path=result["file_path"],
-                        content_type=result["content_type"],
-                        created_at=datetime.fromisoformat(result["created_at"]),
-                        file_size=result.get("file_size", 0)
-                    ))
-                
-                # Create the workflow result object
-                self._workflows[workflow_id] = WorkflowResult(
-                    workflow_id=workflow_id,
-                    status=workflow_data["status"],
-                    created_at=datetime.fromisoformat(workflow_data["created_at"]),
-                    updated_at=datetime.fromisoformat(workflow_data["updated_at"]),
-                    error_message=workflow_data.get("error_message"),
-                    results=results
-                )
-                
-            except Exception as e:
-                print(f"Error loading workflow from {workflow_file}: {e}")
+        self._blob_store = get_blob_store()
+        self._result_cache = get_result_cache()
+        self._model_registry = ModelRegistry()
     
     def _save_workflow_to_disk(self, workflow_id: str, workflow: WorkflowResult):
-        """Save workflow data to a JSON file on disk"""
-        workflow_file = self._workflows_dir / f"{workflow_id}.json"
-        
-        # Convert the workflow object to a serializable dict
-        workflow_data = {
-            "workflow_id": workflow.workflow_id,
-            "status": workflow.status.value,
-            "created_at": workflow.created_at.isoformat(),
-            "updated_at": workflow.updated_at.isoformat(),
-            "error_message": workflow.error_message,
-            "results": []
-        }
-        
-        # Convert results to serializable dicts
-        for result in workflow.results:
-            workflow_data["results"].append({
-                "result_id": result.result_id,
-                "type": result.type,
-                "file_path": result.file_path,
-                "content_type": result.content_type,
-                "created_at": result.created_at.isoformat(),
-                "file_size": result.file_size
-            })
-        
-        # Write to file
-        with open(workflow_file, "w") as f:
-            json.dump(workflow_data, f, indent=2)
+        """Queue a workflow record for persistence"""
+        self._writer.submit(workflow)
     
     def create_workflow(self) -> WorkflowResult:
         """Create a new workflow and return its ID"""
@@ -111,7 +112,7 @@ class WorkflowService:
         
         workflow = WorkflowResult(
             workflow_id=workflow_id,
-            status=WorkflowStatus.CREATED,
+            status=WorkflowStatus.PENDING,
             created_at=now,
             updated_at=now,
             results=[]
@@ -131,103 +132,228 @@ class WorkflowService:
     
     def get_workflow(self, workflow_id: str) -> Optional[WorkflowResult]:
         """Get a workflow by ID"""
-        # First check in-memory cache
         workflow = self._workflows.get(workflow_id)
-        
-        # If not found in memory, try loading from disk
         if workflow is None:
-            workflow_file = self._workflows_dir / f"{workflow_id}.json"
-            if workflow_file.exists():
-                try:
-                    with open(workflow_file, "r") as f:
-                        workflow_data = json.load(f)
-                    
-                    # Convert results data
-                    results = []
-                    for result in workflow_data.get("results", []):
-                        results.append(WorkflowResultItem(
-                            result_id=result["result_id"],
-                            type=result["type"],
-                            file_path=result["file_path"],
-                            content_type=result["content_type"],
-                            created_at=datetime.fromisoformat(result["created_at"]),
-                            file_size=result.get("file_size", 0)
-                        ))
-                    
-                    # Create the workflow result object
-                    workflow = WorkflowResult(
-                        workflow_id=workflow_id,
-                        status=workflow_data["status"],
-                        created_at=datetime.fromisoformat(workflow_data["created_at"]),
-                        updated_at=datetime.fromisoformat(workflow_data["updated_at"]),
-                        error_message=workflow_data.get("error_message"),
-                        results=results
-                    )
-                    
-                    # Cache in memory
-                    self._workflows[workflow_id] = workflow
-                    
-                except Exception as e:
-                    print(f"Error loading workflow {workflow_id}: {e}")
-                    return None
-        
+            workflow = self._store.get(workflow_id)
         return workflow
 
     def get_workflows(self) -> List[WorkflowResult]:
-        """Get all workflows sorted by creation date (newest first)"""
-        workflows = list(self._workflows.values())
-        
-        # Then check disk for any workflows not in memory
-        for workflow_file in self._workflows_dir.glob("*.json"):
-            workflow_id = workflow_file.stem
-            
-            # Skip if already in memory
-            if workflow_id in self._workflows:
-                continue
-                
+        """Get all workflows sorted by creation date (newest first); blocks, so call it off the event loop"""
+        workflows, _ = self._list_flushed()
+        return workflows
+
+    def list_workflows(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        status: Optional[WorkflowStatus] = None,
+        model_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        summary: bool = False
+    ) -> Tuple[List[Union[WorkflowResult, WorkflowSummary]], Optional[str]]:
+        """Get a filtered page of workflows (newest first) and the next page's cursor
+
+        Blocks on the store, so call it off the event loop.
+        """
+        return self._list_flushed(
+            limit=limit,
+            cursor=cursor,
+            status=status.value if status else None,
+            model_id=model_id,
+            created_after=created_after,
+            created_before=created_before,
+            summary=summary
+        )
+
+    def _list_flushed(self, summary: bool = False, **filters):
+        """List workflows from the store once pending records are written
+
+        If they aren't written within WORKFLOW_FLUSH_TIMEOUT (e.g. while the
+        store keeps failing), the listed ones are served with their pending
+        updates overlaid instead.
+        """
+        if self._writer.flush(settings.WORKFLOW_FLUSH_TIMEOUT):
+            return self._store.list(summary=summary, **filters)
+        logger.warning("Listing workflows before pending record updates are written")
+        workflows, next_cursor = self._store.list(summary=summary, **filters)
+        return self._writer.overlay(workflows, summary), next_cursor
+
+    async def _flush(self) -> bool:
+        """Write out pending records and states, waiting at most WORKFLOW_FLUSH_TIMEOUT for each"""
+        records = await asyncio.to_thread(self._writer.flush, settings.WORKFLOW_FLUSH_TIMEOUT)
+        states = await asyncio.to_thread(self._state_manager.flush, settings.WORKFLOW_FLUSH_TIMEOUT)
+        return records and states
+
+    async def start_worker(self):
+        if not self._worker_tasks:
+            await self._recover_jobs()
+            # Shared-backend API processes may leave all processing to standalone workers
+            workers = settings.WORKFLOW_WORKERS if self._shared else max(1, settings.WORKFLOW_WORKERS)
+            self._worker_tasks = [
+                asyncio.create_task(self._process_queue(worker_id))
+                for worker_id in range(workers)
+            ]
+            self._lease_task = asyncio.create_task(self._maintain_leases())
+            if self._shared:
+                self._cancel_task = asyncio.create_task(self._watch_cancellations())
+            logger.info(f"Started {len(self._worker_tasks)} background worker(s)")
+
+    async def _recover_jobs(self):
+        """Re-enqueue jobs left queued, or abandoned mid-run, by earlier processes"""
+        requeued, failed = await asyncio.to_thread(self._jobs.requeue_abandoned)
+        await self._fail_abandoned(failed)
+        await self._finish_cancelled(await asyncio.to_thread(self._jobs.reap_cancelled))
+        if self._shared:
+            # Queued jobs are claimed straight from the shared queue
+            for workflow_type, job in requeued:
+                await self._restore_job(workflow_type, job)
+            return
+        queued = await asyncio.to_thread(self._jobs.queued)
+        for workflow_type, job in queued:
+            await self._restore_job(workflow_type, job)
+        if queued:
+            logger.info(f"Recovered {len(queued)} queued job(s)")
+
+    async def _maintain_leases(self):
+        """Heartbeat the leases of running jobs and pick up jobs whose worker went away"""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
             try:
-                with open(workflow_file, "r") as f:
-                    workflow_data = json.load(f)
-                
-                # Convert results data
-                results = []
-                for result in workflow_data.get("results", []):
-                    results.append(WorkflowResultItem(
-                        result_id=result["result_id"],
-                        type=result["type"],
-                        file_path=result["file_path"],
-                        content_type=result["content_type"],
-                        created_at=datetime.fromisoformat(result["created_at"]),
-                        file_size=result.get("file_size", 0)
-                    ))
-                
-                # Create and add workflow
-                workflow = WorkflowResult(
-                    workflow_id=workflow_id,
-                    status=workflow_data["status"],
-                    created_at=datetime.fromisoformat(workflow_data["created_at"]),
-                    updated_at=datetime.fromisoformat(workflow_data["updated_at"]),
-                    error_message=workflow_data.get("error_message"),
-                    results=results
-                )
-                
-                # Cache in memory and add to results
-                self._workflows[workflow_id] = workflow
-                workflows.append(workflow)
-                
+                await asyncio.to_thread(self._jobs.heartbeat, self._worker_id)
+                requeued, failed = await asyncio.to_thread(self._jobs.requeue_abandoned)
+                await self._fail_abandoned(failed)
+                await self._finish_cancelled(await asyncio.to_thread(self._jobs.reap_cancelled))
+                for workflow_type, job in requeued:
+                    await self._restore_job(workflow_type, job)
             except Exception as e:
-                print(f"Error loading workflow {workflow_id}: {e}")
+                logger.error(f"Error maintaining job leases: {e}")
+
+    async def _restore_job(self, workflow_type: str, job: SingleCellJob):
+        workflow = self.get_workflow(job.workflow_id)
+        if workflow is None:
+            logger.warning(f"Dropping job {job.workflow_id}: its workflow record is gone")
+            await asyncio.to_thread(self._jobs.complete, job.workflow_id)
+            return
+        workflow.status = WorkflowStatus.PENDING
+        self.update_workflow(workflow)
+        if await self._state_manager.claim(job.workflow_id) is None:
+            self._state_manager.create_workflow(job.workflow_id)
+        else:
+            self._state_manager.update_status(job.workflow_id, WorkflowStatus.PENDING)
+        await self._dispatch(workflow_type, job)
+
+    async def _dispatch(self, workflow_type: str, job: SingleCellJob):
+        """Hand a durably queued job to the workers"""
+        if self._shared:
+            # Any process may claim it, so the record must be in the store rather than only here
+            await self._release_local(job.workflow_id)
+            self._job_available.set()
+        else:
+            await self._processing_queue.put((workflow_type, job))
+            self._job_available.set()
+
+    async def _release_local(self, workflow_id: str):
+        """Write out a workflow's record and state and stop serving them from this process' memory"""
+        if not await self._flush():
+            # Other processes can't read them yet; keep serving them from here
+            logger.warning(f"Workflow {workflow_id} is not written out yet; still served by this process")
+            return
+        self._workflows.pop(workflow_id, None)
+        self._state_manager.release(workflow_id)
+
+    def _release_input(self, workflow: WorkflowResult):
+        """Drop a finished workflow's reference on its input blob; the record then no longer holds one"""
+        if workflow.input_sha256 is None:
+            return
+        sha256, workflow.input_sha256 = workflow.input_sha256, None
+        try:
+            self._blob_store.release(sha256)
+        except OSError as e:
+            logger.warning(f"Could not release input blob {sha256} of workflow {workflow.workflow_id}: {e}")
+
+    async def _fail_abandoned(self, failed: List[Tuple[str, str]]):
+        for workflow_id, error in failed:
+            workflow = self.get_workflow(workflow_id)
+            if workflow is not None:
+                workflow.status = WorkflowStatus.FAILED
+                workflow.error_message = error
+                self._release_input(workflow)
+                self.update_workflow(workflow)
+            await self._state_manager.claim(workflow_id)
+            self._state_manager.set_error(workflow_id, error)
+            self._state_manager.release(workflow_id)
+
+    async def _watch_cancellations(self):
+        """Stop local runs whose cancellation was requested through another process"""
+        while True:
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            if not self._cancel_events:
                 continue
-        
-        return sorted(workflows, key=lambda w: w.created_at, reverse=True)
+            try:
+                requests = await asyncio.to_thread(self._jobs.cancel_requests, self._worker_id)
+                for workflow_id, reason in requests:
+                    self._request_cancel(workflow_id, reason)
+            except Exception as e:
+                logger.error(f"Error polling job cancellations: {e}")
 
-    async def start_worker(self):
-        if self._worker_task is None:
-            self._worker_task = asyncio.create_task(self._process_queue())
-            logger.info("Background worker started")
+    async def _finish_cancelled(self, cancelled: List[Tuple[str, str]]):
+        for workflow_id, reason in cancelled:
+            await self._state_manager.claim(workflow_id)
+            self._mark_cancelled(workflow_id, reason)
+            self._state_manager.release(workflow_id)
+
+    def _mark_cancelled(self, workflow_id: str, reason: str):
+        workflow = self.get_workflow(workflow_id)
+        if workflow is not None:
+            workflow.status = WorkflowStatus.CANCELLED
+            workflow.error_message = reason
+            self._release_input(workflow)
+            self.update_workflow(workflow)
+        self._state_manager.set_cancelled(workflow_id, reason)
+        logger.info(f"Workflow {workflow_id} cancelled: {reason}")
+
+    def shutdown(self):
+        """Stop workers and write out pending workflow records
 
-    async def create_single_cell_workflow(self, workflow_id: str, file: UploadFile, model_id: str) -> str:
-        """Queue a new single cell workflow"""
+        Leases of interrupted jobs simply expire, so the next process picks them up.
+        """
+        for task in self._worker_tasks + [self._lease_task, self._cancel_task]:
+            if task is not None:
+                task.cancel()
+        self._writer.close()
+        self._state_manager.close()
+        logger.info(f"Workflow writer stopped: {self._writer.stats()}")
+
+    async def create_single_cell_workflow(
+        self,
+        workflow_id: str,
+        file: Optional[UploadFile],
+        model_id: str,
+        emb_mode: Optional[str] = None,
+        input_ref: Optional[str] = None,
+        output_format: Optional[str] = None,
+        output_dtype: Optional[str] = None,
+        priority: int = 0,
+        client_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        extra_targets: Optional[List[Tuple[str, str]]] = None
+    ) -> str:
+        """Queue a new single cell workflow from an upload or an already stored blob
+
+        emb_mode defaults to the model's own default mode. extra_targets
+        lists further (model_id, emb_mode) pairs to embed the same input
+        with; the input is then read once for all of them. The job is
+        cancelled if it hasn't finished timeout (default
+        JOB_DEFAULT_TIMEOUT) seconds after submission.
+        """
+        emb_mode = emb_mode or default_emb_mode(model_id)
+        timeout = timeout or settings.JOB_DEFAULT_TIMEOUT
+        deadline = time.time() + timeout if timeout else None
+        blob = None
+        if input_ref is not None:
+            # Referenced before any state exists, so a concurrent delete either fails here or leaves the blob
+            blob = await asyncio.to_thread(self._blob_store.acquire, input_ref)
         try:
             # Create initial workflow state
             self._state_manager.create_workflow(workflow_id)
@@ -236,38 +362,141 @@ class WorkflowService:
             workflow = WorkflowResult(
                 workflow_id=workflow_id,
                 status=WorkflowStatus.PENDING,
+                model_id=model_id.lower(),
                 created_at=datetime.now(),
                 updated_at=datetime.now(),
-                results=[]
+                results=[],
+                input_sha256=blob.sha256 if blob else None
             )
             self._workflows[workflow_id] = workflow
             self._save_workflow_to_disk(workflow_id, workflow)
 
-            # Save uploaded file immediately
-            input_path = settings.UPLOAD_DIR / file.filename
-            content = await file.read()
-            with open(input_path, 'wb') as f:
-                f.write(content)
+            # Stream the upload into the store and reference it
+            if blob is None:
+                blob = await self._blob_store.ingest(file)
+                workflow.input_sha256 = blob.sha256
+                self._save_workflow_to_disk(workflow_id, workflow)
+            targets = [
+                EmbeddingTarget(model_id=m.lower(), emb_mode=mode)
+                for m, mode in [(model_id, emb_mode), *(extra_targets or [])]
+            ]
+            # Reject inputs that would fail, or could never be admitted, before they take a queue slot
+            reports = [
+                await asyncio.to_thread(inspect_h5ad, blob.path, m)
+                for m in dict.fromkeys(target.model_id for target in targets)
+            ]
+            problems = [p for r in reports for p in r.problems]
+            if problems:
+                raise InvalidInputError("; ".join(dict.fromkeys(problems)))
+            # Models run one after the other on each chunk, so the largest one sets the peak
+            memory_estimate = max((r.memory_estimate or 0 for r in reports), default=0) or None
+            self._admission.check_memory(memory_estimate)
+            report = reports[0]
+            job = SingleCellJob(
+                workflow_id=workflow_id,
+                input_path=blob.path,
+                input_sha256=blob.sha256,
+                model_id=model_id.lower(),
+                emb_mode=emb_mode,
+                output_format=output_format or settings.RESULT_FORMAT,
+                output_dtype=output_dtype or settings.RESULT_DTYPE,
+                priority=priority,
+                client_id=client_id,
+                n_obs=report.n_obs,
+                n_vars=report.n_vars,
+                deadline=deadline,
+                memory_estimate=memory_estimate,
+                extra_targets=targets[1:]
+            )
+            if workflow.status == WorkflowStatus.CANCELLED:
+                # Cancelled while the input was being uploaded
+                self._release_input(workflow)
+                self._save_workflow_to_disk(workflow_id, workflow)
+                return workflow_id
             
             # Queue for processing with file path instead of UploadFile
-            await self._processing_queue.put(("single_cell", workflow_id, input_path, model_id))
+            if self._shared:
+                # Another process may claim the job as soon as it is queued
+                if not await self._flush():
+                    raise RuntimeError(f"Workflow {workflow_id} could not be stored; try again later")
+            await asyncio.to_thread(self._jobs.enqueue, job, "single_cell")
+            await self._dispatch("single_cell", job)
             return workflow_id
         except Exception as e:
             logger.error(f"Error creating workflow: {e}")
             # Clean up any created resources on error
             if workflow_id in self._workflows:
-                del self._workflows[workflow_id]
+                workflow = self._workflows.pop(workflow_id)
+                workflow.status = WorkflowStatus.FAILED
+                workflow.error_message = str(e)
+                self._release_input(workflow)
+                self._save_workflow_to_disk(workflow_id, workflow)
+            elif input_ref is not None:
+                self._blob_store.release(blob.sha256)
             self._state_manager.set_error(workflow_id, str(e))
+            self._state_manager.release(workflow_id)
             raise
 
+    async def inspect_single_cell_input(
+        self,
+        file: Optional[UploadFile],
+        model_id: str,
+        input_ref: Optional[str] = None,
+        gene_names: Optional[str] = None
+    ) -> DatasetInspection:
+        """Pre-flight check of an upload or stored blob against a model; nothing is stored or queued"""
+        if input_ref is not None:
+            blob = self._blob_store.resolve(input_ref)
+            if blob is None:
+                raise BlobNotFoundError(f"No uploaded file matches {input_ref}")
+            source = blob.path
+        else:
+            source = file.file
+        report = await asyncio.to_thread(inspect_h5ad, source, model_id, gene_names)
+        try:
+            self._admission.check_memory(report.memory_estimate)
+        except MemoryBudgetExceededError as e:
+            report.problems.append(str(e))
+            report.ok = False
+        return report
+
+    async def cancel_workflow(self, workflow_id: str, reason: str = "Cancelled by user") -> Dict:
+        """Cancel a queued or running workflow and return its status
+
+        A queued job is dropped and the workflow is cancelled right away. A
+        running job stops at its next chunk boundary; its partial output is
+        removed and the workflow is then marked cancelled. Cancelling a
+        cancelled workflow is a no-op.
+        """
+        workflow = self.get_workflow(workflow_id)
+        if workflow is None:
+            raise ValueError(f"Workflow {workflow_id} not found")
+        if workflow.status.value not in TERMINAL_STATUSES:
+            previous = await asyncio.to_thread(self._jobs.cancel, workflow_id, reason)
+            if previous == LEASED:
+                # Stopped by the worker running it; other processes' workers poll for the request
+                self._request_cancel(workflow_id, reason)
+            else:
+                # Finished just now, or nothing is (or will be) running it
+                workflow = self.get_workflow(workflow_id) if previous is None else workflow
+                if workflow.status.value not in TERMINAL_STATUSES:
+                    self._processing_queue.remove(workflow_id)
+                    await self._state_manager.claim(workflow_id)
+                    self._mark_cancelled(workflow_id, reason)
+                    if self._shared:
+                        await self._release_local(workflow_id)
+        if workflow.status in (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED):
+            raise WorkflowFinishedError(f"Workflow {workflow_id} already {workflow.status.value}")
+        return await self.get_workflow_status(workflow_id)
+
     async def get_workflow_status(self, workflow_id: str) -> Dict:
         """Get current workflow status"""
         # Check workflow state first (for progress updates)
-        state = self._state_manager.get_workflow(workflow_id)
+        state = await asyncio.to_thread(self._state_manager.get_workflow, workflow_id)
         logger.debug(f"Got state for workflow {workflow_id}: {state}")
         
         # Check workflow result (for persistent data)
-        workflow = self._workflows.get(workflow_id)
+        workflow = self.get_workflow(workflow_id)
         logger.debug(f"Got workflow for {workflow_id}: {workflow}")
         
         # If we have neither state nor workflow, the workflow doesn't exist
@@ -279,6 +508,10 @@ class WorkflowService:
             "id": workflow_id,
             "status": (state and state.status.value) or (workflow and workflow.status.value) or WorkflowStatus.PENDING.value,
             "progress": float(state.progress if state else 1),
+            "processed_cells": state.processed_cells if state else None,
+            "total_cells": state.total_cells if state else None,
+            "throughput": state.throughput if state else None,
+            "eta_seconds": state.eta_seconds if state else None,
             "error": state.error if state else None,
             "result": state.result if state else None,
             "created_at": workflow.created_at.isoformat() if workflow else None,
@@ -290,74 +523,483 @@ class WorkflowService:
                     "file_path": r.file_path,
                     "content_type": r.content_type,
                     "created_at": r.created_at.isoformat(),
-                    "file_size": r.file_size
+                    "file_size": r.file_size,
+                    "model_id": r.model_id,
+                    "emb_mode": r.emb_mode,
+                    "format": r.format,
+                    "dtype": r.dtype,
+                    "shape": r.shape,
+                    "obs_names_path": r.obs_names_path
                 } for r in workflow.results
             ] if workflow and workflow.results else []
         }
         logger.debug(f"Full status response for {workflow_id}: {response}")
         return response
 
-    async def _process_queue(self):
-        logger.info("Starting workflow queue processor")
+    async def subscribe_events(self, workflow_id: str, queue: asyncio.Queue) -> Optional[Dict]:
+        """Push status/progress changes of a workflow to queue and return its current event
+
+        Returns None (and subscribes nothing) if the workflow doesn't exist.
+        """
+        version, state = await asyncio.to_thread(self._state_manager.snapshot, workflow_id)
+        if state is not None:
+            event = state_event(state)
+        else:
+            workflow = self.get_workflow(workflow_id)
+            if workflow is None:
+                return None
+            # Only the persisted record is left, e.g. after a restart
+            event = {
+                "id": workflow_id,
+                "status": workflow.status.value,
+                "progress": 1.0 if workflow.status.value in TERMINAL_STATUSES else 0.0,
+                "processed_cells": None,
+                "total_cells": None,
+                "throughput": None,
+                "eta_seconds": None,
+                "error": workflow.error_message,
+            }
+        if event["status"] not in TERMINAL_STATUSES:
+            self._state_manager.subscribe(workflow_id, queue, version)
+        return event
+
+    def unsubscribe_events(self, workflow_id: str, queue: asyncio.Queue):
+        self._state_manager.unsubscribe(workflow_id, queue)
+
+    def _result_cache_key(self, job: SingleCellJob, target: EmbeddingTarget) -> ResultCacheKey:
+        model = self._model_registry.get_model(target.model_id)
+        version = model.version if model else "unknown"
+        # Reduced precision or quantized runs give slightly different embeddings
+        profile = model_inference_profile(target.model_id).name
+        if profile != "default":
+            version = f"{version}+{profile}"
+        return ResultCacheKey(
+            job.input_sha256,
+            target.model_id,
+            version,
+            target.emb_mode,
+            f"{job.output_format}:{job.output_dtype}",
+            self._single_cell_service.model_fingerprint(target.model_id, target.emb_mode)
+        )
+
+    def _job_outputs(self, job: SingleCellJob) -> List[_Output]:
+        """The outputs of a job, with results already filled in for result cache hits
+
+        Hits are linked or copied into place, so call it off the event loop.
+        """
+        outputs = []
+        for target in job.targets:
+            cache_key = self._result_cache_key(job, target)
+            outputs.append(_Output(target, cache_key, self._get_cached_result(job, target, cache_key)))
+        return outputs
+
+    def _get_cached_result(self, job: SingleCellJob, target: EmbeddingTarget, cache_key: ResultCacheKey) -> Optional[Dict]:
+        """Serve one target of a workflow from the result cache; returns None on a miss"""
+        if not settings.RESULT_CACHE_ENABLED:
+            return None
+        entry = self._result_cache.get(cache_key)
+        if entry is None:
+            return None
+        cached_path = Path(entry['file_path'])
+        stem = output_stem(job, target)
+        output_path = stem.with_suffix(cached_path.suffix)
+        link_or_copy(cached_path, output_path)
+
+        metadata = dict(entry.get('metadata', {}))
+        if metadata.get('obs_names_path'):
+            obs_names_path = stem.with_suffix(".obs_names.npy")
+            link_or_copy(Path(metadata['obs_names_path']), obs_names_path)
+            metadata['obs_names_path'] = str(obs_names_path)
+
+        logger.info(f"Result cache hit for workflow {job.workflow_id} ({target.model_id}, {target.emb_mode})")
+        return {
+            'result_id': str(uuid4()),
+            'type': entry['type'],
+            'model_id': target.model_id,
+            'emb_mode': target.emb_mode,
+            'file_path': str(output_path),
+            'file_size': entry['file_size'],
+            'content_type': entry['content_type'],
+            **metadata,
+            'cached': True
+        }
+
+    def get_cache_stats(self) -> Dict:
+        """Get embedding result cache statistics, and those of the processed data cache"""
+        return {**self._result_cache.stats(), "processed": get_processed_cache().stats()}
+
+    def get_queue_stats(self) -> Dict:
+        """Queue depth, worker utilisation and admission control state"""
+        return {
+            "queue_depth": self._jobs.stats().get("queued", 0) if self._shared else self._processing_queue.qsize(),
+            "workers": len(self._worker_tasks),
+            "active_workers": self._active_workers,
+            "jobs": self._jobs.stats(),
+            **self._processing_queue.stats(),
+            **self._admission.stats(),
+        }
+
+    async def _process_queue(self, worker_id: int = 0):
+        logger.info(f"Starting workflow queue processor {worker_id}")
         while True:
             try:
                 logger.info("Waiting for workflows...")
-                workflow_type, workflow_id, file, model_id = await self._processing_queue.get()
-                logger.info(f"Processing workflow {workflow_id} of type {workflow_type}")
-                
-                if workflow_type == "single_cell":
-                    try:
-                        # Get existing workflow
-                        workflow = self._workflows[workflow_id]
-                        workflow.status = WorkflowStatus.PROCESSING
-                        workflow.updated_at = datetime.now()
-                        self._save_workflow_to_disk(workflow_id, workflow)
-                        logger.info(f"Starting processing for workflow {workflow_id}")
-                        
-                        # Process the workflow
-                        result = await self._single_cell_service.process_workflow(
-                            workflow_id, 
-                            file, 
-                            model_id,
-                            self._state_manager
-                        )
-                        
-                        logger.info(f"Workflow {workflow_id} completed successfully")
-                        # Create result item
-                        result_item = WorkflowResultItem(
-                            result_id=result['result_id'],
-                            type=result['type'],
-                            file_path=result['file_path'],
-                            content_type=result['content_type'],
-                            file_size=result['file_size'],
-                            created_at=datetime.now()
-                        )
-                        
-                        # Update workflow
-                        workflow.results.append(result_item)
-                        workflow.status = WorkflowStatus.COMPLETED
-                        workflow.updated_at = datetime.now()
-                        self._save_workflow_to_disk(workflow_id, workflow)
-                        
-                        # Update state manager with result
-                        self._state_manager.set_result(workflow_id, result)
-                        
-                        logger.info(f"Saved result for workflow {workflow_id}: {result}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing workflow {workflow_id}: {e}")
-                        if workflow_id in self._workflows:
-                            workflow = self._workflows[workflow_id]
-                            workflow.status = WorkflowStatus.FAILED
-                            workflow.error_message = str(e)
-                            workflow.updated_at = datetime.now()
-                            self._save_workflow_to_disk(workflow_id, workflow)
-                        self._state_manager.set_error(workflow_id, str(e))
-                    finally:
-                        self._processing_queue.task_done()
+                workflow_type, job = await self._next_job()
+                jobs = [job]
+                if self._batchable(job):
+                    jobs += await self._gather_batch(job)
+                logger.info(f"Processing workflow(s) {[j.workflow_id for j in jobs]} of type {workflow_type} on worker {worker_id}")
+                await self._run_job(workflow_type, jobs)
+                # Completed and failed jobs alike are done; interrupted ones keep
+                # their lease until it expires and are then retried
+                for done in jobs:
+                    await asyncio.to_thread(self._jobs.complete, done.workflow_id, self._worker_id)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in queue processor: {e}")
 
+    def _admissible(self, job: SingleCellJob) -> bool:
+        """Whether a job's models, device and memory are free to run it now"""
+        models = [target.model_id for target in job.targets]
+        return self._admission.can_admit(models, self._single_cell_service.device, job.memory_estimate)
+
+    def _admissible_filter(self) -> Optional[ClaimFilter]:
+        """_admissible for the shared queue, as a filter claim() applies in SQL; None if nothing fits"""
+        busy = self._admission.busy_models(self._single_cell_service.device)
+        if busy is None:
+            return None
+        free_memory = self._admission.free_memory()
+        return ClaimFilter(
+            busy_models=tuple(busy),
+            admit_memory=None if free_memory is None else (self._admission.memory_budget, free_memory)
+        )
+
+    def _claim_rank(self) -> ClaimRank:
+        return ClaimRank(self._processing_queue.aging_seconds, self._processing_queue.client_usages())
+
+    async def _claim(self, where: Optional[ClaimFilter]) -> Optional[Tuple[str, SingleCellJob]]:
+        """Lease the best queued job of the shared queue matching where"""
+        if where is None:
+            return None
+        claimed = await asyncio.to_thread(self._jobs.claim, self._worker_id, self._claim_rank(), where)
+        if claimed is not None:
+            self._processing_queue.charge(claimed[1])
+        return claimed
+
+    async def _next_job(self) -> Tuple[str, SingleCellJob]:
+        """Wait for the next job that can be admitted right away and lease it
+
+        Jobs of models at their concurrency limit stay queued rather than
+        holding this worker, so other models' jobs aren't starved.
+        """
+        while True:
+            self._job_available.clear()
+            if self._shared:
+                claimed = await self._claim(self._admissible_filter())
+                if claimed is not None:
+                    return claimed
+            else:
+                item = self._processing_queue.take(self._admissible)
+                if item is not None:
+                    self._processing_queue.task_done()
+                    if await asyncio.to_thread(self._jobs.lease, item[1].workflow_id, self._worker_id):
+                        return item
+                    logger.info(f"Skipping workflow {item[1].workflow_id}: already taken or finished")
+                    continue
+            # Woken early by jobs queued, or slots freed, in this process; the rest is found by polling
+            try:
+                await asyncio.wait_for(self._job_available.wait(), settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _batchable(self, job: SingleCellJob) -> bool:
+        return (
+            settings.BATCHING_ENABLED
+            and not job.extra_targets
+            and job.n_obs is not None
+            and job.n_obs <= settings.BATCH_JOB_MAX_CELLS
+        )
+
+    async def _gather_batch(self, first: SingleCellJob) -> List[SingleCellJob]:
+        """Lease further queued jobs that can share first's inference pass
+
+        Jobs for the same (model_id, emb_mode) are collected for up to
+        BATCH_WINDOW seconds, until BATCH_MAX_JOBS jobs or BATCH_MAX_CELLS
+        cells are reached. The batch's memory estimates must fit the job
+        memory budget together.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.BATCH_WINDOW
+        batch: List[SingleCellJob] = []
+        cells = first.n_obs
+        memory = first.memory_estimate or 0
+        memory_budget = self._admission.memory_budget
+
+        def fits(job: SingleCellJob) -> bool:
+            return (
+                (job.model_id, job.emb_mode) == (first.model_id, first.emb_mode)
+                and self._batchable(job)
+                and cells + job.n_obs <= settings.BATCH_MAX_CELLS
+                and (not memory_budget or memory + (job.memory_estimate or 0) <= memory_budget)
+            )
+
+        def fits_filter() -> ClaimFilter:
+            """fits, for the shared queue"""
+            return ClaimFilter(
+                batch_with=(first.model_id, first.emb_mode),
+                max_cells=min(settings.BATCH_JOB_MAX_CELLS, settings.BATCH_MAX_CELLS - cells),
+                max_memory=memory_budget - memory if memory_budget else None
+            )
+
+        while len(batch) + 1 < settings.BATCH_MAX_JOBS:
+            if self._shared:
+                claimed = await self._claim(fits_filter())
+                job = claimed[1] if claimed else None
+            else:
+                job = await self._take_matching(fits)
+            if job is not None:
+                batch.append(job)
+                cells += job.n_obs
+                memory += job.memory_estimate or 0
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if self._shared:
+                self._job_available.clear()
+                try:
+                    await asyncio.wait_for(self._job_available.wait(), min(remaining, settings.JOB_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._processing_queue.wait_for_put(remaining)
+        return batch
+
+    async def _take_matching(self, predicate) -> Optional[SingleCellJob]:
+        """Lease a job of the local queue accepted by predicate without waiting"""
+        while True:
+            item = self._processing_queue.take(predicate)
+            if item is None:
+                return None
+            self._processing_queue.task_done()
+            if await asyncio.to_thread(self._jobs.lease, item[1].workflow_id, self._worker_id):
+                return item[1]
+
+    async def _run_job(self, workflow_type: str, jobs: List[SingleCellJob]):
+        if workflow_type == "single_cell":
+            memory = sum(job.memory_estimate or 0 for job in jobs)
+            models = [target.model_id for target in jobs[0].targets]
+            try:
+                admission = self._admission.admit(models, self._single_cell_service.device, memory)
+                async with admission:
+                    self._active_workers += 1
+                    try:
+                        if len(jobs) > 1:
+                            await self._run_single_cell_batch(jobs)
+                        else:
+                            await self._run_single_cell_job(jobs[0])
+                    finally:
+                        self._active_workers -= 1
+            except MemoryBudgetExceededError as e:
+                # E.g. queued before the budget was lowered; it would wait forever
+                for job in jobs:
+                    self._fail_job(job, e)
+            finally:
+                # Its slots are free again; jobs waiting for them may be runnable now
+                self._job_available.set()
+
+    async def _run_single_cell_job(self, job: SingleCellJob):
+        try:
+            self._raise_if_cancelled(job)
+            await self._state_manager.claim(job.workflow_id)
+            workflow = self._begin_job(job)
+            await self._process_job(job, workflow, await asyncio.to_thread(self._job_outputs, job))
+        except InferenceCancelled:
+            self._cancel_job(job)
+        except Exception as e:
+            self._fail_job(job, e)
+        finally:
+            self._cancel_reasons.pop(job.workflow_id, None)
+            if self._shared:
+                await self._release_local(job.workflow_id)
+
+    async def _run_single_cell_batch(self, jobs: List[SingleCellJob]):
+        """Embed several small jobs for the same model in one inference pass"""
+        pending = []
+        try:
+            for job in jobs:
+                try:
+                    self._raise_if_cancelled(job)
+                    await self._state_manager.claim(job.workflow_id)
+                    workflow = self._begin_job(job)
+                    outputs = await asyncio.to_thread(self._job_outputs, job)
+                    if outputs[0].result is not None:
+                        await self._complete_job(job, workflow, outputs)
+                    else:
+                        pending.append((job, workflow, outputs))
+                except InferenceCancelled:
+                    self._cancel_job(job)
+                except Exception as e:
+                    self._fail_job(job, e)
+
+            results = None
+            if len(pending) > 1:
+                batch = [job for job, _, _ in pending]
+                cancel_event = self._watch(batch)
+                try:
+                    results = await self._single_cell_service.process_batch(batch, self._state_manager, cancel_event)
+                except InferenceCancelled:
+                    logger.info(f"Batch of {len(pending)} workflows interrupted by a cancellation; running the rest one by one")
+                except Exception as e:
+                    logger.warning(f"Batch of {len(pending)} workflows failed ({e}); running them one by one")
+                finally:
+                    self._unwatch(batch)
+
+            for job, workflow, outputs in pending:
+                try:
+                    if results is not None:
+                        await self._complete_job(job, workflow, [outputs[0]._replace(result=results[job.workflow_id])])
+                    else:
+                        self._raise_if_cancelled(job)
+                        await self._process_job(job, workflow, outputs)
+                except InferenceCancelled:
+                    self._cancel_job(job)
+                except Exception as e:
+                    self._fail_job(job, e)
+        finally:
+            for job in jobs:
+                self._cancel_reasons.pop(job.workflow_id, None)
+                if self._shared:
+                    await self._release_local(job.workflow_id)
+
+    def _begin_job(self, job: SingleCellJob) -> WorkflowResult:
+        """Load a job's workflow record and mark it as processing"""
+        workflow_id = job.workflow_id
+        # Get existing workflow; it may have been created by another process
+        workflow = self._workflows.get(workflow_id) or self._store.get(workflow_id)
+        if workflow is None:
+            raise ValueError(f"Workflow {workflow_id} not found")
+        self._workflows[workflow_id] = workflow
+        workflow.status = WorkflowStatus.PROCESSING
+        workflow.updated_at = datetime.now()
+        self._save_workflow_to_disk(workflow_id, workflow)
+        logger.info(f"Starting processing for workflow {workflow_id}")
+        return workflow
+
+    async def _process_job(self, job: SingleCellJob, workflow: WorkflowResult, outputs: List[_Output]):
+        """Embed the targets of a job that were not served from the result cache, then complete it"""
+        missing = [output.target for output in outputs if output.result is None]
+        if missing:
+            cancel_event = self._watch([job])
+            try:
+                results = iter(await self._single_cell_service.process_workflow(
+                    job, self._state_manager, cancel_event, missing
+                ))
+            finally:
+                self._unwatch([job])
+            outputs = [o if o.result is not None else o._replace(result=next(results)) for o in outputs]
+        await self._complete_job(job, workflow, outputs)
+
+    def _watch(self, jobs: List[SingleCellJob]) -> Any:
+        """Create the cancel event of a run covering jobs; cancellations and deadlines of any of them set it"""
+        cancel_event = self._single_cell_service.cancel_event()
+        loop = asyncio.get_running_loop()
+        for job in jobs:
+            self._cancel_events[job.workflow_id] = cancel_event
+            if job.deadline is not None:
+                self._deadline_timers[job.workflow_id] = loop.call_later(
+                    max(job.deadline - time.time(), 0.0),
+                    self._request_cancel, job.workflow_id, "Deadline exceeded"
+                )
+            if job.workflow_id in self._cancel_reasons:
+                cancel_event.set()
+        return cancel_event
+
+    def _unwatch(self, jobs: List[SingleCellJob]):
+        for job in jobs:
+            self._cancel_events.pop(job.workflow_id, None)
+            timer = self._deadline_timers.pop(job.workflow_id, None)
+            if timer is not None:
+                timer.cancel()
+
+    def _request_cancel(self, workflow_id: str, reason: str):
+        """Stop a job of this process at its next chunk boundary"""
+        cancel_event = self._cancel_events.get(workflow_id)
+        if cancel_event is None and self._shared:
+            # Leased by another process; its worker polls for the request
+            return
+        self._cancel_reasons.setdefault(workflow_id, reason)
+        if cancel_event is not None:
+            cancel_event.set()
+
+    def _raise_if_cancelled(self, job: SingleCellJob):
+        if job.deadline is not None and time.time() >= job.deadline:
+            self._cancel_reasons.setdefault(job.workflow_id, "Deadline exceeded")
+        if job.workflow_id in self._cancel_reasons:
+            raise InferenceCancelled(job.workflow_id)
+
+    def _cancel_job(self, job: SingleCellJob):
+        # Partial outputs were already removed by the interrupted run
+        self._mark_cancelled(job.workflow_id, self._cancel_reasons.get(job.workflow_id, "Cancelled"))
+
+    async def _complete_job(self, job: SingleCellJob, workflow: WorkflowResult, outputs: List[_Output]):
+        """Record the results of every target of a job; newly embedded ones also go into the result cache"""
+        workflow_id = job.workflow_id
+        for output in outputs:
+            result = output.result
+            if settings.RESULT_CACHE_ENABLED and not result.get('cached'):
+                await asyncio.to_thread(
+                    self._result_cache.put,
+                    output.cache_key,
+                    Path(result['file_path']),
+                    result['content_type'],
+                    result['type'],
+                    {k: result.get(k) for k in ('format', 'dtype', 'shape', 'obs_names_path')}
+                )
+
+            # Create result item
+            workflow.results.append(WorkflowResultItem(
+                result_id=result['result_id'],
+                type=result['type'],
+                file_path=result['file_path'],
+                content_type=result['content_type'],
+                file_size=result['file_size'],
+                model_id=result.get('model_id'),
+                emb_mode=result.get('emb_mode'),
+                format=result.get('format'),
+                dtype=result.get('dtype'),
+                shape=result.get('shape'),
+                obs_names_path=result.get('obs_names_path'),
+                created_at=datetime.now()
+            ))
+        
+        logger.info(f"Workflow {workflow_id} completed successfully")
+        # Update workflow
+        workflow.status = WorkflowStatus.COMPLETED
+        workflow.updated_at = datetime.now()
+        self._release_input(workflow)
+        self._save_workflow_to_disk(workflow_id, workflow)
+        
+        # Update state manager with result; a fan-out workflow has one per target
+        results = [output.result for output in outputs]
+        result = results[0] if len(results) == 1 else {'results': results}
+        self._state_manager.set_result(workflow_id, result)
+        
+        logger.info(f"Saved result for workflow {workflow_id}: {result}")
+
+    def _fail_job(self, job: SingleCellJob, error: Exception):
+        workflow_id = job.workflow_id
+        logger.error(f"Error processing workflow {workflow_id}: {error}")
+        workflow = self.get_workflow(workflow_id)
+        if workflow is not None:
+            workflow.status = WorkflowStatus.FAILED
+            workflow.error_message = str(error)
+            workflow.updated_at = datetime.now()
+            self._release_input(workflow)
+            self._save_workflow_to_disk(workflow_id, workflow)
+        self._state_manager.set_error(workflow_id, str(error))
+
 # Singleton instance
 _workflow_service_instance = None
 
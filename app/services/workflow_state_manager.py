@@ -1,55 +1,232 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
 from app.models.workflows import WorkflowState, WorkflowStatus
+from app.services.state_backend import MemoryStateBackend
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# No further events follow once a workflow reaches one of these
+TERMINAL_STATUSES = {
+    WorkflowStatus.COMPLETED.value,
+    WorkflowStatus.FAILED.value,
+    WorkflowStatus.CANCELLED.value,
+}
+
+def state_event(state: WorkflowState) -> Dict:
+    """The lightweight status/progress payload pushed to event subscribers"""
+    return {
+        "id": state.workflow_id,
+        "status": state.status.value,
+        "progress": float(state.progress),
+        "processed_cells": state.processed_cells,
+        "total_cells": state.total_cells,
+        "throughput": state.throughput,
+        "eta_seconds": state.eta_seconds,
+        "error": state.error,
+    }
+
 class WorkflowStateManager:
-    def __init__(self):
-        self._states: Dict[str, WorkflowState] = {}
+    """Workflow progress/status, kept in a (possibly shared) state backend
+
+    Subscribers in this process are notified directly on every change.
+    With a shared backend, changes made by other processes are picked up
+    by polling the backend's per-workflow versions while anyone is
+    subscribed. States of the workflows this process works on are
+    claimed: kept in memory until released, so updates on the event loop
+    never read the shared backend.
+    """
+
+    def __init__(self, backend=None, poll_interval: float = 0.5):
+        self._backend = backend or MemoryStateBackend()
+        self._poll_interval = poll_interval
+        self._poll_task: Optional[asyncio.Task] = None
+        self._seen_versions: Dict[str, int] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # workflow_id -> (monotonic time, cells) of the first cell count report
+        self._rate_origin: Dict[str, Tuple[float, int]] = {}
+        # Claimed states, the latest of each workflow this process works on
+        self._claimed: Dict[str, WorkflowState] = {}
+
+    def subscribe(self, workflow_id: str, queue: asyncio.Queue, version: int = 0) -> asyncio.Queue:
+        """Deliver state changes of a workflow to queue; one queue may watch many workflows
+
+        version is that of the state the subscriber already has (see
+        snapshot); changes by other processes after it are delivered.
+        """
+        self._subscribers.setdefault(workflow_id, set()).add(queue)
+        if self._backend.shared:
+            self._seen_versions[workflow_id] = max(version, self._seen_versions.get(workflow_id, 0))
+            if self._poll_task is None:
+                self._poll_task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, workflow_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(workflow_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[workflow_id]
+                self._seen_versions.pop(workflow_id, None)
+
+    async def _poll(self):
+        """Publish changes written by other processes to local subscribers"""
+        try:
+            while self._subscribers:
+                await asyncio.sleep(self._poll_interval)
+                versions = await asyncio.to_thread(self._backend.versions, list(self._subscribers))
+                for workflow_id, version in versions.items():
+                    if version == self._backend.written_version(workflow_id):
+                        # Written by this process, and published when it was made
+                        self._seen_versions[workflow_id] = version
+                    elif version > self._seen_versions.get(workflow_id, 0):
+                        state = await asyncio.to_thread(self._backend.get, workflow_id)
+                        if state is not None:
+                            self._publish(state, version)
+        except Exception as e:
+            logger.error(f"Error polling workflow states: {e}")
+        finally:
+            self._poll_task = None
+
+    def _save(self, state: WorkflowState):
+        """Store a changed state and notify local subscribers"""
+        self._publish(state, self._backend.put(state))
+
+    def _publish(self, state: WorkflowState, version: Optional[int]):
+        """Push a state to subscribers; must run on the event loop thread
+
+        version is None for states not written yet.
+        """
+        queues = self._subscribers.get(state.workflow_id)
+        if not queues:
+            return
+        if version is not None:
+            self._seen_versions[state.workflow_id] = max(version, self._seen_versions.get(state.workflow_id, 0))
+        event = state_event(state)
+        for queue in queues:
+            if queue.full():
+                # Slow consumer: drop its oldest event, newer state supersedes it
+                queue.get_nowait()
+            queue.put_nowait(event)
 
     def create_workflow(self, workflow_id: str) -> WorkflowState:
         """Create a new workflow state"""
         state = WorkflowState(workflow_id=workflow_id)
-        self._states[workflow_id] = state
+        if self._backend.shared:
+            # Created here, so nothing newer can be in the backend yet
+            self._claimed[workflow_id] = state
+        self._save(state)
         logger.debug(f"Created new workflow state: {state}")
         return state
 
     def get_workflow(self, workflow_id: str) -> Optional[WorkflowState]:
-        """Get workflow state"""
-        state = self._states.get(workflow_id)
+        """Get workflow state; may read the backend, so call it off the event loop if that is shared"""
+        state = self._claimed.get(workflow_id) or self._backend.get(workflow_id)
         logger.debug(f"Retrieved state for workflow {workflow_id}: {state}")
-        if state:
-            logger.debug(f"Current progress for workflow {workflow_id}: {state.progress}, type: {type(state.progress)}")
         return state
 
-    def update_progress(self, workflow_id: str, progress: float):
-        """Update workflow progress (0.0 to 1.0)"""
-        if workflow_id in self._states:
-            old_progress = self._states[workflow_id].progress
-            self._states[workflow_id].progress = float(progress)
-            logger.info(f"Updated progress for workflow {workflow_id}: {old_progress} -> {progress}")
-            logger.debug(f"State after update: {self._states[workflow_id]}")
-            logger.debug(f"Current states: {self._states}")
-        else:
+    def snapshot(self, workflow_id: str) -> Tuple[int, Optional[WorkflowState]]:
+        """Version and state of a workflow to subscribe from; reads the backend
+
+        The version is read first, so a change between the two reads is
+        delivered again rather than missed.
+        """
+        version = self._backend.versions([workflow_id]).get(workflow_id, 0) if self._backend.shared else 0
+        return version, self.get_workflow(workflow_id)
+
+    async def claim(self, workflow_id: str) -> Optional[WorkflowState]:
+        """Load a workflow's state, off the event loop, and keep it in memory until released"""
+        state = self._claimed.get(workflow_id)
+        if state is None and self._backend.shared:
+            state = await asyncio.to_thread(self._backend.get, workflow_id)
+            if state is not None:
+                self._claimed.setdefault(workflow_id, state)
+        return self.get_workflow(workflow_id)
+
+    def release(self, workflow_id: str):
+        """Stop serving a workflow's state from memory, e.g. once another process may change it"""
+        self._claimed.pop(workflow_id, None)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write out every state changed so far; blocks, so call it off the event loop"""
+        return self._backend.flush(timeout)
+
+    def close(self):
+        self._backend.close()
+
+    def update_progress(
+        self,
+        workflow_id: str,
+        progress: float,
+        processed_cells: Optional[int] = None,
+        total_cells: Optional[int] = None
+    ):
+        """Update workflow progress (0.0 to 1.0), optionally with the number of cells embedded so far
+
+        Cell counts drive the throughput (cells/sec) and ETA estimates.
+        """
+        state = self.get_workflow(workflow_id)
+        if state is None:
             logger.warning(f"Attempted to update progress for non-existent workflow {workflow_id}")
-            logger.debug(f"Available workflow states: {list(self._states.keys())}")
+            return
+        old_progress = state.progress
+        changed = old_progress != float(progress)
+        state.progress = float(progress)
+        if processed_cells is not None:
+            changed = changed or processed_cells != state.processed_cells
+            self._update_rate(state, processed_cells, total_cells)
+        logger.info(f"Updated progress for workflow {workflow_id}: {old_progress} -> {progress}")
+        if changed:
+            self._save(state)
+
+    def _update_rate(self, state: WorkflowState, processed_cells: int, total_cells: Optional[int]):
+        now = time.monotonic()
+        state.processed_cells = processed_cells
+        if total_cells is not None:
+            state.total_cells = total_cells
+        # Measure from the first report so model loading isn't counted as embedding time
+        origin_time, origin_cells = self._rate_origin.setdefault(state.workflow_id, (now, processed_cells))
+        elapsed = now - origin_time
+        if elapsed > 0 and processed_cells > origin_cells:
+            state.throughput = (processed_cells - origin_cells) / elapsed
+            if state.total_cells is not None:
+                state.eta_seconds = max(state.total_cells - processed_cells, 0) / state.throughput
 
     def update_status(self, workflow_id: str, status: WorkflowStatus):
         """Update workflow status"""
-        if workflow_id in self._states:
-            old_status = self._states[workflow_id].status
-            self._states[workflow_id].status = status
+        state = self.get_workflow(workflow_id)
+        if state is not None:
+            old_status = state.status
+            state.status = status
+            self._save(state)
             logger.info(f"Updated status for workflow {workflow_id}: {old_status} -> {status}")
 
     def set_error(self, workflow_id: str, error: str):
-        if workflow_id in self._states:
-            state = self._states[workflow_id]
+        state = self.get_workflow(workflow_id)
+        if state is not None:
             state.status = WorkflowStatus.FAILED
             state.error = error
+            state.eta_seconds = None
+            self._rate_origin.pop(workflow_id, None)
+            self._save(state)
+
+    def set_cancelled(self, workflow_id: str, reason: str):
+        state = self.get_workflow(workflow_id)
+        if state is not None:
+            state.status = WorkflowStatus.CANCELLED
+            state.error = reason
+            state.eta_seconds = None
+            self._rate_origin.pop(workflow_id, None)
+            self._save(state)
 
     def set_result(self, workflow_id: str, result: Dict):
-        if workflow_id in self._states:
-            state = self._states[workflow_id]
+        state = self.get_workflow(workflow_id)
+        if state is not None:
             state.result = result
-            state.status = WorkflowStatus.COMPLETED 
\ No newline at end of file
+            state.status = WorkflowStatus.COMPLETED
+            # The completed event closes event streams; it must already report full progress
+            state.progress = 1.0
+            state.eta_seconds = 0.0 if state.total_cells is not None else None
+            self._rate_origin.pop(workflow_id, None)
+            self._save(state)
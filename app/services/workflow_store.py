@@ -0,0 +1,272 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import base64
+import json
+import logging
+import sqlite3
+import threading
+
+from app.core.config import get_settings
+from app.models.workflows import WorkflowResult, WorkflowSummary
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflows (
+    workflow_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added after the first schema version: name -> definition
+_EXTRA_COLUMNS = {
+    "model_id": "TEXT",
+    "error_message": "TEXT",
+    "result_count": "INTEGER NOT NULL DEFAULT 0",
+}
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_workflows_created_at ON workflows (created_at, workflow_id);
+CREATE INDEX IF NOT EXISTS idx_workflows_status_created_at ON workflows (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_workflows_model_created_at ON workflows (model_id, created_at);
+"""
+
+_SUMMARY_COLUMNS = "workflow_id, status, model_id, created_at, updated_at, error_message, result_count"
+_SUMMARY_KEYS = [c.strip() for c in _SUMMARY_COLUMNS.split(",")]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a listing cursor cannot be decoded"""
+
+
+def encode_cursor(created_at: str, workflow_id: str) -> str:
+    payload = json.dumps([created_at, workflow_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, workflow_id = json.loads(payload)
+        return str(created_at), str(workflow_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def parse_workflow_record(workflow_id: str, workflow_data: Dict) -> WorkflowResult:
+    """Build a WorkflowResult from a legacy per-workflow JSON record"""
+    return WorkflowResult(
+        workflow_id=workflow_id,
+        status=workflow_data["status"],
+        created_at=datetime.fromisoformat(workflow_data["created_at"]),
+        updated_at=datetime.fromisoformat(workflow_data["updated_at"]),
+        error_message=workflow_data.get("error_message"),
+        results=workflow_data.get("results", [])
+    )
+
+
+class WorkflowStore:
+    """SQLite (WAL mode) store of WorkflowResult records
+
+    Each row keeps the indexed columns (status, created_at) next to the full
+    record serialized as JSON, so lookups and listings are single indexed
+    queries instead of directory scans.
+    """
+
+    def __init__(self, db_path: Path, legacy_dir: Optional[Path] = None):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._conn.executescript(_INDEXES)
+        self._lock = threading.Lock()
+        if legacy_dir is not None:
+            self._migrate_json_records(legacy_dir)
+
+    def _add_missing_columns(self):
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(workflows)")}
+        for name, definition in _EXTRA_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE workflows ADD COLUMN {name} {definition}")
+
+    def _migrate_json_records(self, legacy_dir: Path):
+        """One-shot import of the per-workflow JSON files written by earlier versions"""
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'json_migrated'"
+            ).fetchone()
+            if done or not legacy_dir.exists():
+                return
+
+            imported = 0
+            self._conn.execute("BEGIN")
+            try:
+                for workflow_file in legacy_dir.glob("*.json"):
+                    try:
+                        with open(workflow_file, "r") as f:
+                            workflow = parse_workflow_record(workflow_file.stem, json.load(f))
+                    except Exception as e:
+                        logger.error(f"Error migrating workflow from {workflow_file}: {e}")
+                        continue
+                    self._upsert(workflow)
+                    imported += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+                    (datetime.now().isoformat(),)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            logger.info(f"Migrated {imported} workflow records from {legacy_dir}")
+
+    @staticmethod
+    def to_row(workflow: WorkflowResult) -> Tuple:
+        """Snapshot a workflow as a row; the record is serialized as compact JSON"""
+        return (
+            workflow.workflow_id,
+            workflow.status.value,
+            workflow.model_id,
+            workflow.created_at.isoformat(),
+            workflow.updated_at.isoformat(),
+            workflow.error_message,
+            len(workflow.results),
+            workflow.model_dump_json()
+        )
+
+    @staticmethod
+    def from_row(row: Tuple, summary: bool = False) -> Union[WorkflowResult, WorkflowSummary]:
+        """The record, or its listing summary, of a row from to_row"""
+        if summary:
+            return WorkflowSummary(**dict(zip(_SUMMARY_KEYS, row)))
+        return WorkflowResult.model_validate_json(row[-1])
+
+    def _upsert_rows(self, rows: List[Tuple]):
+        self._conn.executemany(
+            """
+            INSERT INTO workflows (
+                workflow_id, status, model_id, created_at, updated_at, error_message, result_count, data
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (workflow_id) DO UPDATE SET
+                status = excluded.status,
+                model_id = excluded.model_id,
+                updated_at = excluded.updated_at,
+                error_message = excluded.error_message,
+                result_count = excluded.result_count,
+                data = excluded.data
+            """,
+            rows
+        )
+
+    def _upsert(self, workflow: WorkflowResult):
+        self._upsert_rows([self.to_row(workflow)])
+
+    def save(self, workflow: WorkflowResult):
+        """Insert or update a workflow record"""
+        with self._lock:
+            self._upsert(workflow)
+
+    def save_rows(self, rows: List[Tuple]):
+        """Write a batch of rows from to_row in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._upsert_rows(rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, workflow_id: str) -> Optional[WorkflowResult]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM workflows WHERE workflow_id = ?", (workflow_id,)
+            ).fetchone()
+        return WorkflowResult.model_validate_json(row[0]) if row else None
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        model_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        summary: bool = False
+    ) -> Tuple[List[Union[WorkflowResult, WorkflowSummary]], Optional[str]]:
+        """A page of workflows, newest first, and the cursor of the next page (if any)
+
+        Pages are keyed on (created_at, workflow_id), so they stay stable while
+        new workflows are being created.
+        """
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if model_id is not None:
+            clauses.append("model_id = ?")
+            params.append(model_id.lower())
+        if created_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_after.isoformat())
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(created_before.isoformat())
+        if cursor is not None:
+            cursor_created_at, cursor_workflow_id = decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND workflow_id < ?))")
+            params.extend([cursor_created_at, cursor_created_at, cursor_workflow_id])
+
+        columns = _SUMMARY_COLUMNS if summary else "workflow_id, created_at, data"
+        query = f"SELECT {columns} FROM workflows"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC, workflow_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[3] if summary else last[1], last[0])
+
+        if summary:
+            return [WorkflowSummary(**dict(zip(_SUMMARY_KEYS, row))) for row in rows], next_cursor
+        return [WorkflowResult.model_validate_json(row[2]) for row in rows], next_cursor
+
+    def delete(self, workflow_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM workflows WHERE workflow_id = ?", (workflow_id,))
+        return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_workflow_store_instance = None
+
+def get_workflow_store() -> WorkflowStore:
+    global _workflow_store_instance
+    if _workflow_store_instance is None:
+        _workflow_store_instance = WorkflowStore(
+            settings.WORKFLOW_DB_PATH,
+            legacy_dir=settings.UPLOAD_DIR / "workflows"
+        )
+    return _workflow_store_instance
@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+import threading
+
+from app.models.workflows import WorkflowResult, WorkflowSummary
+from app.services.workflow_store import WorkflowStore
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowWriter:
+    """Write-behind persistence of workflow records
+
+    submit() snapshots a workflow and returns immediately; a background
+    thread writes pending records to the store in batches. Updates to the
+    same workflow that arrive within ``delay`` seconds are coalesced into a
+    single write, and each batch is committed as one SQLite transaction, so
+    a crash never leaves a half-written record.
+    """
+
+    def __init__(self, store: WorkflowStore, delay: float = 0.05, retry_delay: float = 1.0):
+        self._store = store
+        self._delay = delay
+        self._retry_delay = retry_delay
+        self._pending: Dict[str, Tuple] = {}
+        self._in_flight: Dict[str, Tuple] = {}
+        self._closed = False
+        self._flush_waiters = 0
+        self._cond = threading.Condition()
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="workflow-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, workflow: WorkflowResult):
+        """Queue the current state of a workflow for persistence"""
+        row = self._store.to_row(workflow)
+        with self._cond:
+            if self._closed:
+                # Late updates after shutdown are written through
+                self._store.save_rows([row])
+                self.submitted += 1
+                self.written += 1
+                return
+            if workflow.workflow_id in self._pending:
+                self.coalesced += 1
+            self._pending[workflow.workflow_id] = row
+            self.submitted += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give rapid successive updates a chance to coalesce,
+                # unless someone is waiting on a flush
+                self._cond.wait_for(lambda: self._closed or self._flush_waiters, self._delay)
+                batch = self._in_flight = self._pending
+                self._pending = {}
+
+            try:
+                self._store.save_rows(list(batch.values()))
+                written = len(batch)
+            except Exception as e:
+                logger.error(f"Error persisting {len(batch)} workflow record(s): {e}")
+                written = 0
+
+            with self._cond:
+                if not written:
+                    # Keep newer submissions; retry the rest
+                    for workflow_id, row in batch.items():
+                        self._pending.setdefault(workflow_id, row)
+                self.written += written
+                self._in_flight = {}
+                self._cond.notify_all()
+                if not written and not self._closed:
+                    self._cond.wait(self._retry_delay)
+                elif not written:
+                    logger.error(f"Dropping {len(self._pending)} unpersisted workflow record(s) on close")
+                    self._pending.clear()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything submitted so far, without waiting for the coalescing delay"""
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+            finally:
+                self._flush_waiters -= 1
+
+    def overlay(
+        self,
+        workflows: List[Union[WorkflowResult, WorkflowSummary]],
+        summary: bool = False
+    ) -> List[Union[WorkflowResult, WorkflowSummary]]:
+        """Replace workflows read from the store by their submitted, not yet written records"""
+        with self._cond:
+            rows = {**self._in_flight, **self._pending}
+        return [
+            self._store.from_row(rows[w.workflow_id], summary) if w.workflow_id in rows else w
+            for w in workflows
+        ]
+
+    def close(self, timeout: Optional[float] = None):
+        """Flush pending records and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "pending": len(self._pending),
+            }
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX, the thread lock is all we get
+    fcntl = None
+
+
+class FileLock:
+    """A lock shared by the threads of this process and by every process
+    opening the same lock file
+
+    Guards read-modify-write cycles on metadata files that several workers
+    update on one shared directory.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
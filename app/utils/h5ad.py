@@ -0,0 +1,67 @@
+from typing import BinaryIO, NamedTuple, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class H5adHeader(NamedTuple):
+    """What an h5ad file's HDF5 metadata says about its X matrix"""
+    n_obs: int
+    n_vars: int
+    dtype: str  # element dtype of X
+    sparse: bool
+    nnz: int  # stored entries; n_obs * n_vars when dense
+    index_itemsize: int = 0  # bytes per sparse column/row index
+
+    @property
+    def density(self) -> float:
+        cells = self.n_obs * self.n_vars
+        return self.nnz / cells if cells else 0.0
+
+
+def read_h5ad_header(path: Union[str, BinaryIO]) -> Optional[H5adHeader]:
+    """Read shape, dtype and sparsity of X from an h5ad file without loading any data
+
+    Dense X is a dataset and sparse X a group carrying a "shape" attribute
+    next to its data/indices/indptr datasets; either way only HDF5 metadata
+    is touched. path may also be an open binary file. Returns None if the
+    file is not a readable h5ad.
+    """
+    try:
+        import h5py
+        with h5py.File(path, "r") as f:
+            X = f["X"]
+            if isinstance(X, h5py.Group):
+                n_obs, n_vars = (int(n) for n in X.attrs["shape"])
+                return H5adHeader(
+                    n_obs, n_vars, str(X["data"].dtype), True, int(X["data"].shape[0]), X["indices"].dtype.itemsize
+                )
+            n_obs, n_vars = (int(n) for n in X.shape)
+            return H5adHeader(n_obs, n_vars, str(X.dtype), False, n_obs * n_vars)
+    except Exception as e:
+        logger.warning(f"Could not read h5ad header of {path}: {e}")
+        return None
+
+
+def read_h5ad_var_names(path: Union[str, BinaryIO], column: Optional[str] = None) -> np.ndarray:
+    """Read the var index (or a var column) of an h5ad file as strings, leaving X and obs untouched
+
+    Raises KeyError if var has no such column.
+    """
+    import h5py
+    with h5py.File(path, "r") as f:
+        var = f["var"]
+        values = var[column or var.attrs["_index"]]
+        if isinstance(values, h5py.Group):
+            # Categorical column: codes into a categories array, -1 for missing
+            categories = np.append(values["categories"].asstr()[:], "")
+            return categories[values["codes"][:]]
+        return values.asstr()[:]
+
+
+def read_h5ad_shape(path: str) -> Optional[Tuple[int, int]]:
+    """Read (n_obs, n_vars) from an h5ad file's header; None if it is not a readable h5ad"""
+    header = read_h5ad_header(path)
+    return (header.n_obs, header.n_vars) if header else None
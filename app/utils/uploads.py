@@ -0,0 +1,71 @@
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional
+import asyncio
+import hashlib
+import os
+
+from fastapi import UploadFile
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Upload exceeds maximum size of {max_size} bytes")
+
+
+class StoredUpload(NamedTuple):
+    path: Path
+    sha256: str
+    size: int
+
+
+def _write_chunk(buffer: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload_file(
+    file: UploadFile,
+    destination: Path,
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> StoredUpload:
+    """Stream an upload to destination in fixed-size chunks, hashing it on the way
+
+    Writing and hashing run in a worker thread, so at most one chunk is held in
+    memory and the event loop is never blocked. The file only appears at
+    destination once it has been fully written.
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+
+    # Reject early when the client told us the size up front
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.{id(file)}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    buffer = await asyncio.to_thread(tmp_path.open, "wb")
+    try:
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+        await asyncio.to_thread(buffer.close)
+        await asyncio.to_thread(os.replace, tmp_path, destination)
+    except BaseException:
+        buffer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return StoredUpload(path=destination, sha256=digest.hexdigest(), size=size)
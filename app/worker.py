@@ -0,0 +1,46 @@
+"""Standalone inference worker
+
+Consumes the shared job queue without serving the API:
+
+    STATE_BACKEND=sqlite python -m app.worker
+
+Run any number of these next to API processes that use the same
+WORKFLOW_DB_PATH (API processes may set WORKFLOW_WORKERS=0 to leave all
+processing to the workers).
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.config import get_settings
+from app.services.single_cell_service import get_service_instance as get_single_cell_service
+from app.services.workflow_service import get_workflow_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def run_worker():
+    if settings.STATE_BACKEND == "memory":
+        raise SystemExit("A standalone worker needs a shared STATE_BACKEND (e.g. STATE_BACKEND=sqlite)")
+
+    single_cell_service = get_single_cell_service()
+    workflow_service = get_workflow_service()
+    await single_cell_service.start()
+    await workflow_service.start_worker()
+    logger.info(f"Worker started with {settings.WORKFLOW_WORKERS} workflow worker(s)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Worker stopping")
+    single_cell_service.shutdown()
+    workflow_service.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+def test_health_check(client):
+    """Test the health endpoint"""
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "healthy"}
+
+def test_app_import_does_not_load_model_stack():
+    """Test that heavy model dependencies are only imported on first inference"""
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('torch', 'anndata', 'helical') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
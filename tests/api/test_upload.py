@@ -1,8 +1,10 @@
+import hashlib
 import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
 from app.main import app
 from app.core.config import get_settings
+from app.services.blob_store import BlobStore, get_blob_store
 
 settings = get_settings()
 
@@ -82,4 +84,55 @@ def test_all_allowed_extensions(client, filename):
     data = response.json()
     assert data["status"] == "success"
     
-    Path(data["path"]).unlink() 
\ No newline at end of file
+    Path(data["path"]).unlink()
+
+def test_upload_returns_sha256(client, sample_fasta_content):
+    """Test that the upload response carries the content hash and size"""
+    files = {"file": ("hashed.fasta", sample_fasta_content, "text/plain")}
+    response = client.post("/api/v1/upload", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sha256"] == hashlib.sha256(sample_fasta_content).hexdigest()
+    assert data["size"] == len(sample_fasta_content)
+
+    Path(data["path"]).unlink()
+
+def test_upload_too_large(client, monkeypatch, tmp_path):
+    """Test that uploads over MAX_UPLOAD_SIZE are rejected and not kept on disk"""
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 10)
+    monkeypatch.setitem(app.dependency_overrides, get_blob_store, lambda: BlobStore(tmp_path))
+    files = {"file": ("big.txt", b"A" * 100, "text/plain")}
+    response = client.post("/api/v1/upload", files=files)
+
+    assert response.status_code == 413
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert [p.name for p in tmp_path.iterdir()] == ["tmp"]  # No blob was written
+
+def test_upload_deduplicates_identical_files(client):
+    """Test that re-uploading the same content reuses the stored blob"""
+    content = b">dedup\nATGCATGCAAAA"
+    first = client.post("/api/v1/upload", files={"file": ("one.fasta", content, "text/plain")}).json()
+    second = client.post("/api/v1/upload", files={"file": ("two.fasta", content, "text/plain")}).json()
+
+    assert second["path"] == first["path"]
+    assert second["deduplicated"] is True
+
+    lookup = client.get(f"/api/v1/upload/{first['sha256']}")
+    assert lookup.status_code == 200
+    assert lookup.json()["refcount"] >= 2
+
+    client.delete(f"/api/v1/upload/{first['sha256']}")
+    client.delete(f"/api/v1/upload/{first['sha256']}")
+
+def test_delete_upload_leaves_workflow_references(client):
+    """Test that deleting an upload cannot drop references held by workflows"""
+    content = b">held\nATGCATGCCCCC"
+    upload = client.post("/api/v1/upload", files={"file": ("held.fasta", content, "text/plain")}).json()
+    get_blob_store().acquire(upload["sha256"])  # as a workflow using input_ref does
+
+    assert client.delete(f"/api/v1/upload/{upload['sha256']}").json()["deleted"] is False
+    assert client.delete(f"/api/v1/upload/{upload['sha256']}").status_code == 409
+    assert client.get(f"/api/v1/upload/{upload['sha256']}").json()["refcount"] == 1
+
+    get_blob_store().release(upload["sha256"])
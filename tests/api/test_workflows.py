@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import os
+import json
 from fastapi.testclient import TestClient
 from app.main import app
 from app.models.workflows import WorkflowStatus, ResultType, WorkflowResult, WorkflowResultItem
@@ -158,4 +159,198 @@ def test_download_workflow_result(client_with_mocks, mock_workflow_service, tmp_
         response = client_with_mocks.get("/api/v1/workflows/test-id/results/result-1/download")
         
         assert response.status_code == 200
-        mock_file_response.assert_called_once() 
\ No newline at end of file
+        mock_file_response.assert_called_once()
+
+def test_get_workflow_result_rows(client_with_mocks, mock_workflow_service, tmp_path):
+    """Test reading a row slice of an embedding result"""
+    import numpy as np
+    matrix_path = os.path.join(tmp_path, "embeddings.npy")
+    np.save(matrix_path, np.arange(20, dtype=np.float32).reshape(10, 2))
+
+    mock_workflow_service.get_workflow.return_value = WorkflowResult(
+        workflow_id="test-id",
+        status=WorkflowStatus.COMPLETED,
+        results=[
+            WorkflowResultItem(
+                result_id="result-1",
+                type=ResultType.EMBEDDINGS,
+                file_path=matrix_path,
+                content_type="application/octet-stream",
+                format="npy",
+                dtype="float32",
+                shape=[10, 2]
+            )
+        ]
+    )
+
+    response = client_with_mocks.get(
+        "/api/v1/workflows/test-id/results/result-1/rows", params={"obs": "1:3,9"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == [1, 2, 9]
+    assert data["embeddings"] == [[2.0, 3.0], [4.0, 5.0], [18.0, 19.0]]
+
+    response = client_with_mocks.get(
+        "/api/v1/workflows/test-id/results/result-1/rows", params={"obs": "0", "format": "binary"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Shape"] == "1,2"
+    assert np.frombuffer(response.content, dtype=np.float32).tolist() == [0.0, 1.0]
+
+    response = client_with_mocks.get(
+        "/api/v1/workflows/test-id/results/result-1/rows", params={"obs": "10"}
+    )
+    assert response.status_code == 400
+
+def test_get_workflows_paginated(client_with_mocks, mock_workflow_service):
+    """Test that listing forwards filters and exposes the next cursor"""
+    mock_workflow_service.list_workflows.return_value = (
+        [WorkflowResult(workflow_id="test-id", status=WorkflowStatus.COMPLETED)],
+        "next-page"
+    )
+
+    response = client_with_mocks.get(
+        "/api/v1/workflows", params={"limit": 1, "status": "completed", "view": "summary"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Next-Cursor"] == "next-page"
+    assert response.json()[0]["workflow_id"] == "test-id"
+    kwargs = mock_workflow_service.list_workflows.call_args.kwargs
+    assert kwargs["limit"] == 1
+    assert kwargs["status"] == WorkflowStatus.COMPLETED
+    assert kwargs["summary"] is True
+
+def test_stream_workflow_events(client_with_mocks, mock_workflow_service):
+    """Test the SSE stream sends the current state, then changes until a final event"""
+    def subscribe(workflow_id, queue):
+        queue.put_nowait({"id": workflow_id, "status": "processing", "progress": 0.5, "error": None})
+        queue.put_nowait({"id": workflow_id, "status": "completed", "progress": 1.0, "error": None})
+        return {"id": workflow_id, "status": "processing", "progress": 0.1, "error": None}
+    mock_workflow_service.subscribe_events.side_effect = subscribe
+
+    response = client_with_mocks.get("/api/v1/workflows/test-id/events")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [e["progress"] for e in events] == [0.1, 0.5, 1.0]
+    mock_workflow_service.unsubscribe_events.assert_called_once()
+
+def test_stream_unknown_workflow_events(client_with_mocks, mock_workflow_service):
+    """Test streaming events of a missing workflow"""
+    mock_workflow_service.subscribe_events.return_value = None
+    response = client_with_mocks.get("/api/v1/workflows/missing/events")
+    assert response.status_code == 404
+
+def test_workflow_events_websocket(client_with_mocks, mock_workflow_service):
+    """Test multiplexed workflow events over a WebSocket"""
+    def subscribe(workflow_id, queue):
+        if workflow_id == "missing":
+            return None
+        queue.put_nowait({"id": workflow_id, "status": "completed", "progress": 1.0, "error": None})
+        return {"id": workflow_id, "status": "processing", "progress": 0.2, "error": None}
+    mock_workflow_service.subscribe_events.side_effect = subscribe
+
+    with client_with_mocks.websocket_connect("/api/v1/workflows/events") as websocket:
+        websocket.send_json({"subscribe": ["wf-1", "missing"]})
+        received = [websocket.receive_json() for _ in range(3)]
+
+    assert {"id": "missing", "detail": "Workflow not found"} in received
+    wf_events = [e for e in received if e["id"] == "wf-1"]
+    assert [e["status"] for e in wf_events] == ["processing", "completed"]
+
+def test_get_queue_stats(client_with_mocks, mock_workflow_service):
+    """Test the queue/worker stats endpoint"""
+    mock_workflow_service.get_queue_stats.return_value = {
+        "queue_depth": 3,
+        "workers": 4,
+        "active_workers": 2,
+        "active_by_model": {"geneformer": 2},
+        "waiting_by_model": {},
+        "model_limits": {"geneformer": 2},
+        "device_limits": {},
+    }
+
+    response = client_with_mocks.get("/api/v1/workflows/queue/stats")
+
+    assert response.status_code == 200
+    assert response.json()["queue_depth"] == 3
+    assert response.json()["active_by_model"] == {"geneformer": 2}
+
+def test_cancel_workflow(client_with_mocks, mock_workflow_service):
+    """Test that DELETE and POST /cancel both cancel a workflow"""
+    from unittest.mock import AsyncMock
+    mock_workflow_service.cancel_workflow = AsyncMock(return_value={"id": "wf-1", "status": "cancelled"})
+
+    response = client_with_mocks.delete("/api/v1/workflows/wf-1")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+    response = client_with_mocks.post("/api/v1/workflows/wf-1/cancel")
+    assert response.status_code == 200
+    assert mock_workflow_service.cancel_workflow.await_count == 2
+
+def test_cancel_finished_or_unknown_workflow(client_with_mocks, mock_workflow_service):
+    """Test that finished workflows can't be cancelled and unknown ones are 404"""
+    from unittest.mock import AsyncMock
+    from app.services.workflow_service import WorkflowFinishedError
+    mock_workflow_service.cancel_workflow = AsyncMock(side_effect=WorkflowFinishedError("Workflow wf-1 already completed"))
+    assert client_with_mocks.post("/api/v1/workflows/wf-1/cancel").status_code == 409
+
+    mock_workflow_service.cancel_workflow = AsyncMock(side_effect=ValueError("Workflow wf-2 not found"))
+    assert client_with_mocks.delete("/api/v1/workflows/wf-2").status_code == 404
+
+def test_inspect_single_cell_input(client_with_mocks, mock_workflow_service):
+    """Test the pre-flight inspection endpoint"""
+    from unittest.mock import AsyncMock
+    from app.models.workflows import DatasetInspection
+    mock_workflow_service.inspect_single_cell_input = AsyncMock(return_value=DatasetInspection(
+        model_id="scgpt", n_obs=10, n_vars=5, problems=["Not enough genes"], ok=False
+    ))
+
+    response = client_with_mocks.post(
+        "/api/v1/workflows/single-cell/inspect",
+        params={"model_id": "scgpt", "input_ref": "a" * 64}
+    )
+    assert response.status_code == 200
+    assert response.json()["ok"] is False
+    assert response.json()["n_obs"] == 10
+
+    response = client_with_mocks.post("/api/v1/workflows/single-cell/inspect", params={"model_id": "scgpt"})
+    assert response.status_code == 400
+
+def test_create_multi_model_workflow(client_with_mocks, mock_workflow_service):
+    """Test that repeated model_id/embedding_mode params become extra targets of one workflow"""
+    from unittest.mock import AsyncMock
+    mock_workflow_service.create_single_cell_workflow = AsyncMock(return_value="wf-1")
+
+    response = client_with_mocks.post(
+        "/api/v1/workflows/single-cell",
+        params=[("model_id", "scgpt"), ("model_id", "geneformer"), ("embedding_mode", "cell"), ("input_ref", "a" * 64)]
+    )
+    assert response.status_code == 200
+    call = mock_workflow_service.create_single_cell_workflow.await_args
+    assert call.args[2:4] == ("scgpt", "cell")
+    assert call.kwargs["extra_targets"] == [("geneformer", "cell")]
+
+    response = client_with_mocks.post(
+        "/api/v1/workflows/single-cell",
+        params=[("model_id", "scgpt"), ("model_id", "scgpt"), ("input_ref", "a" * 64)]
+    )
+    assert response.status_code == 400
+
+def test_embedding_mode_defaults_per_model(client_with_mocks, mock_workflow_service):
+    """Test that models without a requested embedding_mode keep their own default"""
+    from unittest.mock import AsyncMock
+    mock_workflow_service.create_single_cell_workflow = AsyncMock(return_value="wf-1")
+
+    response = client_with_mocks.post(
+        "/api/v1/workflows/single-cell",
+        params=[("model_id", "scgpt"), ("model_id", "geneformer"), ("input_ref", "a" * 64)]
+    )
+    assert response.status_code == 200
+    call = mock_workflow_service.create_single_cell_workflow.await_args
+    assert call.args[2:4] == ("scgpt", "cls")
+    assert call.kwargs["extra_targets"] == [("geneformer", "cell")]
@@ -1,5 +1,5 @@
 import sys
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -52,6 +52,7 @@ def mock_workflow_service():
     mock.get_workflow = Mock()
     mock.create_single_cell_workflow = Mock()
     mock.get_workflows = Mock(return_value=[])
+    mock.subscribe_events = AsyncMock()
     return mock
 
 @pytest.fixture
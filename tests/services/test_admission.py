@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from app.models.workflows import SingleCellJob
+from app.services.admission import AdmissionController, MemoryBudgetExceededError
+from app.services.scheduler import WorkflowScheduler
+
+async def _admit(admission, model_id, device):
+    async with admission.admit(model_id, device):
+        pass
+
+async def test_model_limit_caps_concurrency():
+    """Test that at most K jobs of a limited model run at once"""
+    admission = AdmissionController({"geneformer": 2}, {})
+    running, peak = 0, 0
+
+    async def job():
+        nonlocal running, peak
+        async with admission.admit("geneformer", "cpu"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(job() for _ in range(6)))
+
+    stats = admission.stats()
+    assert peak == 2
+    assert stats["active_by_model"] == {}
+    assert stats["waiting_by_model"] == {}
+
+async def test_device_limit_is_shared_across_models():
+    """Test that a device limit applies to all models and to indexed devices of that type"""
+    admission = AdmissionController({}, {"cuda": 1})
+    async with admission.admit("scgpt", "cuda:0"):
+        waiter = asyncio.create_task(_admit(admission, "geneformer", "cuda:0"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        assert admission.stats()["waiting_by_model"] == {"geneformer": 1}
+        # CPU jobs are not limited
+        async with admission.admit("geneformer", "cpu"):
+            pass
+    await asyncio.wait_for(waiter, 1)
+
+async def test_multi_model_job_holds_a_slot_of_each_model():
+    """Test that a job running several models waits for and holds every model's slot"""
+    admission = AdmissionController({"scgpt": 1, "geneformer": 1}, {})
+    async with admission.admit(["scgpt", "geneformer"], "cpu"):
+        assert admission.stats()["active_by_model"] == {"scgpt": 1, "geneformer": 1}
+        waiter = asyncio.create_task(_admit(admission, "geneformer", "cpu"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+    await asyncio.wait_for(waiter, 1)
+
+    stats = admission.stats()
+    assert stats["active_by_model"] == {}
+    assert stats["waiting_by_model"] == {}
+
+async def test_memory_budget_admits_jobs_in_order():
+    """Test that jobs wait for memory first come first served and oversized jobs are rejected"""
+    admission = AdmissionController({}, {}, memory_budget=100)
+    order = []
+
+    async def job(name, memory):
+        async with admission.admit("scgpt", "cpu", memory):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async with admission.admit("scgpt", "cpu", 60):
+        big = asyncio.create_task(job("big", 80))
+        await asyncio.sleep(0.01)
+        # Would fit right away, but must not overtake the waiting big job
+        small = asyncio.create_task(job("small", 30))
+        await asyncio.sleep(0.01)
+        assert order == []
+        assert admission.stats()["memory_waiting"] == 2
+    await asyncio.gather(big, small)
+
+    with pytest.raises(MemoryBudgetExceededError):
+        async with admission.admit("scgpt", "cpu", 101):
+            pass
+    assert order == ["big", "small"]
+    assert admission.stats()["memory_reserved"] == 0
+
+async def test_dequeue_skips_jobs_of_busy_models():
+    """Test that with one model at its limit, workers take the other model's jobs instead of waiting"""
+    admission = AdmissionController({"geneformer": 1}, {}, memory_budget=100)
+    scheduler = WorkflowScheduler()
+    for workflow_id, model_id in (("gf-1", "geneformer"), ("sc-1", "scgpt")):
+        job = SingleCellJob(workflow_id=workflow_id, input_path="in.h5ad", input_sha256="0" * 64, model_id=model_id)
+        await scheduler.put(("single_cell", job))
+
+    def admissible(job):
+        return admission.can_admit(job.model_id, "cpu", job.memory_estimate)
+
+    async with admission.admit("geneformer", "cpu"):
+        assert scheduler.take(admissible)[1].workflow_id == "sc-1"
+        assert scheduler.take(admissible) is None
+        assert admission.can_admit("scgpt", "cpu", 100)
+        assert admission.can_admit("scgpt", "cpu", 101)  # Left to admit() to reject
+    assert scheduler.take(admissible)[1].workflow_id == "gf-1"
+
+    async with admission.admit("scgpt", "cpu", 60):
+        assert not admission.can_admit("scgpt", "cpu", 50)
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import threading
+import pytest
+from starlette.datastructures import UploadFile
+from app.services.blob_store import BlobInUseError, BlobStore, BlobNotFoundError
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(tmp_path / "blobs")
+
+def make_upload(content: bytes, filename: str = "data.h5ad") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+async def test_ingest_stores_by_hash(store):
+    """Test that uploads are stored under their sha256"""
+    content = b"single cell data"
+    blob = await store.ingest(make_upload(content))
+
+    assert blob.sha256 == hashlib.sha256(content).hexdigest()
+    assert blob.refcount == 1
+    assert not blob.deduplicated
+    assert store.blob_path(blob.sha256).read_bytes() == content
+
+async def test_ingest_deduplicates_identical_content(store):
+    """Test that identical uploads share one blob and bump the refcount"""
+    first = await store.ingest(make_upload(b"same", "a.h5ad"))
+    second = await store.ingest(make_upload(b"same", "b.h5ad"))
+
+    assert second.deduplicated
+    assert second.path == first.path
+    assert second.refcount == 2
+    assert second.filenames == ["a.h5ad", "b.h5ad"]
+
+async def test_same_filename_does_not_overwrite(store):
+    """Test that two different files with the same name are both kept"""
+    first = await store.ingest(make_upload(b"user one"))
+    second = await store.ingest(make_upload(b"user two"))
+
+    assert first.path != second.path
+    assert store.blob_path(first.sha256).read_bytes() == b"user one"
+
+async def test_resolve_by_hash_and_path(store):
+    """Test resolving a blob by sha256 and by returned path"""
+    blob = await store.ingest(make_upload(b"content"))
+
+    assert store.resolve(blob.sha256).sha256 == blob.sha256
+    assert store.resolve(blob.path).sha256 == blob.sha256
+    assert store.resolve("0" * 64) is None
+    assert store.resolve("/etc/passwd") is None
+
+async def test_release_deletes_unreferenced_blob(store):
+    """Test that a blob is removed once its last reference is released"""
+    blob = await store.ingest(make_upload(b"content"))
+    store.acquire(blob.sha256)
+
+    assert not store.release(blob.sha256)
+    assert store.release(blob.sha256)
+    assert store.resolve(blob.sha256) is None
+    with pytest.raises(BlobNotFoundError):
+        store.acquire(blob.sha256)
+
+async def test_refcounts_are_shared_between_stores(tmp_path):
+    """Test that stores of different processes on one root don't lose reference updates"""
+    first, second = BlobStore(tmp_path / "blobs"), BlobStore(tmp_path / "blobs")
+    blob = await first.ingest(make_upload(b"shared"))
+
+    def acquire(store):
+        for _ in range(50):
+            store.acquire(blob.sha256)
+
+    threads = [threading.Thread(target=acquire, args=(store,)) for store in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert second.resolve(blob.sha256).refcount == 101
+
+async def test_upload_release_keeps_workflow_references(store):
+    """Test that releasing upload references never drops one a workflow holds"""
+    blob = await store.ingest(make_upload(b"content"), upload=True)
+    store.acquire(blob.sha256)
+
+    assert not store.release(blob.sha256, upload=True)
+    with pytest.raises(BlobInUseError):
+        store.release(blob.sha256, upload=True)
+    assert store.resolve(blob.sha256).refcount == 1
+
+    assert store.release(blob.sha256)
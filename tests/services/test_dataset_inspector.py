@@ -0,0 +1,47 @@
+import json
+from unittest.mock import patch
+import anndata
+import numpy as np
+import pandas as pd
+from app.services.dataset_inspector import inspect_h5ad
+
+def write_input(path, genes, symbols=None):
+    adata = anndata.AnnData(np.ones((4, len(genes)), dtype=np.float32))
+    adata.var_names = genes
+    if symbols is not None:
+        adata.var["gene_symbols"] = pd.Categorical(symbols)
+    adata.write_h5ad(path)
+    return str(path)
+
+def test_inspect_reports_gene_overlap(tmp_path):
+    """Test that genes are matched against the configured vocabulary, by index or var column"""
+    vocab = tmp_path / "vocab.json"
+    vocab.write_text(json.dumps({"ACTB": 0, "GAPDH": 1, "CD3E": 2}))
+    path = write_input(tmp_path / "in.h5ad", ["g1", "g2", "g3", "g4"], ["ACTB", "GAPDH", "XYZ", "ACTB"])
+
+    with patch("app.services.dataset_inspector.settings.MODEL_VOCAB_PATHS", {"scgpt": vocab}):
+        by_index = inspect_h5ad(path, "scgpt")
+        by_symbol = inspect_h5ad(path, "scgpt", gene_names="gene_symbols")
+        missing = inspect_h5ad(path, "scgpt", gene_names="nope")
+
+    assert (by_index.n_obs, by_index.n_vars, by_index.sparse) == (4, 4, False)
+    assert by_index.genes.matched == 0
+    assert not by_index.ok and "vocabulary" in by_index.problems[0]
+
+    assert by_symbol.ok
+    assert (by_symbol.genes.matched, by_symbol.genes.overlap) == (3, 0.75)
+    assert by_symbol.genes.duplicates == 1
+    assert by_symbol.genes.unmatched_examples == ["XYZ"]
+
+    assert missing.problems == ["var has no column 'nope'"]
+
+def test_inspect_without_vocabulary_or_valid_file(tmp_path):
+    """Test that gene checks are skipped without a vocabulary and unreadable files are flagged"""
+    path = write_input(tmp_path / "in.h5ad", ["g1", "g2"])
+    (tmp_path / "bad.h5ad").write_text("not hdf5")
+
+    report = inspect_h5ad(path, "geneformer")
+    assert report.ok and report.genes is None and report.memory_estimate > 0
+
+    bad = inspect_h5ad(str(tmp_path / "bad.h5ad"), "geneformer")
+    assert not bad.ok and bad.problems == ["Not a readable h5ad file"]
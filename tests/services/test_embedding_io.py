@@ -0,0 +1,138 @@
+import numpy as np
+import pickle
+import pytest
+from app.services.embedding_io import (
+    EmbeddingWriter,
+    decode,
+    encode,
+    lookup_obs_names,
+    parse_index_ranges,
+    read_obs_names,
+    read_rows
+)
+
+def test_writer_streams_chunks_into_npy(tmp_path):
+    """Test that chunks are written into one memory-mappable matrix"""
+    writer = EmbeddingWriter(tmp_path / "out", n_rows=5)
+    writer.append(np.ones((3, 4), dtype=np.float32))
+    writer.append(np.full((2, 4), 2, dtype=np.float32))
+    path = writer.close()
+
+    matrix = np.load(path, mmap_mode="r")
+    assert path.suffix == ".npy"
+    assert matrix.shape == (5, 4)
+    assert matrix[4, 0] == 2
+
+def test_writer_rejects_missing_rows(tmp_path):
+    """Test that a short write is reported"""
+    writer = EmbeddingWriter(tmp_path / "out", n_rows=5)
+    writer.append(np.ones((3, 4), dtype=np.float32))
+
+    with pytest.raises(ValueError):
+        writer.close()
+
+def test_writer_falls_back_for_ragged_output(tmp_path):
+    """Test that per-gene (ragged) embeddings are pickled"""
+    writer = EmbeddingWriter(tmp_path / "out", n_rows=2)
+    writer.append([{"GENE1": [1.0]}, {"GENE2": [2.0], "GENE3": [3.0]}])
+    path = writer.close()
+
+    assert path.suffix == ".pkl"
+    with open(path, "rb") as f:
+        assert len(pickle.load(f)) == 2
+
+def test_writer_abort_removes_partial_output(tmp_path):
+    """Test that aborting deletes the partial file"""
+    writer = EmbeddingWriter(tmp_path / "out", n_rows=5)
+    writer.append(np.ones((3, 4), dtype=np.float32))
+    writer.abort()
+
+    assert not (tmp_path / "out.npy").exists()
+
+@pytest.mark.parametrize("output_format", ["npy", "hdf5"])
+@pytest.mark.parametrize("dtype", ["float32", "float16", "bfloat16"])
+def test_writer_formats_and_dtypes(tmp_path, output_format, dtype):
+    """Test every format/dtype combination records its metadata"""
+    embeddings = np.random.rand(4, 3).astype(np.float32)
+    writer = EmbeddingWriter(
+        tmp_path / "out", n_rows=4, output_format=output_format, dtype=dtype,
+        obs_names=["a", "b", "c", "d"], chunk_rows=2
+    )
+    writer.append(embeddings[:2])
+    writer.append(embeddings[2:])
+    writer.close()
+
+    assert writer.metadata["format"] == output_format
+    assert writer.metadata["dtype"] == dtype
+    assert writer.metadata["shape"] == [4, 3]
+    if output_format == "npy":
+        stored = np.load(writer.path, mmap_mode="r")
+        assert list(np.load(writer.metadata["obs_names_path"])) == ["a", "b", "c", "d"]
+    else:
+        import h5py
+        with h5py.File(writer.path, "r") as f:
+            stored = f["embeddings"][:]
+            assert f["embeddings"].attrs["dtype"] == dtype
+            assert [n.decode() for n in f["obs_names"][:]] == ["a", "b", "c", "d"]
+    np.testing.assert_allclose(decode(stored, dtype), embeddings, rtol=1e-2, atol=1e-2)
+
+def test_half_precision_halves_file_size(tmp_path):
+    """Test that float16 output is about half the size of float32"""
+    embeddings = np.random.rand(1000, 64).astype(np.float32)
+    sizes = {}
+    for dtype in ["float32", "float16"]:
+        writer = EmbeddingWriter(tmp_path / dtype, n_rows=1000, dtype=dtype)
+        writer.append(embeddings)
+        sizes[dtype] = writer.close().stat().st_size
+
+    assert sizes["float16"] < 0.6 * sizes["float32"]
+
+def test_bfloat16_round_trip():
+    """Test bfloat16 encoding keeps ~3 significant digits"""
+    values = np.array([[1.0, -2.5, 3.14159, 1e-3]], dtype=np.float32)
+
+    restored = decode(encode(values, "bfloat16"), "bfloat16")
+
+    assert encode(values, "bfloat16").dtype == np.uint16
+    np.testing.assert_allclose(restored, values, rtol=1e-2)
+
+def test_parse_index_ranges():
+    """Test range, single index and negative index parsing"""
+    assert parse_index_ranges("0:2,4,-1", 6).tolist() == [0, 1, 4, 5]
+    assert parse_index_ranges("4:", 6).tolist() == [4, 5]
+    with pytest.raises(IndexError):
+        parse_index_ranges("6", 6)
+    with pytest.raises(ValueError):
+        parse_index_ranges("a:b", 6)
+
+@pytest.mark.parametrize("output_format", ["npy", "hdf5"])
+def test_read_rows_by_index_and_name(tmp_path, output_format):
+    """Test reading selected rows and their obs names in request order"""
+    writer = EmbeddingWriter(
+        tmp_path / "out", n_rows=4, output_format=output_format,
+        obs_names=["a", "b", "c", "d"]
+    )
+    writer.append(np.arange(8, dtype=np.float32).reshape(4, 2))
+    path = writer.close()
+    names_path = writer.metadata["obs_names_path"] or str(path)
+
+    rows = lookup_obs_names(names_path, ["d", "a"])
+
+    assert rows.tolist() == [3, 0]
+    assert read_rows(str(path), output_format, rows).tolist() == [[6, 7], [0, 1]]
+    assert read_obs_names(str(path), output_format, writer.metadata["obs_names_path"], rows) == ["d", "a"]
+    with pytest.raises(KeyError):
+        lookup_obs_names(names_path, ["missing"])
+
+def test_lookup_obs_names_with_duplicates(tmp_path):
+    """Test that unique names still resolve and duplicated ones are rejected as ambiguous"""
+    writer = EmbeddingWriter(tmp_path / "out", n_rows=4, obs_names=["a", "b", "a", "c"])
+    writer.append(np.zeros((4, 2), dtype=np.float32))
+    writer.close()
+    names_path = writer.metadata["obs_names_path"]
+
+    assert lookup_obs_names(names_path, ["c", "b"]).tolist() == [3, 1]
+    with pytest.raises(ValueError, match="not unique"):
+        lookup_obs_names(names_path, ["b", "a"])
+    with pytest.raises(KeyError):
+        lookup_obs_names(names_path, ["missing"])
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import pytest
+from app.services.inference_executor import InferenceCancelled, InferenceExecutor
+
+def square_with_progress(value, report):
+    report(0.5)
+    report(1.0)
+    return value * value
+
+def current_thread_name(report):
+    return threading.current_thread().name
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+async def test_run_returns_result_and_progress(kind):
+    """Test that work runs in the pool and progress reaches the event loop"""
+    executor = InferenceExecutor(kind=kind, max_workers=1, poll_interval=0.05)
+    progress = []
+    try:
+        result = await executor.run(square_with_progress, 7, on_progress=progress.append)
+    finally:
+        executor.shutdown()
+
+    assert result == 49
+    assert progress == [0.5, 1.0]
+
+async def test_thread_executor_runs_off_event_loop():
+    """Test that thread mode does not run work on the event loop thread"""
+    executor = InferenceExecutor(kind="thread", max_workers=1)
+    try:
+        name = await executor.run(current_thread_name)
+    finally:
+        executor.shutdown()
+
+    assert name.startswith("inference")
+
+def test_unknown_executor_kind():
+    with pytest.raises(ValueError):
+        InferenceExecutor(kind="gpu")
+
+def report_until_cancelled(started, report):
+    started.set()
+    while True:
+        report(0.5)
+
+async def test_cancel_event_stops_run_at_next_report():
+    """Test that setting the cancel event raises InferenceCancelled in the worker"""
+    executor = InferenceExecutor(kind="thread", max_workers=1)
+    started = threading.Event()
+    cancel_event = executor.cancel_event()
+    try:
+        run = asyncio.ensure_future(executor.run(report_until_cancelled, started, cancel_event=cancel_event))
+        await asyncio.to_thread(started.wait)
+        cancel_event.set()
+        with pytest.raises(InferenceCancelled):
+            await run
+    finally:
+        executor.shutdown()
@@ -0,0 +1,92 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import anndata
+import numpy as np
+import pytest
+from app.models.definitions import InferenceProfile
+from app.services.inference_profile import check_profile_accuracy, get_inference_profile, inference_context
+from app.services.single_cell_service import SingleCellService
+
+def test_custom_profiles_override_builtin_ones():
+    """Test profile resolution from INFERENCE_PROFILES and the built-in set"""
+    custom = {"int8": {"quantize_linear": True, "compile": True, "min_cosine_similarity": 0.99}}
+    with patch("app.services.inference_profile.settings.INFERENCE_PROFILES", custom):
+        profile = get_inference_profile("int8")
+        assert profile.compile and profile.min_cosine_similarity == 0.99
+        assert get_inference_profile("bf16").autocast == "bfloat16"
+        with pytest.raises(ValueError):
+            get_inference_profile("fp4")
+
+def test_pool_keys_on_profile():
+    """Test that one model under two profiles gets two pool entries"""
+    service = SingleCellService()
+    service._device = "cpu"  # Resolving the device needs torch
+    service._models["scgpt"] = lambda emb_mode: object()
+    with patch("app.services.inference_profile.settings.INFERENCE_PROFILES", {"noop": {}}):
+        first = service.get_model("scgpt")
+        assert service.get_model("scgpt", profile="default") is first
+        assert service.get_model("scgpt", profile="noop") is not first
+    assert {m["profile"] for m in service.get_pool_stats()["models"]} == {"default", "noop"}
+
+def test_check_profile_accuracy_compares_to_baseline(tmp_path):
+    """Test the accuracy report of a profile against float32 embeddings"""
+    anndata.AnnData(np.ones((4, 3), dtype=np.float32)).write_h5ad(tmp_path / "ref.h5ad")
+
+    class Model:
+        def __init__(self, noise):
+            self.noise = noise
+
+        def process_data(self, adata):
+            return adata
+
+        def get_embeddings(self, adata):
+            embeddings = np.tile([1.0, 0.0], (adata.n_obs, 1))
+            embeddings[:, 1] += self.noise
+            return embeddings
+
+    class Service:
+        device = "cpu"
+
+        def get_model(self, model_id, emb_mode, profile):
+            return Model(0.0 if profile == "default" else 0.1)
+
+    with patch("app.services.inference_profile.settings.INFERENCE_PROFILES", {"lossy": {"min_cosine_similarity": 0.999}}):
+        report = check_profile_accuracy(Service(), "scgpt", "lossy", tmp_path / "ref.h5ad", max_cells=3)
+
+    assert report["n_cells"] == 3
+    assert report["cosine_min"] == pytest.approx(1 / np.sqrt(1.01))
+    assert report["max_abs_error"] == pytest.approx(0.1)
+    assert report["passed"] is False
+
+def test_default_profile_context_is_free():
+    """Test that a profile without run-time settings doesn't need torch"""
+    with inference_context(get_inference_profile("default"), "cpu"):
+        pass
+
+def test_thread_count_is_only_set_in_single_job_processes():
+    """Test that overlapping jobs of a thread pool can't leak each other's torch thread count"""
+    threads = {"n": 4}
+    torch = SimpleNamespace(
+        get_num_threads=lambda: threads["n"],
+        set_num_threads=lambda n: threads.update(n=n),
+        inference_mode=nullcontext,
+    )
+    two_threads = InferenceProfile(name="two", intra_op_threads=2)
+    three_threads = InferenceProfile(name="three", intra_op_threads=3)
+
+    with patch.dict(sys.modules, {"torch": torch}):
+        with inference_context(get_inference_profile("float32"), "cpu"):
+            with pytest.raises(ValueError):
+                with inference_context(two_threads, "cpu"):
+                    pass
+        assert threads["n"] == 4
+
+        with patch("app.services.inference_profile._single_job_process", True):
+            with inference_context(two_threads, "cpu"):
+                assert threads["n"] == 2
+                with inference_context(three_threads, "cpu"):
+                    assert threads["n"] == 3
+                assert threads["n"] == 2
+        assert threads["n"] == 4
@@ -0,0 +1,110 @@
+from unittest.mock import patch
+import pytest
+from app.models.workflows import SingleCellJob
+from app.services.job_queue import ClaimFilter, ClaimRank, JobQueue
+
+def make_job(workflow_id: str) -> SingleCellJob:
+    return SingleCellJob(workflow_id=workflow_id, input_path="in.h5ad", input_sha256="0" * 64, model_id="scgpt")
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(tmp_path / "workflows.db", lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+def test_lease_is_exclusive(queue):
+    """Test that a queued job can only be leased once and is removed when done"""
+    queue.enqueue(make_job("wf-1"))
+    assert [job.workflow_id for _, job in queue.queued()] == ["wf-1"]
+
+    assert queue.lease("wf-1", "worker-a")
+    assert not queue.lease("wf-1", "worker-b")
+    assert queue.queued() == []
+
+    assert not queue.complete("wf-1", "worker-b")
+    assert queue.complete("wf-1", "worker-a")
+    assert queue.stats() == {}
+
+def test_jobs_survive_reopening(tmp_path):
+    """Test that queued jobs are still there after a restart"""
+    JobQueue(tmp_path / "workflows.db").enqueue(make_job("wf-1"))
+    reopened = JobQueue(tmp_path / "workflows.db")
+    assert [job.workflow_id for _, job in reopened.queued()] == ["wf-1"]
+
+def test_abandoned_jobs_are_requeued_until_attempts_run_out(queue):
+    """Test that expired leases are requeued, then failed after max_attempts"""
+    queue.enqueue(make_job("wf-1"))
+    queue.lease("wf-1", "worker-a")
+
+    # Heartbeats keep a live lease
+    assert queue.heartbeat("worker-a") == 1
+    assert queue.requeue_abandoned() == ([], [])
+
+    with patch("app.services.job_queue.time.time", return_value=10**10):
+        requeued, failed = queue.requeue_abandoned()
+    assert [job.workflow_id for _, job in requeued] == ["wf-1"]
+    assert failed == []
+
+    queue.lease("wf-1", "worker-b")
+    with patch("app.services.job_queue.time.time", return_value=10**10):
+        requeued, failed = queue.requeue_abandoned()
+    assert requeued == []
+    assert [workflow_id for workflow_id, _ in failed] == ["wf-1"]
+    assert queue.stats() == {}
+
+def test_claim_picks_best_job_once(tmp_path):
+    """Test that processes sharing the queue claim jobs by rank, each exactly once"""
+    first = JobQueue(tmp_path / "workflows.db")
+    second = JobQueue(tmp_path / "workflows.db")
+    for n in (1, 2, 3):
+        first.enqueue(make_job(f"wf-{n}").model_copy(update={"priority": n}))
+
+    rank = ClaimRank(aging_seconds=60)
+    claimed = [first.claim("a", rank), second.claim("b", rank), first.claim("a", rank), second.claim("b", rank)]
+
+    assert [item[1].workflow_id if item else None for item in claimed] == ["wf-3", "wf-2", "wf-1", None]
+    assert first.stats() == {"leased": 3}
+
+def test_claim_prefers_small_jobs_of_light_clients(queue):
+    """Test that claim ranks equal priorities by size plus client usage"""
+    queue.enqueue(make_job("wf-1").model_copy(update={"n_obs": 100, "n_vars": 10, "client_id": "heavy"}))
+    queue.enqueue(make_job("wf-2").model_copy(update={"n_obs": 200, "n_vars": 10, "client_id": "light"}))
+    queue.enqueue(make_job("wf-3").model_copy(update={"n_obs": 500, "n_vars": 10}))
+
+    rank = ClaimRank(aging_seconds=10**9, client_usage={"heavy": 5000.0})
+    claimed = [queue.claim("a", rank)[1].workflow_id for _ in range(3)]
+
+    assert claimed == ["wf-2", "wf-3", "wf-1"]
+
+def test_claim_with_filter(queue):
+    """Test that claim skips jobs of busy models, waiting for memory or not batchable"""
+    queue.enqueue(make_job("wf-1").model_copy(update={"memory_estimate": 800, "n_obs": 10}))
+    queue.enqueue(make_job("wf-2").model_copy(update={"model_id": "geneformer", "emb_mode": "cell", "n_obs": 10}))
+    queue.enqueue(make_job("wf-3").model_copy(update={"memory_estimate": 200, "n_obs": 5000}))
+    rank = ClaimRank(aging_seconds=60)
+
+    assert queue.claim("a", rank, ClaimFilter(busy_models=("scgpt", "geneformer"))) is None
+    assert queue.claim("a", rank, ClaimFilter(batch_with=("scgpt", "cls"), max_cells=100, max_memory=500)) is None
+    claimed = queue.claim("a", rank, ClaimFilter(busy_models=("geneformer",), admit_memory=(1000, 500)))
+    assert claimed[1].workflow_id == "wf-3"
+    claimed = queue.claim("a", rank, ClaimFilter(batch_with=("geneformer", "cell"), max_cells=100))
+    assert claimed[1].workflow_id == "wf-2"
+    assert queue.stats() == {"leased": 2, "queued": 1}
+
+def test_cancel_queued_and_leased_jobs(queue):
+    """Test that cancelling drops queued jobs and flags leased ones for their worker"""
+    queue.enqueue(make_job("wf-1"))
+    queue.enqueue(make_job("wf-2"))
+    queue.lease("wf-2", "worker-a")
+
+    assert queue.cancel("wf-1", "Cancelled by user") == "queued"
+    assert queue.cancel("wf-2", "Deadline exceeded") == "leased"
+    assert queue.cancel("wf-3", "Cancelled by user") is None
+    assert queue.cancel_requests("worker-a") == [("wf-2", "Deadline exceeded")]
+    assert queue.cancel_requests("worker-b") == []
+
+    # A cancelled job whose worker died is removed rather than retried
+    with patch("app.services.job_queue.time.time", return_value=10**10):
+        assert queue.requeue_abandoned() == ([], [])
+        assert queue.reap_cancelled() == [("wf-2", "Deadline exceeded")]
+    assert queue.stats() == {}
@@ -0,0 +1,37 @@
+from unittest.mock import patch
+import anndata
+import numpy as np
+from scipy import sparse
+from app.services.memory_estimator import estimate_job_memory, job_memory_budget
+from app.utils.h5ad import H5adHeader, read_h5ad_header
+
+def test_read_h5ad_header_reports_dtype_and_sparsity(tmp_path):
+    """Test that dtype and stored entries come from the HDF5 metadata"""
+    X = sparse.random(10, 8, density=0.25, format="csr", dtype=np.float32)
+    anndata.AnnData(X).write_h5ad(tmp_path / "sparse.h5ad")
+    anndata.AnnData(np.zeros((3, 2), dtype=np.float64)).write_h5ad(tmp_path / "dense.h5ad")
+
+    header = read_h5ad_header(str(tmp_path / "sparse.h5ad"))
+    assert (header.n_obs, header.n_vars, header.dtype, header.sparse) == (10, 8, "float32", True)
+    assert header.nnz == X.nnz
+    assert header.density == X.nnz / 80
+    assert read_h5ad_header(str(tmp_path / "dense.h5ad")) == H5adHeader(3, 2, "float64", False, 6)
+
+def test_estimate_grows_with_chunk_not_dataset():
+    """Test that only one chunk of a large input counts towards the estimate"""
+    with patch("app.services.memory_estimator.settings.JOB_MEMORY_PER_CELL", {"scgpt": 1000}), \
+            patch("app.services.memory_estimator.settings.JOB_MEMORY_OVERHEAD", 0):
+        small = estimate_job_memory(H5adHeader(100, 10, "float32", False, 1000), "scgpt", 1000)
+        huge = estimate_job_memory(H5adHeader(10**6, 10, "float32", False, 10**7), "scgpt", 1000)
+
+    # 100 cells x (10 stored + 10 dense float32 values + 1000 bytes per cell)
+    assert small == 100 * (40 + 40 + 1000)
+    assert huge == 1000 * (40 + 40 + 1000)
+
+def test_budget_is_derived_from_memory_limit():
+    """Test that the default budget is a fraction of the limit minus the model pool"""
+    with patch("app.services.memory_estimator.settings.JOB_MEMORY_BUDGET", None), \
+            patch("app.services.memory_estimator.settings.JOB_MEMORY_FRACTION", 0.75), \
+            patch("app.services.memory_estimator.settings.MODEL_POOL_MEMORY_BUDGET", 2_000_000_000), \
+            patch("app.services.memory_estimator.detect_memory_limit", return_value=8_000_000_000):
+        assert job_memory_budget() == 4_000_000_000
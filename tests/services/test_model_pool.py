@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import Mock
+from app.services.model_pool import ModelPool
+
+@pytest.fixture
+def pool():
+    return ModelPool(memory_budget=250, default_model_size=100)
+
+def test_pool_reuses_loaded_model(pool):
+    """Test that a second lookup is served from the pool"""
+    loader = Mock(return_value="model")
+
+    assert pool.get(("scgpt", "cpu", "cls"), loader) == "model"
+    assert pool.get(("scgpt", "cpu", "cls"), loader) == "model"
+
+    loader.assert_called_once()
+    stats = pool.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_pool_keys_on_emb_mode(pool):
+    """Test that different embedding modes get separate pool entries"""
+    pool.get(("scgpt", "cpu", "cls"), lambda: "cls-model")
+
+    assert pool.get(("scgpt", "cpu", "gene"), lambda: "gene-model") == "gene-model"
+    assert len(pool.stats()["models"]) == 2
+
+def test_pool_evicts_least_recently_used(pool):
+    """Test LRU eviction once the memory budget is exceeded"""
+    pool.get(("scgpt", "cpu", "cls"), lambda: "a")
+    pool.get(("geneformer", "cpu", "cls"), lambda: "b")
+    pool.get(("scgpt", "cpu", "cls"), lambda: "a")  # touch a, b is now LRU
+    pool.get(("scgpt", "cpu", "cell"), lambda: "c")
+
+    stats = pool.stats()
+    resident = {(m["model_id"], m["emb_mode"]) for m in stats["models"]}
+    assert resident == {("scgpt", "cls"), ("scgpt", "cell")}
+    assert stats["evictions"] == 1
+    assert stats["used_memory"] <= stats["memory_budget"]
+
+def test_pool_keeps_model_larger_than_budget():
+    """Test that a single oversized model is still served"""
+    pool = ModelPool(memory_budget=50, default_model_size=100)
+
+    assert pool.get(("scgpt", "cpu", "cls"), lambda: "big") == "big"
+    assert len(pool.stats()["models"]) == 1
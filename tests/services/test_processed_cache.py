@@ -0,0 +1,131 @@
+import os
+from unittest.mock import patch
+import anndata
+import numpy as np
+from app.models.workflows import SingleCellJob
+from app.services.processed_cache import ProcessedDataCache, ProcessedDataKey
+from app.services.single_cell_service import SingleCellService
+
+KEY = ProcessedDataKey("a" * 64, "scgpt", "1.0.0", "chunk_rows=10")
+
+class Tokenized:
+    """Stand-in for a model's processed dataset"""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+def test_roundtrip_maps_arrays(tmp_path):
+    """Test that stored chunks load back as writable arrays and only after commit"""
+    cache = ProcessedDataCache(tmp_path, max_bytes=10_000_000)
+    recorder = cache.recorder(KEY)
+    recorder.append(0, Tokenized(np.arange(1000)))
+    recorder.append(1, {"ids": np.ones((3, 4), dtype=np.float32), "genes": ["a", "b"]})
+    assert cache.get(KEY, 2) is None
+    recorder.commit()
+
+    entry = cache.get(KEY, 2)
+    first, second = entry.load(0), entry.load(1)
+    assert first.ids.tolist() == list(range(1000))
+    first.ids[0] = -1  # Copy-on-write, the stored chunk is untouched
+    assert entry.load(0).ids[0] == 0
+    assert second["genes"] == ["a", "b"] and second["ids"].shape == (3, 4)
+    # Other models, versions or chunkings miss
+    assert cache.get(KEY._replace(model_version="2.0.0"), 2) is None
+    assert cache.get(KEY, 3) is None
+    assert cache.stats()["entries"] == 1
+
+def test_abort_and_failed_dump_leave_no_entry(tmp_path):
+    """Test that interrupted or unstorable runs don't publish an entry"""
+    cache = ProcessedDataCache(tmp_path, max_bytes=10_000_000)
+    recorder = cache.recorder(KEY)
+    recorder.append(0, np.zeros(10))
+    recorder.abort()
+
+    recorder = cache.recorder(KEY)
+    recorder.append(0, lambda: None)  # Can't be pickled
+    recorder.commit()
+
+    assert cache.get(KEY, 1) is None
+    assert os.listdir(tmp_path) == []
+
+def test_evicts_least_recently_used(tmp_path):
+    """Test that entries beyond max_bytes are evicted oldest access first"""
+    cache = ProcessedDataCache(tmp_path, max_bytes=12_000)
+    keys = [KEY._replace(model_id=m) for m in ("scgpt", "geneformer", "uce")]
+    for i, key in enumerate(keys[:2]):
+        recorder = cache.recorder(key)
+        recorder.append(0, np.zeros(500))
+        recorder.commit()
+        os.utime(tmp_path / key.digest, (i, i))
+    cache.get(keys[0], 1)  # Now the most recently used
+
+    recorder = cache.recorder(keys[2])
+    recorder.append(0, np.zeros(500))
+    recorder.commit()
+
+    assert cache.get(keys[0], 1) is not None
+    assert cache.get(keys[1], 1) is None
+    assert cache.get(keys[2], 1) is not None
+
+def test_repeat_run_skips_process_data(tmp_path):
+    """Test that a second run, in another embedding mode, reuses the processed chunks"""
+    adata = anndata.AnnData(np.ones((5, 2), dtype=np.float32))
+    adata.write_h5ad(tmp_path / "in.h5ad")
+
+    class Model:
+        calls = 0
+
+        def process_data(self, adata):
+            Model.calls += 1
+            return Tokenized(np.asarray(adata.X).sum(axis=1))
+
+        def get_embeddings(self, tokenized):
+            return np.stack([tokenized.ids, tokenized.ids], axis=1)
+
+    service = SingleCellService()
+    service._device = "cpu"  # Resolving the device needs torch
+    cache = ProcessedDataCache(tmp_path / "processed", max_bytes=10_000_000)
+    outputs = []
+    with patch("app.services.single_cell_service.settings.RESULTS_DIR", tmp_path), \
+            patch("app.services.single_cell_service.settings.INFERENCE_CHUNK_SIZE", 2), \
+            patch("app.services.single_cell_service.get_processed_cache", return_value=cache), \
+            patch.object(service, "get_model", return_value=Model()):
+        for workflow_id, emb_mode in (("wf-1", "cls"), ("wf-2", "cell")):
+            job = SingleCellJob(
+                workflow_id=workflow_id,
+                input_path=str(tmp_path / "in.h5ad"),
+                input_sha256="b" * 64,
+                model_id="scgpt",
+                emb_mode=emb_mode
+            )
+            outputs.append(service.run_workflow(job, job.targets, lambda *values: None)[0])
+
+    assert Model.calls == 3  # One per chunk, all in the first run
+    assert np.load(outputs[1]["file_path"]).tolist() == np.load(outputs[0]["file_path"]).tolist()
+    assert cache.stats()["hits"] == 1
+
+def test_empty_chunks_load(tmp_path):
+    """Test that chunks without out-of-band data (an empty .buf file) load back"""
+    cache = ProcessedDataCache(tmp_path, max_bytes=10_000_000)
+    recorder = cache.recorder(KEY)
+    recorder.append(0, Tokenized(np.zeros(0)))
+    recorder.commit()
+    assert cache.get(KEY, 1).load(0).ids.shape == (0,)
+
+def test_key_follows_preprocessing_config(tmp_path):
+    """Test that a changed preprocessing setting misses while run-time settings don't matter"""
+    service = SingleCellService()
+    job = SingleCellJob(workflow_id="wf-1", input_path="in.h5ad", input_sha256="b" * 64, model_id="scgpt")
+
+    class Model:
+        def __init__(self, **config):
+            self.config = {"device": "cpu", "emb_mode": "cls", "max_length": 1200, **config}
+
+    def keys(*models):
+        cache = ProcessedDataCache(tmp_path, max_bytes=10_000_000)
+        with patch("app.services.single_cell_service.get_processed_cache", return_value=cache):
+            _, recorders = service._processed_data_sources(job, job.targets * len(models), list(models), 1, 10)
+        return [recorder._key for recorder in recorders if recorder is not None]
+
+    assert len(keys(Model(), Model(device="cuda", emb_mode="cell"))) == 1
+    assert len(keys(Model(), Model(max_length=4096))) == 2
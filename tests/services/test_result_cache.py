@@ -0,0 +1,98 @@
+from unittest.mock import patch
+import pytest
+from app.services.result_cache import ResultCache, ResultCacheKey
+from app.services.single_cell_service import SingleCellService
+
+KEY = ResultCacheKey("a" * 64, "scgpt", "1.0.0", "cls")
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "scgpt_embeddings_wf.pt"
+    path.write_bytes(b"x" * 100)
+    return path
+
+def test_miss_then_hit(tmp_path, artifact):
+    """Test that a stored artifact is returned for the same key"""
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0)
+
+    assert cache.get(KEY) is None
+    cache.put(KEY, artifact, "application/octet-stream", "embeddings")
+    entry = cache.get(KEY)
+
+    assert entry is not None
+    assert entry["file_size"] == 100
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_key_includes_emb_mode_and_version(tmp_path, artifact):
+    """Test that other modes and model versions do not hit"""
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0)
+    cache.put(KEY, artifact, "application/octet-stream", "embeddings")
+
+    assert cache.get(KEY._replace(emb_mode="cell")) is None
+    assert cache.get(KEY._replace(model_version="2.0.0")) is None
+
+def test_key_follows_helical_version_and_model_config(tmp_path, artifact):
+    """Test that another helical version or model setting misses while the device doesn't matter"""
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0)
+    service = SingleCellService()
+
+    class Config:
+        def __init__(self, **config):
+            self.config = {"device": "cpu", "emb_mode": "cls", "batch_size": 24, "max_length": 1200, **config}
+
+    def key(version="0.1.0", **config):
+        service._configurers.clear()
+        service._configs["scgpt"] = lambda emb_mode: Config(**config)
+        with patch("app.services.single_cell_service.helical_version", return_value=version):
+            return KEY._replace(model_config=service.model_fingerprint("scgpt", "cls"))
+
+    cache.put(key(), artifact, "application/octet-stream", "embeddings")
+
+    assert cache.get(key(device="cuda")) is not None
+    assert cache.get(key(version="0.2.0")) is None
+    assert cache.get(key(max_length=4096)) is None
+    assert cache.get(key(batch_size=8)) is None
+
+def test_evicts_least_recently_used_over_size(tmp_path, artifact):
+    """Test size-based eviction keeps the most recently used entry"""
+    cache = ResultCache(tmp_path / "cache", max_bytes=150, ttl=0)
+    other = KEY._replace(model_id="geneformer")
+    cache.put(KEY, artifact, "application/octet-stream", "embeddings")
+    cache.put(other, artifact, "application/octet-stream", "embeddings")
+
+    assert cache.get(KEY) is None
+    assert cache.get(other) is not None
+    assert artifact.exists()  # the workflow's own file is untouched
+
+def test_expired_entries_miss(tmp_path, artifact, monkeypatch):
+    """Test TTL expiry"""
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=10)
+    cache.put(KEY, artifact, "application/octet-stream", "embeddings")
+
+    import time
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get(KEY) is None
+
+def test_index_survives_restart(tmp_path, artifact):
+    """Test that cache entries are reloaded from the index"""
+    ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0).put(
+        KEY, artifact, "application/octet-stream", "embeddings"
+    )
+
+    assert ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0).get(KEY) is not None
+
+def test_index_is_shared_between_caches(tmp_path, artifact):
+    """Test that caches of different processes on one directory keep each other's entries"""
+    first = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0)
+    second = ResultCache(tmp_path / "cache", max_bytes=1000, ttl=0)
+    other = KEY._replace(emb_mode="cell")
+
+    first.put(KEY, artifact, "application/octet-stream", "embeddings")
+    second.put(other, artifact, "application/octet-stream", "embeddings")
+
+    assert first.get(other) is not None
+    assert second.get(KEY) is not None
+    assert first.stats()["size"] == 200
@@ -0,0 +1,88 @@
+from app.models.workflows import SingleCellJob
+from app.services.scheduler import WorkflowScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_job(workflow_id: str, n_obs: int, priority: int = 0, client_id: str = "a") -> SingleCellJob:
+    return SingleCellJob(
+        workflow_id=workflow_id,
+        input_path=f"{workflow_id}.h5ad",
+        input_sha256="0" * 64,
+        model_id="scgpt",
+        priority=priority,
+        client_id=client_id,
+        n_obs=n_obs,
+        n_vars=1
+    )
+
+async def drain(scheduler: WorkflowScheduler, count: int):
+    return [(await scheduler.get())[1].workflow_id for _ in range(count)]
+
+async def enqueue(scheduler: WorkflowScheduler, *jobs: SingleCellJob):
+    for job in jobs:
+        await scheduler.put(("single_cell", job))
+
+async def test_shortest_job_first_and_priority():
+    """Test that small jobs run before big ones, but priority wins"""
+    scheduler = WorkflowScheduler(clock=FakeClock())
+    await enqueue(
+        scheduler,
+        make_job("big", 2_000_000),
+        make_job("small", 5_000),
+        make_job("urgent", 1_000_000, priority=1),
+    )
+    assert await drain(scheduler, 3) == ["urgent", "small", "big"]
+
+async def test_aging_prevents_starvation():
+    """Test that a big job eventually beats newly arriving small jobs"""
+    clock = FakeClock()
+    scheduler = WorkflowScheduler(aging_seconds=10, clock=clock)
+    await enqueue(scheduler, make_job("big", 100_000))
+
+    clock.now = 10_000.0  # big job's effective size is now ~100
+    await enqueue(scheduler, make_job("small", 5_000, client_id="b"))
+    assert await drain(scheduler, 2) == ["big", "small"]
+
+async def test_fair_share_across_clients():
+    """Test that a client that just got capacity yields to another client"""
+    scheduler = WorkflowScheduler(clock=FakeClock())
+    await enqueue(
+        scheduler,
+        make_job("a1", 1_000, client_id="a"),
+        make_job("a2", 1_000, client_id="a"),
+        make_job("a3", 1_000, client_id="a"),
+        make_job("b1", 1_500, client_id="b"),
+    )
+    assert await drain(scheduler, 4) == ["a1", "b1", "a2", "a3"]
+    assert scheduler.qsize() == 0
+
+def test_read_h5ad_shape_from_header(tmp_path):
+    """Test that job sizes come from the h5ad header for dense and sparse inputs"""
+    import anndata
+    import numpy as np
+    from scipy import sparse
+    from app.utils.h5ad import read_h5ad_shape
+
+    anndata.AnnData(np.zeros((6, 4), dtype=np.float32)).write_h5ad(tmp_path / "dense.h5ad")
+    anndata.AnnData(sparse.random(7, 3, density=0.5, format="csr", dtype=np.float32)).write_h5ad(tmp_path / "sparse.h5ad")
+    (tmp_path / "bad.h5ad").write_text("not hdf5")
+
+    assert read_h5ad_shape(str(tmp_path / "dense.h5ad")) == (6, 4)
+    assert read_h5ad_shape(str(tmp_path / "sparse.h5ad")) == (7, 3)
+    assert read_h5ad_shape(str(tmp_path / "bad.h5ad")) is None
+
+async def test_take_only_returns_matching_jobs():
+    """Test that take picks the best matching job and leaves the rest queued"""
+    scheduler = WorkflowScheduler(clock=FakeClock())
+    await enqueue(scheduler, make_job("big", 9_000), make_job("small", 1_000), make_job("other", 10))
+
+    predicate = lambda job: job.workflow_id != "other"
+    assert scheduler.take(predicate)[1].workflow_id == "small"
+    assert scheduler.take(predicate)[1].workflow_id == "big"
+    assert scheduler.take(predicate) is None
+    assert await drain(scheduler, 1) == ["other"]
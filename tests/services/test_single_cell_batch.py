@@ -0,0 +1,82 @@
+from unittest.mock import patch
+import anndata
+import numpy as np
+from app.models.workflows import EmbeddingTarget, SingleCellJob
+from app.services.single_cell_service import SingleCellService
+
+class FakeModel:
+    """Embeds each cell as (row sum, number of genes in the combined input)"""
+
+    def process_data(self, adata):
+        return adata
+
+    def get_embeddings(self, adata):
+        X = np.asarray(adata.X)
+        return np.stack([X.sum(axis=1), np.full(adata.n_obs, adata.n_vars)], axis=1)
+
+def test_run_batch_splits_outputs_per_workflow(tmp_path):
+    """Test that a batch is embedded in one pass and written back per workflow"""
+    jobs = []
+    for i, (n_obs, genes) in enumerate([(2, ["a", "b"]), (3, ["b", "c"])]):
+        adata = anndata.AnnData(np.full((n_obs, 2), i + 1, dtype=np.float32))
+        adata.var_names = genes
+        adata.obs_names = [f"cell{j}" for j in range(n_obs)]
+        adata.write_h5ad(tmp_path / f"in{i}.h5ad")
+        jobs.append(SingleCellJob(
+            workflow_id=f"wf-{i}",
+            input_path=str(tmp_path / f"in{i}.h5ad"),
+            input_sha256="0" * 64,
+            model_id="scgpt",
+            n_obs=n_obs
+        ))
+
+    service = SingleCellService()
+    service._device = "cpu"  # Resolving the device needs torch
+    reports = []
+    with patch("app.services.single_cell_service.settings.RESULTS_DIR", tmp_path), \
+            patch.object(service, "get_model", return_value=FakeModel()) as get_model:
+        results = service.run_batch(jobs, lambda *values: reports.append(values))
+
+    get_model.assert_called_once()
+    first = np.load(results["wf-0"]["file_path"])
+    second = np.load(results["wf-1"]["file_path"])
+    # Genes are outer-joined (3 in total); each workflow keeps its own rows
+    assert first.tolist() == [[2, 3], [2, 3]]
+    assert second.tolist() == [[4, 3], [4, 3], [4, 3]]
+    assert results["wf-1"]["shape"] == [3, 2]
+    assert list(np.load(results["wf-1"]["obs_names_path"])) == ["cell0", "cell1", "cell2"]
+    assert reports[-1] == (0.9, 5, 5)
+
+def test_run_workflow_fans_out_one_read_to_several_models(tmp_path):
+    """Test that every target embeds each chunk and gets its own output"""
+    adata = anndata.AnnData(np.ones((5, 2), dtype=np.float32))
+    adata.write_h5ad(tmp_path / "in.h5ad")
+    job = SingleCellJob(
+        workflow_id="wf",
+        input_path=str(tmp_path / "in.h5ad"),
+        input_sha256="0" * 64,
+        model_id="scgpt",
+        extra_targets=[EmbeddingTarget(model_id="geneformer", emb_mode="cell")]
+    )
+
+    class ScaledModel(FakeModel):
+        def __init__(self, scale):
+            self.scale = scale
+
+        def process_data(self, adata):
+            adata.X *= self.scale  # Modifies its input, like real preprocessing may
+            return adata
+
+    service = SingleCellService()
+    service._device = "cpu"  # Resolving the device needs torch
+    with patch("app.services.single_cell_service.settings.RESULTS_DIR", tmp_path), \
+            patch("app.services.single_cell_service.settings.INFERENCE_CHUNK_SIZE", 2), \
+            patch("app.services.single_cell_service.settings.PROCESSED_CACHE_ENABLED", False), \
+            patch.object(service, "get_model", side_effect=[ScaledModel(2), ScaledModel(3)]):
+        results = service.run_workflow(job, job.targets, lambda *values: None)
+
+    assert [(r["model_id"], r["emb_mode"]) for r in results] == [("scgpt", "cls"), ("geneformer", "cell")]
+    assert results[0]["file_path"].endswith("scgpt_cls_embeddings_wf.npy")
+    # Each model saw the original values despite the other one's preprocessing
+    assert np.load(results[0]["file_path"])[:, 0].tolist() == [4] * 5
+    assert np.load(results[1]["file_path"])[:, 0].tolist() == [6] * 5
@@ -0,0 +1,56 @@
+import asyncio
+from app.models.workflows import WorkflowStatus
+from app.services.state_backend import SqliteStateBackend
+from app.services.workflow_state_manager import WorkflowStateManager
+
+def test_state_is_shared_between_managers(tmp_path):
+    """Test that a state written by one process' manager is read by another's"""
+    api = WorkflowStateManager(SqliteStateBackend(tmp_path / "workflows.db"))
+    worker = WorkflowStateManager(SqliteStateBackend(tmp_path / "workflows.db"))
+
+    api.create_workflow("wf-1")
+    api.flush()
+    api.release("wf-1")  # Handed off to the worker
+    worker.update_status("wf-1", WorkflowStatus.PROCESSING)
+    worker.update_progress("wf-1", 0.4, 400, 1000)
+    assert api.get_workflow("wf-1").status == WorkflowStatus.PENDING  # Not written yet
+    worker.flush()
+
+    state = api.get_workflow("wf-1")
+    assert state.status == WorkflowStatus.PROCESSING
+    assert state.progress == 0.4
+    assert state.total_cells == 1000
+
+def test_progress_writes_are_coalesced(tmp_path):
+    """Test that updates within the write delay reach the database as one write"""
+    backend = SqliteStateBackend(tmp_path / "workflows.db", delay=10)
+    manager = WorkflowStateManager(backend)
+    manager.create_workflow("wf-1")
+    for progress in (0.1, 0.2, 0.3):
+        manager.update_progress("wf-1", progress)
+    assert manager.get_workflow("wf-1").progress == 0.3
+    assert backend.versions(["wf-1"]) == {}
+
+    assert manager.flush(timeout=5)
+    assert backend.versions(["wf-1"]) == {"wf-1": 1}
+    manager.close()
+
+async def test_subscribers_see_changes_from_other_processes(tmp_path):
+    """Test that event subscribers are fed by polling the shared backend"""
+    api = WorkflowStateManager(SqliteStateBackend(tmp_path / "workflows.db"), poll_interval=0.01)
+    worker = WorkflowStateManager(SqliteStateBackend(tmp_path / "workflows.db"))
+    api.create_workflow("wf-1")
+    api.flush()
+    version, _ = api.snapshot("wf-1")
+    queue = api.subscribe("wf-1", asyncio.Queue(), version)
+
+    assert await worker.claim("wf-1") is not None
+    worker.update_progress("wf-1", 0.5)
+    first = await asyncio.wait_for(queue.get(), 1)
+    worker.set_result("wf-1", {})
+    second = await asyncio.wait_for(queue.get(), 1)
+    api.unsubscribe("wf-1", queue)
+    await asyncio.sleep(0.05)  # The poll task ends once nobody is subscribed
+
+    assert first["progress"] == 0.5
+    assert second["status"] == "completed"
@@ -0,0 +1,73 @@
+from unittest.mock import patch
+import pytest
+import asyncio
+from app.models.workflows import WorkflowStatus
+from app.services.workflow_state_manager import WorkflowStateManager
+
+def drain(queue: asyncio.Queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+def test_subscribers_receive_state_changes():
+    """Test that status and progress changes are pushed to subscribed queues"""
+    manager = WorkflowStateManager()
+    manager.create_workflow("wf-1")
+    queue = manager.subscribe("wf-1", asyncio.Queue())
+
+    manager.update_status("wf-1", WorkflowStatus.PROCESSING)
+    manager.update_progress("wf-1", 0.5)
+    manager.update_progress("wf-1", 0.5)  # unchanged, not published
+    manager.set_result("wf-1", {"result_id": "r"})
+
+    events = drain(queue)
+    assert [(e["status"], e["progress"]) for e in events] == [
+        ("processing", 0.0),
+        ("processing", 0.5),
+        ("completed", 1.0),
+    ]
+    assert all(e["id"] == "wf-1" for e in events)
+
+def test_unsubscribe_and_other_workflows():
+    """Test that queues only get events for workflows they watch"""
+    manager = WorkflowStateManager()
+    manager.create_workflow("wf-1")
+    manager.create_workflow("wf-2")
+    queue = manager.subscribe("wf-1", asyncio.Queue())
+
+    manager.set_error("wf-2", "boom")
+    assert drain(queue) == []
+
+    manager.unsubscribe("wf-1", queue)
+    manager.update_progress("wf-1", 0.3)
+    assert drain(queue) == []
+
+def test_full_queue_drops_oldest_event():
+    """Test that a slow subscriber keeps the newest state"""
+    manager = WorkflowStateManager()
+    manager.create_workflow("wf-1")
+    queue = manager.subscribe("wf-1", asyncio.Queue(maxsize=2))
+
+    for progress in (0.1, 0.2, 0.3):
+        manager.update_progress("wf-1", progress)
+
+    assert [e["progress"] for e in drain(queue)] == [0.2, 0.3]
+
+def test_throughput_and_eta_from_cell_counts():
+    """Test that cell counts turn into cells/sec and an ETA"""
+    manager = WorkflowStateManager()
+    manager.create_workflow("wf-1")
+
+    with patch("app.services.workflow_state_manager.time.monotonic", side_effect=[100.0, 110.0]):
+        manager.update_progress("wf-1", 0.1, 0, 5000)
+        manager.update_progress("wf-1", 0.3, 1000, 5000)
+
+    state = manager.get_workflow("wf-1")
+    assert state.processed_cells == 1000
+    assert state.total_cells == 5000
+    assert state.throughput == pytest.approx(100.0)
+    assert state.eta_seconds == pytest.approx(40.0)
+
+    manager.set_result("wf-1", {})
+    assert manager.get_workflow("wf-1").eta_seconds == 0.0
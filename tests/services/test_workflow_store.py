@@ -0,0 +1,140 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from app.models.workflows import WorkflowResult, WorkflowResultItem, WorkflowStatus, ResultType
+from app.services.workflow_store import WorkflowStore
+
+def make_workflow(workflow_id: str, created_at: datetime, status=WorkflowStatus.COMPLETED) -> WorkflowResult:
+    return WorkflowResult(
+        workflow_id=workflow_id,
+        status=status,
+        created_at=created_at,
+        updated_at=created_at,
+        results=[
+            WorkflowResultItem(
+                result_id=f"{workflow_id}-result",
+                type=ResultType.EMBEDDINGS,
+                file_path=f"results/{workflow_id}.npy",
+                content_type="application/octet-stream",
+                shape=[10, 4]
+            )
+        ]
+    )
+
+@pytest.fixture
+def store(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.db")
+    yield store
+    store.close()
+
+def test_save_and_get_round_trip(store):
+    """Test that records keep their results"""
+    workflow = make_workflow("wf-1", datetime.now())
+    store.save(workflow)
+
+    loaded = store.get("wf-1")
+    assert loaded == workflow
+    assert store.get("missing") is None
+
+def test_save_updates_existing_record(store):
+    """Test upserting the same workflow"""
+    workflow = make_workflow("wf-1", datetime.now(), status=WorkflowStatus.PROCESSING)
+    store.save(workflow)
+    workflow.status = WorkflowStatus.FAILED
+    workflow.error_message = "boom"
+    store.save(workflow)
+
+    loaded = store.get("wf-1")
+    assert loaded.status == WorkflowStatus.FAILED
+    assert loaded.error_message == "boom"
+    assert len(store.list()[0]) == 1
+
+def test_list_newest_first(store):
+    """Test listing order"""
+    now = datetime.now()
+    for i in range(3):
+        store.save(make_workflow(f"wf-{i}", now + timedelta(seconds=i)))
+
+    workflows, _ = store.list()
+    assert [w.workflow_id for w in workflows] == ["wf-2", "wf-1", "wf-0"]
+
+def test_migrates_legacy_json_once(tmp_path):
+    """Test the one-shot import of per-workflow JSON files"""
+    legacy_dir = tmp_path / "workflows"
+    legacy_dir.mkdir()
+    now = datetime.now().isoformat()
+    with open(legacy_dir / "legacy-1.json", "w") as f:
+        json.dump({
+            "workflow_id": "legacy-1",
+            "status": "completed",
+            "created_at": now,
+            "updated_at": now,
+            "error_message": None,
+            "results": [{
+                "result_id": "r-1",
+                "type": "embeddings",
+                "file_path": "results/scgpt_embeddings_legacy-1.pt",
+                "content_type": "application/octet-stream",
+                "created_at": now,
+                "file_size": 42
+            }]
+        }, f)
+    (legacy_dir / "broken.json").write_text("{not json")
+
+    store = WorkflowStore(tmp_path / "workflows.db", legacy_dir=legacy_dir)
+    loaded = store.get("legacy-1")
+    assert loaded.status == WorkflowStatus.COMPLETED
+    assert loaded.results[0].file_size == 42
+    store.delete("legacy-1")
+    store.close()
+
+    # A second start must not re-import the files
+    store = WorkflowStore(tmp_path / "workflows.db", legacy_dir=legacy_dir)
+    assert store.get("legacy-1") is None
+    store.close()
+
+def test_list_paginates_with_cursor(store):
+    """Test that following cursors visits every workflow exactly once"""
+    now = datetime.now()
+    for i in range(5):
+        store.save(make_workflow(f"wf-{i}", now + timedelta(seconds=i)))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list(limit=2, cursor=cursor)
+        seen.extend(w.workflow_id for w in page)
+        if cursor is None:
+            break
+
+    assert seen == ["wf-4", "wf-3", "wf-2", "wf-1", "wf-0"]
+
+def test_list_filters(store):
+    """Test status, model and created_at filters"""
+    now = datetime.now()
+    first = make_workflow("wf-0", now, status=WorkflowStatus.FAILED)
+    first.model_id = "geneformer"
+    store.save(first)
+    second = make_workflow("wf-1", now + timedelta(hours=1))
+    second.model_id = "scgpt"
+    store.save(second)
+
+    by_status, _ = store.list(status="failed")
+    by_model, _ = store.list(model_id="scgpt")
+    by_date, _ = store.list(created_after=now + timedelta(minutes=30))
+
+    assert [w.workflow_id for w in by_status] == ["wf-0"]
+    assert [w.workflow_id for w in by_model] == ["wf-1"]
+    assert [w.workflow_id for w in by_date] == ["wf-1"]
+
+def test_list_summary_projection(store):
+    """Test that summaries carry the result count instead of the results"""
+    store.save(make_workflow("wf-0", datetime.now()))
+
+    page, _ = store.list(summary=True)
+
+    assert page[0].result_count == 1
+    assert not hasattr(page[0], "results")
+
+def test_list_rejects_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.list(limit=1, cursor="not-a-cursor")
@@ -0,0 +1,91 @@
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from app.models.workflows import WorkflowResult, WorkflowStatus
+from app.services.workflow_store import WorkflowStore
+from app.services.workflow_writer import WorkflowWriter
+
+def make_workflow(workflow_id: str, status=WorkflowStatus.PENDING) -> WorkflowResult:
+    now = datetime.now()
+    return WorkflowResult(workflow_id=workflow_id, status=status, created_at=now, updated_at=now, results=[])
+
+@pytest.fixture
+def store(tmp_path):
+    store = WorkflowStore(tmp_path / "workflows.db")
+    yield store
+    store.close()
+
+def test_updates_are_coalesced(store):
+    """Test that rapid updates to one workflow end up as a single write of the latest state"""
+    writer = WorkflowWriter(store, delay=10)
+    with patch.object(store, "save_rows", wraps=store.save_rows) as save_rows:
+        workflow = make_workflow("wf-1")
+        for status in (WorkflowStatus.PENDING, WorkflowStatus.PROCESSING, WorkflowStatus.COMPLETED):
+            workflow.status = status
+            writer.submit(workflow)
+        writer.submit(make_workflow("wf-2"))
+
+        assert writer.flush(timeout=5)
+        save_rows.assert_called_once()
+        assert len(save_rows.call_args.args[0]) == 2
+
+    assert store.get("wf-1").status == WorkflowStatus.COMPLETED
+    assert writer.stats()["coalesced"] == 2
+    writer.close()
+
+def test_submit_snapshots_the_record(store):
+    """Test that changes made after submit are not written"""
+    writer = WorkflowWriter(store, delay=10)
+    workflow = make_workflow("wf-1")
+    writer.submit(workflow)
+    workflow.status = WorkflowStatus.FAILED
+
+    writer.flush(timeout=5)
+    assert store.get("wf-1").status == WorkflowStatus.PENDING
+    writer.close()
+
+def test_close_writes_pending_records(store):
+    """Test that shutdown drains the queue and later updates are written through"""
+    writer = WorkflowWriter(store, delay=10)
+    writer.submit(make_workflow("wf-1"))
+    writer.close(timeout=5)
+    assert store.get("wf-1") is not None
+
+    writer.submit(make_workflow("wf-2"))
+    assert store.get("wf-2") is not None
+
+def test_failed_batch_is_retried(store):
+    """Test that records survive a failed write"""
+    writer = WorkflowWriter(store, delay=0, retry_delay=0)
+    original = store.save_rows
+    calls = []
+
+    def flaky(rows):
+        calls.append(rows)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        original(rows)
+
+    with patch.object(store, "save_rows", side_effect=flaky):
+        writer.submit(make_workflow("wf-1"))
+        assert writer.flush(timeout=5)
+
+    assert len(calls) == 2
+    assert store.get("wf-1") is not None
+    writer.close()
+
+def test_overlay_serves_unwritten_records(store):
+    """Test that listings show pending updates while the store keeps failing"""
+    store.save(make_workflow("wf-1"))
+    writer = WorkflowWriter(store, delay=0, retry_delay=0.01)
+    with patch.object(store, "save_rows", side_effect=RuntimeError("disk I/O error")):
+        writer.submit(make_workflow("wf-1", WorkflowStatus.COMPLETED))
+        assert not writer.flush(timeout=0.1)
+
+        listed, _ = store.list()
+        assert listed[0].status == WorkflowStatus.PENDING
+        assert writer.overlay(listed)[0].status == WorkflowStatus.COMPLETED
+        summaries, _ = store.list(summary=True)
+        assert writer.overlay(summaries, summary=True)[0].status == WorkflowStatus.COMPLETED
+    assert writer.flush(timeout=5)
+    writer.close()